@@ -0,0 +1,136 @@
+"""ccxt's asyncio clients, run on one shared event loop.
+
+With blocking ccxt clients every exchange request holds a thread until the
+exchange answers, and each service runs a single gunicorn worker. The async
+clients built here all live on one event loop in a background thread, so
+any number of requests can wait on the network at once.
+
+Callers are not rewritten for it: each client is handed out wrapped in a
+BlockingClient, whose methods look and behave like the synchronous ccxt
+ones. Code that wants many requests in flight calls `submit()` instead and
+waits on the returned futures; exchanges.fan_out() does that.
+"""
+
+import asyncio
+import atexit
+import inspect
+import threading
+
+import ccxt.async_support as ccxt_async
+
+from log_setup import get_logger
+
+logger = get_logger("async_exchanges")
+
+# Seconds given to each client to close its connections at exit.
+CLOSE_TIMEOUT = 5
+
+
+class EventLoopThread:
+    """An asyncio loop running forever in a daemon thread, started on first use."""
+
+    def __init__(self, name="exchange-loop"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.loop.run_forever, name=self.name, daemon=True
+                )
+                self._thread.start()
+
+    def in_loop(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coroutine):
+        """Schedule a coroutine; returns a concurrent.futures.Future."""
+        self._ensure_running()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the loop and block until it finishes."""
+        if self.in_loop():
+            # Blocking here would wait on the loop from inside the loop.
+            coroutine.close()
+            raise RuntimeError("BlockingClient called from the event loop; await the client instead.")
+        return self.submit(coroutine).result(timeout)
+
+
+loop = EventLoopThread()
+
+
+class BlockingClient:
+    """Synchronous view of an async ccxt client.
+
+    Coroutine methods become blocking calls run on the shared loop; every
+    other attribute (markets, options, has, id, ...) is the client's own.
+    Attributes set on the wrapper are set on the client, so the two never
+    disagree.
+    """
+
+    def __init__(self, client, runner=None):
+        object.__setattr__(self, "unwrapped", client)
+        object.__setattr__(self, "_runner", runner or loop)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.unwrapped, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self._runner.run(attribute(*args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self.unwrapped, name, value)
+
+    def submit(self, method, *args, **kwargs):
+        """Start `method` on the loop without waiting; returns a future.
+
+        `method` is the name of a client coroutine method. Cancelling the
+        future cancels the request.
+        """
+        return self._runner.submit(getattr(self.unwrapped, method)(*args, **kwargs))
+
+    def close(self):
+        """Close the client's HTTP session."""
+        self._runner.run(self.unwrapped.close(), timeout=CLOSE_TIMEOUT)
+
+    def __repr__(self):
+        return f"BlockingClient({self.unwrapped!r})"
+
+
+def settings():
+    """Extra constructor settings for an async client on the shared loop."""
+    return {"asyncio_loop": loop.loop}
+
+
+def wrap(client):
+    """Hand out an async client as a BlockingClient on the shared loop."""
+    return BlockingClient(client)
+
+
+def close_all(clients):
+    """Close every wrapped client; errors are logged, not raised."""
+    for name, client in clients.items():
+        if not isinstance(client, BlockingClient):
+            continue
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"⚠ Could not close {name} client cleanly: {e}")
+
+
+def close_at_exit(clients):
+    """Close the sessions before the interpreter exits.
+
+    aiohttp warns about unclosed sessions otherwise, and the loop thread is
+    a daemon that would be stopped mid-request.
+    """
+    atexit.register(close_all, clients)
@@ -0,0 +1,239 @@
+"""Contention benchmark for the duplicate store shared between services.
+
+Starts several processes that each run DuplicateFilter.check, and some
+forget, against one dedup.sqlite3, the way the webhook, the email reader and
+the executor do, and reports as JSON:
+
+- latency percentiles of check and forget;
+- the time each spent waiting for the write lock (BEGIN IMMEDIATE), which
+  busy_timeout otherwise hides inside the latency;
+- how many checks failed open, i.e. waited out busy_timeout and let the
+  signal through unchecked;
+- the largest the WAL grew to, sampled while the processes run.
+
+A share of the checks repeat a key the same process saw recently (a retry),
+and a share use a key every process sees (one alert arriving by webhook and
+by email). --profile takes one or more of dedup.SQLITE_PROFILES, run one
+after another on fresh files so they can be compared, and --set overrides a
+single setting:
+
+    python benchmarks/dedup_contention.py --processes 4 --profile safe,fast
+    python benchmarks/dedup_contention.py --profile safe --set synchronous=NORMAL
+
+The file is created in a temporary directory unless --dir is given. Put it
+on the disk the services use: the cost of a sync depends on it.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_setup  # noqa: E402
+from benchmarks.webhook_load import _percentiles  # noqa: E402
+from dedup import SQLITE_PROFILES, DuplicateFilter  # noqa: E402
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Records how long each BEGIN waited for the write lock."""
+
+    lock_waits = None
+
+    def execute(self, sql, *args):
+        if not sql.startswith("BEGIN"):
+            return super().execute(sql, *args)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            if self.lock_waits is not None:
+                self.lock_waits.append(time.perf_counter() - started)
+
+
+class _FailedOpen(log_setup.logging.Handler):
+    def __init__(self):
+        super().__init__(log_setup.logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def _worker(index, path, settings, options, start, results):
+    lock_waits = []
+
+    class Connection(_TimedConnection):
+        pass
+
+    Connection.lock_waits = lock_waits
+
+    class TimedFilter(DuplicateFilter):
+        _connection_factory = Connection
+
+    failed = _FailedOpen()
+    log_setup.get_logger("dedup").addHandler(failed)
+    duplicates = TimedFilter(
+        options["window"], path=path, memory_size=options["memory"], sqlite_profile=settings
+    )
+    rng = random.Random(options["seed"] * 1000 + index)
+    recent = []
+    shared = 0
+    latencies = {"check": [], "forget": []}
+    start.wait()
+
+    deadline = None if options["duration"] is None else time.perf_counter() + options["duration"]
+    for n in range(options["operations"]):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        roll = rng.random()
+        if roll < options["forgets"] and recent:
+            kind, key = "forget", rng.choice(recent)
+        elif roll < options["forgets"] + options["duplicates"] and recent:
+            kind, key = "check", rng.choice(recent)
+        elif roll < options["forgets"] + options["duplicates"] + options["shared"]:
+            kind, key = "check", f"shared-{shared}"
+            shared += 1
+        else:
+            kind, key = "check", f"{index}-{n}"
+            recent = (recent + [key])[-100:]
+        started = time.perf_counter()
+        if kind == "check":
+            duplicates.check(key)
+        else:
+            duplicates.forget(key)
+        latencies[kind].append(time.perf_counter() - started)
+
+    results.put({"latencies": latencies, "lock_waits": lock_waits, "failed_open": failed.count})
+
+
+def run(settings, processes=4, operations=2000, duration=None, duplicates=0.1, shared=0.1,
+        forgets=0.02, memory=0, window=60, seed=1, directory=None):
+    """Run one configuration on a fresh file and return its report."""
+    directory = tempfile.mkdtemp(prefix="tradex-dedup-", dir=directory)
+    path = os.path.join(directory, "dedup.sqlite3")
+    # Created here so the workers do not race to set the file up.
+    DuplicateFilter(window, path=path, sqlite_profile=settings)
+    options = {
+        "operations": operations if duration is None else sys.maxsize,
+        "duration": duration,
+        "duplicates": duplicates,
+        "shared": shared,
+        "forgets": forgets,
+        "memory": memory,
+        "window": window,
+        "seed": seed,
+    }
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(n, path, settings, options, start, results))
+        for n in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    # Give the workers time to import before the clock starts.
+    time.sleep(0.5)
+    started = time.perf_counter()
+    start.set()
+    collected = []
+    wal_peak = 0
+    while len(collected) < len(workers):
+        try:
+            wal_peak = max(wal_peak, os.path.getsize(path + "-wal"))
+        except OSError:
+            pass
+        try:
+            collected.append(results.get(timeout=0.05))
+        except queue.Empty:
+            pass
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    latencies = {"check": [], "forget": []}
+    lock_waits = []
+    for result in collected:
+        for kind, samples in result["latencies"].items():
+            latencies[kind].extend(samples)
+        lock_waits.extend(result["lock_waits"])
+    completed = sum(len(samples) for samples in latencies.values())
+    return {
+        "operations": completed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(completed / elapsed, 1) if elapsed else None,
+        "latency": {kind: _percentiles(samples) for kind, samples in latencies.items()},
+        "lock_wait": dict(_percentiles(lock_waits), total_s=round(sum(lock_waits), 3)),
+        "failed_open": sum(result["failed_open"] for result in collected),
+        "wal_peak_bytes": wal_peak,
+        "settings": settings,
+    }
+
+
+def _setting(text):
+    name, _, value = text.partition("=")
+    if name not in SQLITE_PROFILES["safe"] or not value:
+        raise argparse.ArgumentTypeError(f"expected one of {sorted(SQLITE_PROFILES['safe'])}=VALUE")
+    if name != "synchronous":
+        value = float(value) if name == "checkpoint_seconds" else int(value)
+    return name, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=4, help="processes sharing the file (4)")
+    parser.add_argument("--operations", type=int, default=2000, help="per process (2000)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds instead")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of retried keys (0.1)")
+    parser.add_argument("--shared", type=float, default=0.1,
+                        help="share of keys every process checks (0.1)")
+    parser.add_argument("--forgets", type=float, default=0.02, help="share of forgets (0.02)")
+    parser.add_argument("--memory", type=int, default=0,
+                        help="memory_size of each filter; 0 sends every check to SQLite (default)")
+    parser.add_argument("--profile", default="safe",
+                        help=f"comma-separated, from {', '.join(SQLITE_PROFILES)} (safe)")
+    parser.add_argument("--set", type=_setting, action="append", default=[], metavar="NAME=VALUE",
+                        help="override one setting of every profile run")
+    parser.add_argument("--dir", help="create the file under this directory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for name in args.profile.split(","):
+        if name not in SQLITE_PROFILES:
+            parser.error(f"unknown profile {name!r}")
+        settings = dict(SQLITE_PROFILES[name], **dict(args.set))
+        report[name] = run(
+            settings,
+            processes=args.processes,
+            operations=args.operations,
+            duration=args.duration,
+            duplicates=args.duplicates,
+            shared=args.shared,
+            forgets=args.forgets,
+            memory=args.memory,
+            seed=args.seed,
+            directory=args.dir,
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(entry["failed_open"] for entry in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
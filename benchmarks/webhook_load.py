@@ -0,0 +1,330 @@
+"""Load generator and latency benchmark for the webhook.
+
+Replays TradingView-shaped signals against the webhook at a fixed rate, or
+as fast as it will go, and reports throughput, latency percentiles and the
+outcome of every kind of request as JSON. A share of the traffic can be
+retries of earlier signals, wrong PINs and invalid signals, since those
+take different paths through dedup.py and ratelimit.py.
+
+By default the webhook app runs in this process, with every exchange
+replaced by the simulated one (EXCHANGE_BACKEND=fake), its state in a
+fresh temporary directory, and .env ignored so that no real key is ever
+loaded. That measures the app without a server in front of it. With --url
+the same traffic goes over HTTP to a running webhook instead, which
+includes the server model (serve.py); it is then up to you to run that
+webhook against EXCHANGE_BACKEND=fake.
+
+Other settings are taken from the environment, so for instance
+
+    WEBHOOK_ASYNC_EXECUTION=true python benchmarks/webhook_load.py --rate 200
+
+benchmarks the acknowledged-early path.
+
+Latency is measured from when a request was due to be sent, not from when
+a worker got round to sending it, so a server that falls behind the rate
+shows up in the percentiles instead of slowing the generator down.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PIN = "benchmark-pin-4f1c9a7e2b6d"
+
+# Accepted outcomes per kind of request. Anything else is counted as
+# unexpected: that is what a change must not increase.
+EXPECTED = {
+    "valid": {200, 202},
+    "duplicate": {200},
+    "bad_pin": {403, 429},
+    "invalid": {400},
+}
+
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT")
+QUANTITIES = {"BTCUSDT": "0.001", "ETHUSDT": "0.01", "SOLUSDT": "0.1", "XRPUSDT": "1", "DOGEUSDT": "1"}
+
+
+class Workload:
+    """The sequence of requests to send. Deterministic for a given seed."""
+
+    def __init__(self, pin, duplicates=0.0, bad_pins=0.0, invalid=0.0, exchange="bybit", seed=1):
+        self.pin = pin
+        self.duplicates = duplicates
+        self.bad_pins = bad_pins
+        self.invalid = invalid
+        self.exchange = exchange
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sent = []
+        self._ids = itertools.count(1)
+
+    def _signal(self):
+        # As a TradingView alert template renders it: every value a string.
+        symbol = self._rng.choice(SYMBOLS)
+        return {
+            "PIN": self.pin,
+            "ID": f"bench-{next(self._ids)}",
+            "EXCHANGE": self.exchange,
+            "SYMBOL": symbol,
+            "SIDE": self._rng.choice(("buy", "sell")),
+            "ORDER_TYPE": "market",
+            "QUANTITY": QUANTITIES[symbol],
+        }
+
+    def next(self):
+        """(kind, payload, source address) for the next request."""
+        with self._lock:
+            roll = self._rng.random()
+            if roll < self.duplicates and self._sent:
+                return "duplicate", self._rng.choice(self._sent), "127.0.0.1"
+            roll -= self.duplicates
+            if roll < self.bad_pins:
+                payload = dict(self._signal(), PIN="wrong-" + self.pin)
+                # From many addresses, as a scan would be, so the lockout of
+                # one does not shut out the real sender.
+                return "bad_pin", payload, f"203.0.113.{self._rng.randrange(1, 255)}"
+            roll -= self.bad_pins
+            if roll < self.invalid:
+                broken = self._rng.choice(({"QUANTITY": "-1"}, {"SIDE": "hold"}, {"SYMBOL": "NOPEUSDT"}))
+                return "invalid", dict(self._signal(), **broken), "127.0.0.1"
+            payload = self._signal()
+            self._sent.append(payload)
+            return "valid", payload, "127.0.0.1"
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _flask_sender(app):
+    """send(payload, address) -> status, through the app with no server."""
+    local = threading.local()
+
+    def send(payload, address):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.post(
+            "/webhook",
+            data=json.dumps(payload),
+            content_type="text/plain",
+            environ_base={"REMOTE_ADDR": address},
+        )
+        return response.status_code
+
+    return send
+
+
+def _http_sender(url, timeout):
+    """send(payload, address) -> status, over HTTP with one session per worker."""
+    import requests
+
+    local = threading.local()
+
+    def send(payload, address):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.post(
+            url, data=json.dumps(payload), headers={"Content-Type": "text/plain"}, timeout=timeout
+        )
+        return response.status_code
+
+    return send
+
+
+def run(send, workload, requests=1000, rate=0.0, concurrency=8, duration=None):
+    """Send the workload and return the report as a dict.
+
+    `rate` is requests per second across all workers; 0 sends each as soon
+    as a worker is free. Stops after `requests`, or `duration` seconds.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    by_kind = defaultdict(lambda: {"latencies": [], "statuses": Counter(), "unexpected": 0})
+    errors = Counter()
+    started = time.perf_counter()
+    deadline = None if duration is None else started + duration
+
+    def worker():
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            due = started + index / rate if rate else time.perf_counter()
+            if deadline is not None and due >= deadline:
+                return
+            pause = due - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            kind, payload, address = workload.next()
+            try:
+                status = send(payload, address)
+            except Exception as e:
+                status = None
+                error = type(e).__name__
+            elapsed = time.perf_counter() - due
+            with lock:
+                entry = by_kind[kind]
+                if status is None:
+                    errors[error] += 1
+                    entry["unexpected"] += 1
+                    continue
+                latencies.append(elapsed)
+                entry["latencies"].append(elapsed)
+                entry["statuses"][status] += 1
+                if status not in EXPECTED[kind]:
+                    entry["unexpected"] += 1
+
+    threads = [threading.Thread(target=worker, name=f"load-{n}") for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    completed = len(latencies)
+    statuses = Counter()
+    for entry in by_kind.values():
+        statuses.update(entry["statuses"])
+    return {
+        "completed": completed,
+        "transport_errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 1) if elapsed else None,
+        "latency": _percentiles(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "unexpected": sum(entry["unexpected"] for entry in by_kind.values()),
+        "by_kind": {
+            kind: {
+                "latency": _percentiles(entry["latencies"]),
+                "status_codes": {str(code): n for code, n in sorted(entry["statuses"].items())},
+                "unexpected": entry["unexpected"],
+            }
+            for kind, entry in sorted(by_kind.items())
+        },
+    }
+
+
+def _in_process_app(args):
+    """Import the webhook against a throwaway environment and a fake exchange."""
+    import dotenv
+
+    # Never the real .env: it holds live keys, and its allowlist or MODE
+    # would skew the run anyway.
+    dotenv.load_dotenv = lambda *a, **k: False
+    state = tempfile.mkdtemp(prefix="tradex-bench-")
+    os.environ.update({
+        "TRADEX_LOG_DIR": state,
+        "EXCHANGE_BACKEND": "fake",
+        "FAKE_EXCHANGE_LATENCY": args.exchange_latency,
+        "FAKE_EXCHANGE_ERROR_RATE": str(args.exchange_error_rate),
+        "FAKE_EXCHANGE_BALANCE": "1000000000",
+        "MODE": "webhook",
+        "WEBHOOK_PIN": BENCH_PIN,
+    })
+    os.environ.setdefault("FLASK_SECRET_KEY", "benchmark")
+    # Only has to look like a bcrypt hash; the dashboard is not started.
+    os.environ.setdefault("DASHBOARD_PASSWORD", "$2b$12$" + "b" * 53)
+
+    import log_setup
+
+    log_setup.configure("webhook")
+    if not args.console_log:
+        # Keep the file log, which is part of the real cost, but not a line
+        # per request on the terminal.
+        root = log_setup.logging.getLogger(log_setup.ROOT_LOGGER_NAME)
+        for handler in list(root.handlers):
+            if type(handler) is log_setup.logging.StreamHandler:
+                root.removeHandler(handler)
+
+    import webhook_receiver
+
+    return webhook_receiver.app, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests to send (default 2000)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds instead")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="requests per second; 0 sends as fast as the workers can (default)")
+    parser.add_argument("--concurrency", type=int, default=8, help="sending threads (default 8)")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of retried signals (0.1)")
+    parser.add_argument("--bad-pins", type=float, default=0.05, help="share with a wrong PIN (0.05)")
+    parser.add_argument("--invalid", type=float, default=0.05, help="share of invalid signals (0.05)")
+    parser.add_argument("--exchange", default="bybit", help="EXCHANGE field of the signals")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the request mix")
+    parser.add_argument("--url", help="POST to a running webhook, e.g. http://127.0.0.1:5005/webhook")
+    parser.add_argument("--pin", help="PIN of the webhook at --url")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout with --url")
+    parser.add_argument("--exchange-latency", default="lognormal:25:120",
+                        help="FAKE_EXCHANGE_LATENCY for the in-process run")
+    parser.add_argument("--exchange-error-rate", type=float, default=0.0,
+                        help="FAKE_EXCHANGE_ERROR_RATE for the in-process run")
+    parser.add_argument("--console-log", action="store_true", help="keep per-request log lines on stderr")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        if not args.pin:
+            parser.error("--pin is required with --url")
+        send, pin, target = _http_sender(args.url, args.timeout), args.pin, args.url
+    else:
+        app, state = _in_process_app(args)
+        send, pin, target = _flask_sender(app), BENCH_PIN, f"in-process (state in {state})"
+
+    workload = Workload(
+        pin,
+        duplicates=args.duplicates,
+        bad_pins=args.bad_pins,
+        invalid=args.invalid,
+        exchange=args.exchange,
+        seed=args.seed,
+    )
+    requests = args.requests if args.duration is None else sys.maxsize
+    report = run(send, workload, requests, args.rate, args.concurrency, args.duration)
+    report["settings"] = {
+        "target": target,
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "mix": {"duplicates": args.duplicates, "bad_pins": args.bad_pins, "invalid": args.invalid},
+        "exchange_latency": None if args.url else args.exchange_latency,
+        "seed": args.seed,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["unexpected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,101 @@
 """Read and act on exchange state for the dashboard."""
 
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
 import exchanges as exchange_registry
+import weight_budget
 from log_setup import get_logger
+from snapshot_cache import SnapshotCache
 
 logger = get_logger("bot_logic")
 
 exchanges = exchange_registry.exchanges
 
+# Kind of cached state -> the ccxt call that fetches it.
+_FETCHERS = {
+    "positions": "fetch_positions",
+    "orders": "fetch_open_orders",
+    "balances": "fetch_balance",
+}
+
+# Most closes each exchange accepts in one batch order request.
+CLOSE_BATCH_LIMITS = {"binance": 5, "bybit": 10}
+
+# Shared by every dashboard request in this process.
+cache = SnapshotCache({
+    "positions": config.SNAPSHOT_TTL_POSITIONS,
+    "orders": config.SNAPSHOT_TTL_ORDERS,
+    "balances": config.SNAPSHOT_TTL_BALANCES,
+})
+
 
 # ==============================
 # 🚀 Functions for Trading Logic
 # ==============================
 
+def _read_all(methods, caller):
+    """Call each method on every exchange, all at once.
+
+    Returns method -> exchange_name -> (result, error).
+    """
+    outcome = exchange_registry.fan_out({
+        (name, method): (exchange, method)
+        for name, exchange in exchanges.items()
+        for method in methods
+    })
+    results = {method: {} for method in methods}
+    for (name, method), (result, error) in outcome.items():
+        if error is not None:
+            logger.error(f"❌ [{caller}] Error calling {method} on {name}: {error}")
+        results[method][name] = (result, error)
+    return results
+
+
+def _cached(kinds, caller):
+    """kind -> exchange_name -> (result, error), from cache where still fresh.
+
+    Kinds that have to be fetched are fetched together, in one fan-out.
+    """
+    def load(missing):
+        fetched = _read_all([_FETCHERS[kind] for kind in missing], caller)
+        return {kind: fetched[_FETCHERS[kind]] for kind in missing}
+
+    return cache.get_many(kinds, load)
+
+
+def _open_positions(exchange_name, all_positions):
+    """Keep the positions that are actually open, in the dashboard's shape."""
+    open_positions = []
+    for pos in all_positions:
+        if (pos.get('contracts', 0) != 0) or (pos.get('notional', 0) != 0):  # Futures positions have non-zero contracts or notional
+            open_positions.append({
+                "symbol": pos.get('symbol', 'N/A'),
+                "side": pos.get('side', 'N/A'),
+                "contracts": pos.get('contracts', 0),
+                "notional": pos.get('notional', 0.0),
+                "entry_price": pos.get('entryPrice', 0.0),
+                "liquidation_price": pos.get('liquidationPrice', None),
+                "margin_ratio": pos.get('marginRatio', None),
+                "leverage": pos.get('leverage', None),
+                "initial_margin": pos.get('initialMargin', None),
+                "unrealized_pnl": pos.get('unrealizedPnl', 0.0),
+                "exchange": exchange_name
+            })
+    return open_positions
+
+
+def _positions_from(fetched):
+    """exchange_name -> open positions, from fetch_positions results."""
+    return {
+        name: [] if error else _open_positions(name, all_positions)
+        for name, (all_positions, error) in fetched.items()
+    }
+
+
 def get_positions():
     """Returns a dict of exchange_name -> list of open positions."""
     logger.info("📊 Fetching open positions...")
@@ -21,27 +105,9 @@ def get_positions():
         logger.error("❌ No exchanges loaded! Check API keys and config.")
         return positions_data
 
-    for exchange_name, exchange in exchanges.items():
-        positions_data[exchange_name] = []
-        try:
-            all_positions = exchange.fetch_positions()
-            for pos in all_positions:
-                if (pos.get('contracts', 0) != 0) or (pos.get('notional', 0) != 0):  # Futures positions have non-zero contracts or notional
-                    positions_data[exchange_name].append({
-                        "symbol": pos.get('symbol', 'N/A'),
-                        "side": pos.get('side', 'N/A'),
-                        "contracts": pos.get('contracts', 0),
-                        "notional": pos.get('notional', 0.0),
-                        "entry_price": pos.get('entryPrice', 0.0),
-                        "liquidation_price": pos.get('liquidationPrice', None),
-                        "margin_ratio": pos.get('marginRatio', None),
-                        "leverage": pos.get('leverage', None),
-                        "initial_margin": pos.get('initialMargin', None),
-                        "unrealized_pnl": pos.get('unrealizedPnl', 0.0),
-                        "exchange": exchange_name
-                    })
-        except Exception as e:
-            logger.error(f"❌ [get_positions] Error fetching positions for {exchange_name}: {e}")
+    # Every exchange at once: a refresh costs the slowest round trip, not
+    # the sum of them. A failed exchange shows as empty, as before.
+    positions_data = _positions_from(_cached(["positions"], "get_positions")["positions"])
 
     logger.info(f"📊 Final positions data: {positions_data}")
     return positions_data
@@ -56,32 +122,91 @@ def get_pending_orders():
         logger.error("❌ No exchanges loaded! Check API keys and config.")
         return pending_orders
 
-    for exchange_name, exchange in exchanges.items():
-        pending_orders[exchange_name] = []
-        try:
-            orders = exchange.fetch_open_orders()
-            pending_orders[exchange_name] = orders
+    fetched = _cached(["orders"], "get_pending_orders")["orders"]
+    for exchange_name, (orders, error) in fetched.items():
+        pending_orders[exchange_name] = [] if error else orders
+        if not error:
             logger.info(f"✅ [get_pending_orders] Successfully fetched {len(orders)} orders for {exchange_name}")
-        except Exception as e:
-            logger.error(f"❌ [get_pending_orders] Error fetching orders for {exchange_name}: {e}")
-            pending_orders[exchange_name] = []
 
     return pending_orders
 
 
+def _closing_side(pos):
+    return "sell" if (pos["side"] == "buy" or pos["side"] == "long") else "buy"
+
+
 def _close_from_snapshot(exchange, exchange_name, pos):
     """Send the reducing order for an already-fetched position."""
-    side = "sell" if (pos["side"] == "buy" or pos["side"] == "long") else "buy"
     # reduceOnly matters: if the position closed between the fetch and this
     # call (stop-loss, partial fill, a concurrent close), a plain market order
     # would open a brand new position in the opposite direction.
-    order = exchange.create_order(
-        pos["symbol"], "market", side, pos["contracts"], None, {"reduceOnly": True}
-    )
+    with weight_budget.trading():
+        order = exchange.create_order(
+            pos["symbol"], "market", _closing_side(pos), pos["contracts"], None, {"reduceOnly": True}
+        )
     logger.info(f"✅ Position closed on {exchange_name}: {order}")
     return {"status": "success", "order": order}
 
 
+def _rejection(order):
+    """The exchange's reason when one entry of a batch was refused, else None."""
+    if not isinstance(order, dict):
+        return "no order returned"
+    if order.get("status") != "rejected" and order.get("id") is not None:
+        return None
+    info = order.get("info") or {}
+    if isinstance(info, dict):
+        return str(info.get("msg") or info.get("retMsg") or info.get("message") or info)
+    return str(info)
+
+
+def _close_batch(exchange, exchange_name, batch):
+    """Close several positions with one batch request. Returns one result each."""
+    with weight_budget.trading():
+        orders = exchange.create_orders([
+            {
+                "symbol": pos["symbol"],
+                "type": "market",
+                "side": _closing_side(pos),
+                "amount": pos["contracts"],
+                "price": None,
+                "params": {"reduceOnly": True},
+            }
+            for pos in batch
+        ])
+    results = []
+    for index, pos in enumerate(batch):
+        order = orders[index] if index < len(orders) else None
+        problem = _rejection(order)
+        if problem:
+            logger.error(f"❌ Error closing {pos['symbol']} on {exchange_name}: {problem}")
+            results.append({"status": "error", "message": problem})
+        else:
+            logger.info(f"✅ Position closed on {exchange_name}: {order}")
+            results.append({"status": "success", "order": order})
+    return results
+
+
+def _close_chunk(exchange, exchange_name, chunk):
+    """Close a group of positions on one exchange, batched where supported."""
+    if len(chunk) > 1:
+        try:
+            return _close_batch(exchange, exchange_name, chunk)
+        except Exception as e:
+            # Resending one at a time is safe: every close is reduceOnly, so
+            # one that did land in the failed batch cannot open a position.
+            logger.warning(f"⚠ Batch close on {exchange_name} failed, closing one at a time: {e}")
+
+    results = []
+    for pos in chunk:
+        try:
+            results.append(_close_from_snapshot(exchange, exchange_name, pos))
+        except Exception as e:
+            logger.error(f"❌ Error closing {pos['symbol']} on {exchange_name}: {e}")
+            results.append({"status": "error", "message": str(e)})
+    return results
+
+
 def close_position(exchange_name, symbol, positions=None):
     """Closes an open position. Pass `positions` to reuse an existing snapshot."""
     logger.info(f"❌ Closing position for {symbol} on {exchange_name}...")
@@ -93,11 +218,17 @@ def close_position(exchange_name, symbol, positions=None):
 
     try:
         if positions is None:
+            # Never size a close from a cached snapshot: the position may
+            # have grown since, and only part of it would be closed.
+            cache.invalidate("positions")
             positions = get_positions().get(exchange_name, [])
 
         for pos in positions:
             if pos["symbol"] == symbol:
-                return _close_from_snapshot(exchange, exchange_name, pos)
+                try:
+                    return _close_from_snapshot(exchange, exchange_name, pos)
+                finally:
+                    cache.invalidate("positions", "orders", "balances")
 
         logger.warning(f"⚠ No open position found for {symbol}.")
         return {"status": "error", "message": "No open position found."}
@@ -113,20 +244,35 @@ def close_all_positions():
 
     results = {}
     # One snapshot for everything: this used to re-fetch every position for
-    # every position, which trips exchange rate limits.
+    # every position, which trips exchange rate limits. Fresh, not cached.
+    cache.invalidate("positions")
     all_positions = get_positions()
 
+    # Every exchange closes at once, each with at most CLOSE_ALL_CONCURRENCY
+    # requests in flight so an emergency flatten stays inside rate limits.
+    pools, pending = [], []
     for exchange_name, positions in all_positions.items():
         exchange = exchange_registry.get(exchange_name)
-        if exchange is None:
+        if exchange is None or not positions:
             continue
-        for pos in positions:
-            try:
-                results[pos["symbol"]] = _close_from_snapshot(exchange, exchange_name, pos)
-            except Exception as e:
-                logger.error(f"❌ Error closing {pos['symbol']} on {exchange_name}: {e}")
-                results[pos["symbol"]] = {"status": "error", "message": str(e)}
-
+        batched = (getattr(exchange, "has", None) or {}).get("createOrders")
+        size = CLOSE_BATCH_LIMITS.get(exchange_name, 1) if batched else 1
+        chunks = [positions[i:i + size] for i in range(0, len(positions), size)]
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(config.CLOSE_ALL_CONCURRENCY, len(chunks))),
+            thread_name_prefix=f"close-{exchange_name}",
+        )
+        pools.append(pool)
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(_close_chunk, exchange, exchange_name, chunk)))
+
+    for chunk, future in pending:
+        for pos, result in zip(chunk, future.result()):
+            results[pos["symbol"]] = result
+    for pool in pools:
+        pool.shutdown()
+
+    cache.invalidate("positions", "orders", "balances")
     logger.info(f"✅ All positions closed: {results}")
     return results
 
@@ -141,12 +287,15 @@ def cancel_order(exchange_name, order_id, symbol):
         return {"status": "error", "message": f"Exchange {exchange_name} not found."}
 
     try:
-        result = exchange.cancel_order(order_id, symbol)
+        with weight_budget.trading():
+            result = exchange.cancel_order(order_id, symbol)
         logger.info(f"✅ Order {order_id} cancelled successfully.")
         return {"status": "success", "order": result}
     except Exception as e:
         logger.error(f"❌ Error cancelling order {order_id}: {e}")
         return {"status": "error", "message": str(e)}
+    finally:
+        cache.invalidate("orders", "balances")
 
 
 def _position_margin(pos):
@@ -164,25 +313,18 @@ def _position_margin(pos):
     return 0.0
 
 
-def calculate_summary_stats():
-    """Calculates and returns summary statistics for the dashboard."""
-    logger.info("📊 Calculating summary statistics...")
+def _summarize(all_positions, balances):
+    """Summary figures from one set of positions and balances."""
     summary_stats = {
         "portfolio_value": 0.0,
         "total_pnl": 0.0,
         "margin_used": 0.0,
     }
 
-    if not exchanges:
-        logger.error("❌ No exchanges loaded! Cannot calculate summary stats.")
-        return summary_stats
-
-    # Fetched once, not once per exchange.
-    all_positions = get_positions()
-
-    for exchange_name, exchange in exchanges.items():
+    for exchange_name, (account_balance, error) in balances.items():
+        if error:
+            continue
         try:
-            account_balance = exchange.fetch_balance()
             logger.info(f"🔍 [calculate_summary_stats] Balance breakdown for {exchange_name}: {account_balance.get('total', {})}")
 
             # Calculate portfolio value - check for USDT, USDC, BUSD, or other stablecoins
@@ -200,5 +342,78 @@ def calculate_summary_stats():
         except Exception as e:
             logger.error(f"❌ Error fetching account balance for {exchange_name}: {e}")
 
+    return summary_stats
+
+
+def calculate_summary_stats():
+    """Calculates and returns summary statistics for the dashboard."""
+    logger.info("📊 Calculating summary statistics...")
+
+    if not exchanges:
+        logger.error("❌ No exchanges loaded! Cannot calculate summary stats.")
+        return _summarize({}, {})
+
+    # Fetched once, not once per exchange, and alongside the balances rather
+    # than before them. Usually the positions table has just cached them.
+    fetched = _cached(["positions", "balances"], "calculate_summary_stats")
+    summary_stats = _summarize(_positions_from(fetched["positions"]), fetched["balances"])
+
     logger.info(f"📊 Summary statistics calculated: {summary_stats}")
     return summary_stats
+
+
+# Bumped whenever the snapshot content differs from the previous one, so a
+# client can tell "nothing changed" without comparing the payload itself.
+_snapshot_lock = threading.Lock()
+_snapshot_version = 0
+_snapshot_digest = None
+
+
+def _versioned(snapshot):
+    global _snapshot_version, _snapshot_digest
+    digest = hashlib.sha256(
+        json.dumps(snapshot, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    with _snapshot_lock:
+        if digest != _snapshot_digest:
+            _snapshot_digest = digest
+            _snapshot_version += 1
+        return dict(snapshot, version=_snapshot_version)
+
+
+def get_snapshot():
+    """Positions, pending orders and summary stats from one consistent fetch.
+
+    The three used to be fetched by separate requests at different moments,
+    so the PnL total could disagree with the positions listed beside it.
+    `errors` lists the exchanges that could not be read, and why.
+    """
+    logger.info("📸 Building dashboard snapshot...")
+
+    if not exchanges:
+        logger.error("❌ No exchanges loaded! Check API keys and config.")
+        return _versioned({
+            "positions": {},
+            "pending_orders": {},
+            "summary_stats": _summarize({}, {}),
+            "errors": {},
+        })
+
+    fetched = _cached(["positions", "orders", "balances"], "get_snapshot")
+    positions = _positions_from(fetched["positions"])
+
+    errors = {}
+    for kind, results in fetched.items():
+        for exchange_name, (_, error) in results.items():
+            if error:
+                errors.setdefault(exchange_name, []).append(f"{_FETCHERS[kind]}: {error}")
+
+    return _versioned({
+        "positions": positions,
+        "pending_orders": {
+            name: [] if error else orders
+            for name, (orders, error) in fetched["orders"].items()
+        },
+        "summary_stats": _summarize(positions, fetched["balances"]),
+        "errors": errors,
+    })
@@ -51,6 +51,16 @@ def _int(name, default):
         raise ConfigError(f"{name} must be a whole number, got {value!r}.")
 
 
+def _float(name, default):
+    value = _unescape(os.getenv(name, "").strip())
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ConfigError(f"{name} must be a number, got {value!r}.")
+
+
 def _bool(name, default):
     value = _unescape(os.getenv(name, "").strip()).lower()
     if not value:
@@ -79,6 +89,22 @@ SESSION_PERMANENT_LIFETIME = timedelta(hours=SESSION_LIFETIME_HOURS)
 # Leave false only when the dashboard is reached over plain HTTP on localhost.
 SESSION_COOKIE_SECURE = _bool("SESSION_COOKIE_SECURE", False)
 
+# Seconds between refreshes pushed to open dashboards over /stream. One
+# refresher serves every viewer, so more viewers do not mean more calls.
+DASHBOARD_PUSH_INTERVAL = _float("DASHBOARD_PUSH_INTERVAL", 5.0)
+# Request threads in the single dashboard process. Each open /stream holds
+# one for as long as its tab is open.
+DASHBOARD_THREADS = _int("DASHBOARD_THREADS", 8)
+# Live streams allowed at once. Kept below DASHBOARD_THREADS so that logins,
+# /metrics and closes always find a free thread; a tab over the limit gets
+# 503 and polls /snapshot instead.
+DASHBOARD_MAX_STREAMS = _int("DASHBOARD_MAX_STREAMS", max(0, DASHBOARD_THREADS - 2))
+if not 0 <= DASHBOARD_MAX_STREAMS < DASHBOARD_THREADS:
+    raise ConfigError(
+        f"DASHBOARD_MAX_STREAMS must be at least 0 and below DASHBOARD_THREADS "
+        f"({DASHBOARD_THREADS}), got {DASHBOARD_MAX_STREAMS}."
+    )
+
 # Failed dashboard logins before that client is locked out.
 LOGIN_MAX_ATTEMPTS = _int("LOGIN_MAX_ATTEMPTS", 5)
 LOGIN_LOCKOUT_SECONDS = _int("LOGIN_LOCKOUT_SECONDS", 300)
@@ -117,21 +143,143 @@ WEBHOOK_LOCKOUT_SECONDS = _int("WEBHOOK_LOCKOUT_SECONDS", 300)
 # disable. Send a unique ID field in the alert to make this exact.
 WEBHOOK_DEDUP_SECONDS = _int("WEBHOOK_DEDUP_SECONDS", 60)
 
+# Where the duplicate window is kept. "sqlite": logs/dedup.sqlite3, which
+# every service opens. "socket": the dedup_service process, reached over a
+# Unix socket (DEDUP_SOCKET, default logs/dedup.sock), which holds it in
+# memory and journals it. DEDUP_JOURNAL_FSYNC syncs that journal to disk on
+# every new key.
+DEDUP_BACKEND = _optional("DEDUP_BACKEND", "sqlite").lower()
+if DEDUP_BACKEND not in ("sqlite", "socket"):
+    raise ConfigError(f"DEDUP_BACKEND must be 'sqlite' or 'socket', got {DEDUP_BACKEND!r}.")
+DEDUP_SOCKET = _optional("DEDUP_SOCKET", "")
+# "safe" syncs every new key to disk; "fast" only at checkpoints, so a power
+# cut can forget the last few. See dedup.SQLITE_PROFILES.
+DEDUP_SQLITE_PROFILE = _optional("DEDUP_SQLITE_PROFILE", "safe").lower()
+if DEDUP_SQLITE_PROFILE not in ("safe", "fast"):
+    raise ConfigError(
+        f"DEDUP_SQLITE_PROFILE must be 'safe' or 'fast', got {DEDUP_SQLITE_PROFILE!r}."
+    )
+DEDUP_JOURNAL_FSYNC = _bool("DEDUP_JOURNAL_FSYNC", False)
+
+# Most signals accepted in one {"PIN": ..., "SIGNALS": [...]} request.
+WEBHOOK_MAX_BATCH = _int("WEBHOOK_MAX_BATCH", 20)
+
+# Answer 202 with a signal id once a signal passes the PIN, duplicate and
+# validation checks, and place the order afterwards, so the sender never
+# waits on the exchange. The outcome is at /webhook/status/<signal_id>.
+WEBHOOK_ASYNC_EXECUTION = _bool("WEBHOOK_ASYNC_EXECUTION", False)
+WEBHOOK_EXECUTION_WORKERS = _int("WEBHOOK_EXECUTION_WORKERS", 4)
+
+# Where orders are placed. "inline": by the webhook and email reader
+# themselves. "outbox": they queue accepted signals in a durable SQLite
+# table and the executor service places them, one warm client per exchange.
+SIGNAL_EXECUTION = _optional("SIGNAL_EXECUTION", "inline").lower()
+if SIGNAL_EXECUTION not in ("inline", "outbox"):
+    raise ConfigError(
+        f"SIGNAL_EXECUTION must be 'inline' or 'outbox', got {SIGNAL_EXECUTION!r}."
+    )
+# A queued signal not started within this many seconds is expired, not
+# placed late. 0 never expires. How often the executor checks for work, and
+# the loopback port it serves its metrics on (0 = off).
+OUTBOX_MAX_AGE_SECONDS = _float("OUTBOX_MAX_AGE_SECONDS", 60.0)
+OUTBOX_POLL_INTERVAL = _float("OUTBOX_POLL_INTERVAL", 0.05)
+EXECUTOR_METRICS_PORT = _int("EXECUTOR_METRICS_PORT", 0)
+
 # Only enable behind a reverse proxy that overwrites X-Forwarded-For.
 # Trusting it when directly exposed lets a client forge its own address and
 # walk straight past the allowlist and the lockout.
 TRUST_PROXY_HEADERS = _bool("TRUST_PROXY_HEADERS", False)
 
+# Source addresses permitted to read the webhook's /metrics. Same format as
+# WEBHOOK_ALLOWED_IPS, but defaults to loopback: the numbers reveal trading
+# activity, and the webhook is the one service exposed to the internet.
+METRICS_ALLOWED_IPS = _optional("METRICS_ALLOWED_IPS", "127.0.0.1,::1")
+
 # Bybit / Binance credentials
 BYBIT_API_KEY = _optional("BYBIT_API_KEY", "")
 BYBIT_API_SECRET = _optional("BYBIT_API_SECRET", "")
 BINANCE_API_KEY = _optional("BINANCE_API_KEY", "")
 BINANCE_API_SECRET = _optional("BINANCE_API_SECRET", "")
 
+# JSON file of extra named accounts (sub-accounts) and the groups a signal
+# can target with "GROUP", for running one strategy on many accounts. See
+# README "Several accounts". Empty means the single key pair above only.
+ACCOUNTS_FILE = _optional("ACCOUNTS_FILE", "")
+
 # Which exchanges to enable (comma-separated list, e.g. "bybit,binance")
 EXCHANGES = _optional("EXCHANGES", "bybit,binance").lower()
 ENABLED_EXCHANGES = frozenset(part.strip() for part in EXCHANGES.split(",") if part.strip())
 
+# "ccxt" talks to the real exchanges. "fake" replaces every exchange and
+# account with an in-memory simulation (fake_exchange.py) for load tests;
+# no order leaves the machine. Each simulated request waits for a latency
+# drawn from FAKE_EXCHANGE_LATENCY and fails with FAKE_EXCHANGE_ERROR_RATE.
+EXCHANGE_BACKEND = _optional("EXCHANGE_BACKEND", "ccxt").lower()
+if EXCHANGE_BACKEND not in ("ccxt", "fake"):
+    raise ConfigError(f"EXCHANGE_BACKEND must be 'ccxt' or 'fake', got {EXCHANGE_BACKEND!r}.")
+FAKE_EXCHANGE_LATENCY = _optional("FAKE_EXCHANGE_LATENCY", "lognormal:25:120")
+FAKE_EXCHANGE_ERROR_RATE = _float("FAKE_EXCHANGE_ERROR_RATE", 0.0)
+if not 0 <= FAKE_EXCHANGE_ERROR_RATE <= 1:
+    raise ConfigError(
+        f"FAKE_EXCHANGE_ERROR_RATE must be between 0 and 1, got {FAKE_EXCHANGE_ERROR_RATE}."
+    )
+FAKE_EXCHANGE_BALANCE = _float("FAKE_EXCHANGE_BALANCE", 10000.0)
+FAKE_EXCHANGE_SEED = _int("FAKE_EXCHANGE_SEED", None)
+
+# Build the clients on ccxt's asyncio support and run every request on one
+# shared event loop. Callers still get blocking methods, but any number of
+# requests can wait on the network at once without a thread each.
+EXCHANGE_ASYNC = _bool("EXCHANGE_ASYNC", False)
+
+# HTTP connections kept per exchange host, how long an idle one stays open
+# for reuse (0 closes every connection after its request), and the per
+# request timeout. A reused connection skips DNS, TCP and TLS setup.
+EXCHANGE_POOL_SIZE = _int("EXCHANGE_POOL_SIZE", 10)
+EXCHANGE_KEEPALIVE_SECONDS = _float("EXCHANGE_KEEPALIVE_SECONDS", 300.0)
+EXCHANGE_TIMEOUT_MS = _int("EXCHANGE_TIMEOUT_MS", 10000)
+
+# Draw every exchange request from one request-weight budget per account,
+# shared by all the services through a SQLite file in the log directory,
+# instead of each client pacing itself. Orders never wait; other requests
+# wait rather than spend the last WEIGHT_BUDGET_RESERVE of it. The bucket
+# holds WEIGHT_BUDGET_BURST_SECONDS of ccxt's own per-client rate.
+WEIGHT_BUDGET = _bool("WEIGHT_BUDGET", False)
+WEIGHT_BUDGET_BURST_SECONDS = _float("WEIGHT_BUDGET_BURST_SECONDS", 10.0)
+WEIGHT_BUDGET_RESERVE = _float("WEIGHT_BUDGET_RESERVE", 0.3)
+if not 0 <= WEIGHT_BUDGET_RESERVE < 1:
+    raise ConfigError(
+        f"WEIGHT_BUDGET_RESERVE must be at least 0 and below 1, got {WEIGHT_BUDGET_RESERVE}."
+    )
+
+# Load markets, sync clocks and open connections before taking signals, so
+# the first order after a restart is as fast as any other. The webhook
+# reports unhealthy until it finishes or EXCHANGE_WARMUP_TIMEOUT passes.
+EXCHANGE_WARMUP = _bool("EXCHANGE_WARMUP", False)
+EXCHANGE_WARMUP_TIMEOUT = _float("EXCHANGE_WARMUP_TIMEOUT", 30.0)
+
+# Market lists are cached on disk and shared by every service, so a restart
+# does not download them again. Older than MARKET_CACHE_MAX_AGE seconds the
+# file is ignored; older than MARKET_CACHE_REFRESH_AGE it is used but
+# refreshed in the background. Set MARKET_CACHE_MAX_AGE=0 to disable.
+MARKET_CACHE_MAX_AGE = _int("MARKET_CACHE_MAX_AGE", 86400)
+MARKET_CACHE_REFRESH_AGE = _int("MARKET_CACHE_REFRESH_AGE", 3600)
+
+# Deadline for each exchange when the dashboard reads them in parallel. A
+# slow exchange is reported as an error for that exchange alone instead of
+# holding up the others.
+EXCHANGE_READ_TIMEOUT = _float("EXCHANGE_READ_TIMEOUT", 10.0)
+
+# Close requests in flight per exchange during "close all". Exchanges are
+# flattened in parallel; this keeps a large book inside their rate limits.
+CLOSE_ALL_CONCURRENCY = _int("CLOSE_ALL_CONCURRENCY", 4)
+
+# How long the dashboard reuses fetched exchange state, in seconds. Every
+# open tab polls, so without this each one costs a full fetch per exchange.
+# Set a value to 0 to always fetch.
+SNAPSHOT_TTL_POSITIONS = _float("SNAPSHOT_TTL_POSITIONS", 5.0)
+SNAPSHOT_TTL_ORDERS = _float("SNAPSHOT_TTL_ORDERS", 5.0)
+SNAPSHOT_TTL_BALANCES = _float("SNAPSHOT_TTL_BALANCES", 15.0)
+
 # Signal ingestion: "webhook", "email", or "both"
 MODE = _optional("MODE", "webhook").lower()
 if MODE not in ("webhook", "email", "both"):
@@ -146,6 +294,21 @@ IMAP_EMAIL = _optional("IMAP_EMAIL", "")
 IMAP_PASSWORD = _optional("IMAP_PASSWORD", "")
 IMAP_USE_SSL = _bool("IMAP_USE_SSL", True)
 IMAP_CHECK_INTERVAL = _int("IMAP_CHECK_INTERVAL", 15)  # seconds
+# Keep one session open and let the server announce new mail (IMAP IDLE)
+# instead of logging in every IMAP_CHECK_INTERVAL. IDLE is re-issued every
+# IMAP_IDLE_TIMEOUT seconds, which also searches the inbox in case a push
+# was missed. Servers without IDLE are polled as before.
+IMAP_IDLE = _bool("IMAP_IDLE", True)
+IMAP_IDLE_TIMEOUT = _int("IMAP_IDLE_TIMEOUT", 300)
+if IMAP_IDLE_TIMEOUT <= 0 or IMAP_IDLE_TIMEOUT > 1740:
+    # RFC 2177: servers may drop a client idle for 30 minutes.
+    raise ConfigError(
+        f"IMAP_IDLE_TIMEOUT must be between 1 and 1740 seconds, got {IMAP_IDLE_TIMEOUT}."
+    )
+
+# The email reader has no web server; set a port to have it serve its stage
+# timings on http://127.0.0.1:<port>/metrics. 0 leaves it off.
+EMAIL_METRICS_PORT = _int("EMAIL_METRICS_PORT", 0)
 
 if EMAIL_ENABLED and not (IMAP_SERVER and IMAP_EMAIL and IMAP_PASSWORD):
     raise ConfigError(
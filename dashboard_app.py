@@ -6,12 +6,15 @@ log_setup.configure("dashboard")
 import hmac  # noqa: E402
 import os  # noqa: E402
 import secrets  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
 from collections import deque  # noqa: E402
 from functools import wraps  # noqa: E402
 
 import bcrypt  # noqa: E402
 from flask import (  # noqa: E402
     Flask,
+    Response,
     flash,
     jsonify,
     redirect,
@@ -22,15 +25,20 @@ from flask import (  # noqa: E402
 )
 
 import config  # noqa: E402
+import exchanges as exchange_registry  # noqa: E402
+import weight_budget  # noqa: E402
 from bot_logic import (  # noqa: E402
+    cache,
     calculate_summary_stats,
     cancel_order,
     close_all_positions,
     close_position,
     get_pending_orders,
     get_positions,
+    get_snapshot,
 )
 from ratelimit import FailureThrottle  # noqa: E402
+from snapshot_feed import SnapshotFeed, format_event  # noqa: E402
 
 logger = log_setup.get_logger("dashboard")
 log_directory = log_setup.log_directory()
@@ -41,6 +49,10 @@ logger.info("🎉 Dashboard initialized!")
 # on every poll.
 LOG_TAIL_LINES = 500
 
+# Seconds between keep-alive comments on an idle /stream, so proxies do not
+# close a connection that simply has nothing new to say.
+STREAM_HEARTBEAT_SECONDS = 15
+
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = config.FLASK_SECRET_KEY
@@ -58,6 +70,33 @@ _login_throttle = FailureThrottle(
 )
 
 
+# Shared by every /stream viewer in this process.
+_feed = SnapshotFeed(
+    lambda: get_snapshot(), config.DASHBOARD_PUSH_INTERVAL, max_viewers=config.DASHBOARD_MAX_STREAMS
+)
+
+# Sessions ended by /logout, by CSRF token, with when. The session is a
+# cookie that an open /stream never reads again, so this is how a stream
+# learns its viewer logged out. Single worker, so every stream sees it.
+_ended_sessions = {}
+_ended_sessions_lock = threading.Lock()
+
+
+def _end_session(token):
+    now = time.monotonic()
+    lifetime = config.SESSION_PERMANENT_LIFETIME.total_seconds()
+    with _ended_sessions_lock:
+        # Past the lifetime, every stream of that session has stopped anyway.
+        for stale in [t for t, ended in _ended_sessions.items() if now - ended > lifetime]:
+            del _ended_sessions[stale]
+        _ended_sessions[token] = now
+
+
+def _session_ended(token):
+    with _ended_sessions_lock:
+        return token in _ended_sessions
+
+
 def _client_id():
     if config.TRUST_PROXY_HEADERS:
         forwarded = request.headers.get("X-Forwarded-For", "")
@@ -145,6 +184,9 @@ def login():
 # Logout Route
 @app.route("/logout")
 def logout():
+    token = session.get("csrf_token")
+    if token:
+        _end_session(token)
     session.clear()
     logger.info("User logged out.")
     return redirect(url_for("login"))
@@ -208,6 +250,66 @@ def summary_stats():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# Positions, Orders and Stats from One Fetch (API)
+@app.route("/snapshot", methods=["GET"])
+@login_required
+def snapshot():
+    try:
+        data = get_snapshot()
+        logger.info(f"Fetched snapshot version {data['version']}.")
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error fetching snapshot: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Push Snapshot Changes (Server-Sent Events)
+@app.route("/stream", methods=["GET"])
+@login_required
+def stream():
+    subscription = _feed.subscribe()
+    if subscription is None:
+        # Each stream holds a request thread; the rest are kept for everything
+        # else. The page falls back to polling /snapshot.
+        logger.warning(f"Refused /stream: {config.DASHBOARD_MAX_STREAMS} dashboards already watching.")
+        return jsonify({"status": "error", "message": "Too many live dashboards open"}), 503
+    logger.info(f"Dashboard viewer connected to /stream ({_feed.viewers()} watching).")
+    token = session.get("csrf_token")
+    # The cookie was renewed by this request, and expires a lifetime from now.
+    expires = time.monotonic() + config.SESSION_PERMANENT_LIFETIME.total_seconds()
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while time.monotonic() < expires and not (token and _session_ended(token)):
+                update = subscription.next(timeout=STREAM_HEARTBEAT_SECONDS)
+                yield format_event(update) if update is not None else ": keep-alive\n\n"
+        finally:
+            # Runs when the browser goes away, so the refresher can stop.
+            subscription.close()
+
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Also when the connection closes before the first event was sent.
+    response.call_on_close(subscription.close)
+    return response
+
+
+# Cache diagnostics (API)
+@app.route("/metrics", methods=["GET"])
+@login_required
+def metrics():
+    return jsonify({
+        "cache": cache.stats(),
+        "stream_viewers": _feed.viewers(),
+        "connections": exchange_registry.pool_stats(),
+        "weight_budget": weight_budget.report(),
+    })
+
+
 def _flash_failed(result, fallback):
     """Surface a bot_logic error dict; a missing message still gets fallback."""
     if isinstance(result, dict) and result.get("status") == "success":
@@ -14,6 +14,19 @@ in-process cache cannot see what another process has already executed.
 SQLite is in the standard library, is safe for concurrent writers, and
 needs no service to run alongside.
 
+Each process also remembers, in memory, the keys it has recently seen and
+when they were first seen. A retry arriving a second later, the usual
+duplicate, is then answered without touching the file. Memory only ever
+says "duplicate", and only for a key the shared store already holds, so
+SQLite stays the authority: a new key always goes through it. forget()
+in any process bumps a marker file that every process checks, and seeing
+it change drops the memory.
+
+With DEDUP_BACKEND=socket the shared store is dedup_service.py instead of
+SQLite: one local process that holds the window in memory and journals it,
+reached over a Unix socket. The semantics, including failing open, are the
+same.
+
 This is at-most-once within a time window, not true anti-replay. A sender
 that cannot sign its requests (TradingView cannot) offers nothing to verify
 freshness against, so an attacker who captures a request can still replay it
@@ -24,9 +37,12 @@ WEBHOOK_PIN are the controls for that.
 import hashlib
 import json
 import os
+import select
+import socket
 import sqlite3
 import threading
 import time
+from collections import OrderedDict
 
 import log_setup
 
@@ -37,6 +53,39 @@ logger = log_setup.get_logger("dedup")
 _EXCLUDED = {"pin", "id"}
 
 DB_FILENAME = "dedup.sqlite3"
+SOCKET_FILENAME = "dedup.sock"
+
+# Seconds to wait on the dedup service before failing open.
+SERVICE_TIMEOUT = 2.0
+
+# Settings for the SQLite store, chosen with DEDUP_SQLITE_PROFILE and
+# measured with benchmarks/dedup_contention.py (README, "Duplicate signals").
+# checkpoint_seconds > 0 adds a thread that checkpoints the WAL on a timer;
+# with wal_autocheckpoint=0 it is the only thing that does.
+SQLITE_PROFILES = {
+    # SQLite's defaults: every commit is synced to disk, and the writer whose
+    # commit takes the WAL past 1000 pages copies it back into the database
+    # before it returns.
+    "safe": {
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "wal_autocheckpoint": 1000,
+        "checkpoint_seconds": 0,
+    },
+    # Commits are synced only at checkpoints. A power cut can lose the keys
+    # of the last moments; it cannot corrupt the file. mmap and a timed
+    # checkpoint made no measurable difference, and leaving checkpoints to
+    # the timer alone let the WAL grow past 200 MB under load.
+    "fast": {
+        "synchronous": "NORMAL",
+        "mmap_size": 0,
+        "wal_autocheckpoint": 1000,
+        "checkpoint_seconds": 0,
+    },
+}
+
+# The forget marker is rewritten, not appended to, once it reaches this size.
+_MARKER_MAX_BYTES = 4096
 
 
 def default_db_path():
@@ -48,6 +97,10 @@ def default_db_path():
     return os.path.join(log_setup.log_directory(), DB_FILENAME)
 
 
+def default_socket_path():
+    return os.path.join(log_setup.log_directory(), SOCKET_FILENAME)
+
+
 def signal_key(payload):
     """Stable identity for a signal.
 
@@ -69,16 +122,104 @@ def signal_key(payload):
     return "fingerprint:" + hashlib.sha256(encoded).hexdigest()
 
 
+class _ServiceClient:
+    """Requests to dedup_service.py, one connection per thread.
+
+    One JSON object per line each way. A request is never resent: had the
+    service recorded a key before the connection broke, the resend would
+    report the genuine signal as its own duplicate.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and self._closed_by_peer(sock):
+            # The service restarted since the last request; nothing was lost.
+            self.reset()
+            sock = None
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(SERVICE_TIMEOUT)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+            self._local.reader = sock.makefile("rb")
+        return sock, self._local.reader
+
+    @staticmethod
+    def _closed_by_peer(sock):
+        # Nothing is due between requests, so anything readable is the
+        # end of the stream.
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def reset(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except Exception:
+                pass
+
+    def call(self, **request):
+        sock, reader = self._connection()
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("the dedup service closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"dedup service: {reply['error']}")
+        return reply
+
+
 class DuplicateFilter:
-    """Remembers recently seen signals for `window_seconds`, across processes."""
+    """Remembers recently seen signals for `window_seconds`, across processes.
 
-    def __init__(self, window_seconds, path=None, max_tracked=4096):
+    `backend` is "sqlite" or "socket" (dedup_service.py at `socket_path`).
+    `sqlite_profile` names an entry of SQLITE_PROFILES, or is a dict of
+    overrides to the "safe" one.
+    """
+
+    def __init__(self, window_seconds, path=None, max_tracked=4096, memory_size=1024,
+                 backend="sqlite", socket_path=None, sqlite_profile="safe"):
         self.window_seconds = window_seconds
         self.path = path or default_db_path()
         self.max_tracked = max_tracked
+        # Pruning takes the table this far below max_tracked, so that it runs
+        # once per that many new keys rather than on every one.
+        self._prune_slack = max(1, max_tracked // 8)
+        self.memory_size = memory_size
         # sqlite3 connections are not shareable between threads.
         self._local = threading.local()
-        if self.window_seconds > 0:
+        # key -> first seen, for keys the shared store is known to hold.
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._marker = self.path + ".forgotten"
+        self._marker_seen = self._marker_state()
+        if isinstance(sqlite_profile, str):
+            self.sqlite_settings = dict(SQLITE_PROFILES[sqlite_profile])
+        else:
+            self.sqlite_settings = {**SQLITE_PROFILES["safe"], **sqlite_profile}
+        if not (self.sqlite_settings["wal_autocheckpoint"]
+                or self.sqlite_settings["checkpoint_seconds"]):
+            raise ValueError("with wal_autocheckpoint=0, checkpoint_seconds is required")
+        self._checkpointer = None
+        self._service = None
+        if backend == "socket":
+            self._service = _ServiceClient(socket_path or default_socket_path())
+        elif self.window_seconds > 0:
             self._init_db()
 
     def _connect(self):
@@ -88,13 +229,47 @@ class DuplicateFilter:
             if directory:
                 os.makedirs(directory, exist_ok=True)
             # isolation_level=None: transactions are managed explicitly below.
-            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn = sqlite3.connect(
+                self.path, timeout=10, isolation_level=None, factory=self._connection_factory
+            )
             # WAL lets the webhook and the email reader write concurrently.
             conn.execute("PRAGMA journal_mode=WAL")
             conn.execute("PRAGMA busy_timeout=10000")
+            settings = self.sqlite_settings
+            conn.execute(f"PRAGMA synchronous={settings['synchronous']}")
+            conn.execute(f"PRAGMA mmap_size={int(settings['mmap_size'])}")
+            conn.execute(f"PRAGMA wal_autocheckpoint={int(settings['wal_autocheckpoint'])}")
             self._local.conn = conn
+            if settings["checkpoint_seconds"]:
+                with self._memory_lock:
+                    if self._checkpointer is None:
+                        self._checkpointer = threading.Thread(
+                            target=self._checkpoint_loop, name="dedup-checkpoint", daemon=True
+                        )
+                        self._checkpointer.start()
         return conn
 
+    # sqlite3.Connection, or a subclass that instruments it (the benchmark).
+    _connection_factory = sqlite3.Connection
+
+    def _checkpoint_loop(self):
+        """Copy the WAL back into the database on a timer, off the check path."""
+        interval = self.sqlite_settings["checkpoint_seconds"]
+        conn = None
+        while True:
+            time.sleep(interval)
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+                # PASSIVE never waits for a writer; what it cannot copy now is
+                # copied next time.
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            except Exception as e:
+                if conn is not None:
+                    conn.close()
+                conn = None
+                logger.warning(f"⚠ Dedup checkpoint failed: {e}")
+
     def _reset_connection(self):
         """Drop a connection that has failed, so the next call reconnects.
 
@@ -102,6 +277,9 @@ class DuplicateFilter:
         cached on the thread and every later check fails open, silently
         disabling duplicate suppression for the life of the process.
         """
+        if self._service is not None:
+            self._service.reset()
+            return
         conn = getattr(self._local, "conn", None)
         self._local.conn = None
         if conn is not None:
@@ -119,6 +297,15 @@ class DuplicateFilter:
             ")"
         )
         conn.execute("CREATE INDEX IF NOT EXISTS seen_ts ON seen (ts)")
+        # The row count, kept up to date by every writer so that the size
+        # limit can be enforced without counting the table.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "  name  TEXT PRIMARY KEY,"
+            "  value INTEGER NOT NULL"
+            ")"
+        )
+        conn.execute("INSERT OR IGNORE INTO meta (name, value) SELECT 'rows', COUNT(*) FROM seen")
 
     def _now(self):
         # Wall clock, not monotonic: the value must be comparable across
@@ -127,59 +314,186 @@ class DuplicateFilter:
 
     def check(self, key):
         """Record the key. Returns True when it was already seen in-window."""
+        return self.check_many([key])[0]
+
+    def check_many(self, keys):
+        """check() for several keys in one transaction, in order.
+
+        Returns one flag per key. A key repeated within `keys` counts as a
+        duplicate of its first occurrence.
+        """
         if self.window_seconds <= 0:
-            return False
+            return [False] * len(keys)
 
         now = self._now()
-        cutoff = now - self.window_seconds
+        remembered = self._recall(keys, now)
+        shared = [key for key in keys if key not in remembered]
+        if not shared:
+            return [True] * len(keys)
+        answers = iter(self._check_shared(shared, now))
+        return [True if key in remembered else next(answers) for key in keys]
+
+    def _check_shared(self, keys, now):
+        """The check itself, against the shared store."""
         try:
-            conn = self._connect()
-            # IMMEDIATE takes the write lock up front, so two processes
-            # cannot both conclude they are the first to see this key.
-            conn.execute("BEGIN IMMEDIATE")
-            try:
-                conn.execute("DELETE FROM seen WHERE ts <= ?", (cutoff,))
-                cursor = conn.execute(
-                    "INSERT OR IGNORE INTO seen (key, ts) VALUES (?, ?)", (key, now)
-                )
-                duplicate = cursor.rowcount == 0
-                if not duplicate:
-                    # Keep only the newest max_tracked rows, so a flood of
-                    # unique payloads cannot grow the file without limit.
-                    conn.execute(
-                        "DELETE FROM seen WHERE key IN ("
-                        "  SELECT key FROM seen ORDER BY ts DESC LIMIT -1 OFFSET ?"
-                        ")",
-                        (self.max_tracked,),
-                    )
-                conn.execute("COMMIT")
-            except Exception:
-                conn.execute("ROLLBACK")
-                raise
-            return duplicate
+            if self._service is not None:
+                reply = self._service.call(op="check", keys=keys, window=self.window_seconds)
+                duplicates = reply["duplicates"]
+                first_seen = dict(zip(keys, reply["first_seen"]))
+            else:
+                duplicates, first_seen = self._check_sqlite(keys, now)
         except Exception as e:
             # Fail open, loudly. Refusing every order because a state file is
             # unwritable would be worse than the duplicate this prevents.
             # Discard the connection so this stays a transient failure.
             self._reset_connection()
             logger.error(f"❌ Duplicate check failed, allowing the signal through: {e}")
-            return False
+            return [False] * len(keys)
+        self._remember(first_seen)
+        return duplicates
+
+    def _check_sqlite(self, keys, now):
+        cutoff = now - self.window_seconds
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so two processes
+        # cannot both conclude they are the first to see this key.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            duplicates = []
+            first_seen = {}
+            added = 0
+            for key in keys:
+                row = conn.execute("SELECT ts FROM seen WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO seen (key, ts) VALUES (?, ?)", (key, now))
+                    added += 1
+                elif row[0] <= cutoff:
+                    # Expired but not yet pruned: a new sighting.
+                    conn.execute("UPDATE seen SET ts = ? WHERE key = ?", (now, key))
+                else:
+                    duplicates.append(True)
+                    first_seen.setdefault(key, row[0])
+                    continue
+                duplicates.append(False)
+                first_seen[key] = now
+            if added:
+                conn.execute("UPDATE meta SET value = value + ? WHERE name = 'rows'", (added,))
+                rows = conn.execute("SELECT value FROM meta WHERE name = 'rows'").fetchone()[0]
+                if rows > self.max_tracked:
+                    self._prune(conn, cutoff)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return duplicates, first_seen
+
+    def _prune(self, conn, cutoff):
+        """Expire old rows, then drop the oldest, down to below max_tracked.
+
+        Runs inside the caller's transaction, once the row count passes
+        max_tracked, so at most once per _prune_slack new keys. Both deletes
+        walk the ts index; neither sorts.
+        """
+        removed = conn.execute("DELETE FROM seen WHERE ts <= ?", (cutoff,)).rowcount
+        keep = self.max_tracked - self._prune_slack
+        removed += conn.execute(
+            "DELETE FROM seen WHERE key IN ("
+            "  SELECT key FROM seen ORDER BY ts DESC LIMIT -1 OFFSET ?"
+            ")",
+            (keep,),
+        ).rowcount
+        conn.execute("UPDATE meta SET value = value - ? WHERE name = 'rows'", (removed,))
 
     def forget(self, key):
         """Drop a key so an equivalent signal is accepted again."""
         if self.window_seconds <= 0:
             return
+        with self._memory_lock:
+            self._memory.pop(key, None)
         try:
-            self._connect().execute("DELETE FROM seen WHERE key = ?", (key,))
+            if self._service is not None:
+                self._service.call(op="forget", key=key)
+            else:
+                self._forget_sqlite(key)
+            # After the delete, so no process can reload the key from the
+            # store once it has seen the marker move.
+            self._bump_marker()
         except Exception as e:
             self._reset_connection()
             logger.error(f"❌ Could not clear duplicate key {key}: {e}")
 
+    def _forget_sqlite(self, key):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM seen WHERE key = ?", (key,)).rowcount
+            conn.execute("UPDATE meta SET value = value - ? WHERE name = 'rows'", (removed,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- the in-process memory ---
+
+    def _marker_state(self):
+        try:
+            stat = os.stat(self._marker)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _bump_marker(self):
+        """Tell every process, this one included, that a key was forgotten."""
+        state = self._marker_state()
+        if state is not None and state[1] >= _MARKER_MAX_BYTES:
+            replacement = f"{self._marker}.{os.getpid()}"
+            with open(replacement, "w") as f:
+                f.write(".")
+            os.replace(replacement, self._marker)  # a new inode, so it reads as changed
+        else:
+            with open(self._marker, "a") as f:
+                f.write(".")
+
+    def _recall(self, keys, now):
+        """The keys that memory can answer as duplicates."""
+        if self.memory_size <= 0:
+            return set()
+        state = self._marker_state()
+        cutoff = now - self.window_seconds
+        with self._memory_lock:
+            if state != self._marker_seen:
+                # Some process forgot a key; which one is not recorded.
+                self._memory.clear()
+                self._marker_seen = state
+                return set()
+            known = set()
+            for key in keys:
+                seen = self._memory.get(key)
+                if seen is None:
+                    continue
+                if seen > cutoff:
+                    known.add(key)
+                else:
+                    del self._memory[key]
+            return known
+
+    def _remember(self, first_seen):
+        if self.memory_size <= 0:
+            return
+        with self._memory_lock:
+            for key, seen in first_seen.items():
+                self._memory[key] = seen
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
     def count(self):
         """Rows currently tracked. For tests and diagnostics."""
         if self.window_seconds <= 0:
             return 0
         try:
+            if self._service is not None:
+                return self._service.call(op="count")["count"]
             return self._connect().execute("SELECT COUNT(*) FROM seen").fetchone()[0]
         except Exception:
             self._reset_connection()
@@ -0,0 +1,282 @@
+"""The duplicate-signal window, held by one local service.
+
+With DEDUP_BACKEND=socket, DuplicateFilter (dedup.py) asks this process
+instead of opening dedup.sqlite3. It keeps the recently seen keys in a dict
+and answers over a Unix socket in the log directory, so a check costs a
+round trip between processes rather than a file lock and a sync to disk.
+The webhook, the email reader and the executor all talk to the same
+service, which is what makes it one window across processes.
+
+Every new key and every forget is appended to dedup.journal before the
+answer goes back, and the journal is replayed at startup. A restart of the
+service therefore cannot let a signal it already saw through again. The
+journal is flushed to the operating system on each write, which survives
+the service crashing; DEDUP_JOURNAL_FSYNC also syncs it to disk, which
+survives the machine crashing, at the cost of most of the speed.
+
+While the service is down, checks fail open, as they do when the SQLite
+file cannot be written.
+"""
+
+import log_setup
+
+# Configure logging before importing modules that create loggers.
+log_setup.configure("dedup_service")
+
+import json  # noqa: E402
+import os  # noqa: E402
+import signal  # noqa: E402
+import socket  # noqa: E402
+import socketserver  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from collections import OrderedDict  # noqa: E402
+
+import config  # noqa: E402
+from dedup import default_socket_path  # noqa: E402
+
+logger = log_setup.get_logger("dedup_service")
+
+JOURNAL_FILENAME = "dedup.journal"
+
+
+def default_journal_path():
+    return os.path.join(log_setup.log_directory(), JOURNAL_FILENAME)
+
+
+class DedupService:
+    """Keys and when they were first seen, with an append-only journal."""
+
+    def __init__(self, journal_path=None, max_tracked=4096, fsync=False):
+        self.journal_path = journal_path or default_journal_path()
+        self.max_tracked = max_tracked
+        self.fsync = fsync
+        # key -> first seen, oldest first.
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+        self._compact()
+
+    def _now(self):
+        # Wall clock, as the SQLite store uses: clients compare against it.
+        return time.time()
+
+    # --- the journal ---
+
+    def _load(self):
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for number, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line)
+                if record[0] == "+":
+                    self._seen.pop(record[2], None)
+                    self._seen[record[2]] = record[1]
+                else:
+                    self._seen.pop(record[1], None)
+            except (ValueError, IndexError, TypeError):
+                # A write cut short by a crash can only be the last line.
+                logger.warning(f"⚠ Skipping unreadable dedup journal line {number}.")
+        self._trim()
+        logger.info(f"📂 Restored {len(self._seen)} recent signal keys from the journal.")
+
+    def _compact(self):
+        """Rewrite the journal as just the keys held now."""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        replacement = self.journal_path + ".tmp"
+        with open(replacement, "w", encoding="utf-8") as f:
+            for key, seen in self._seen.items():
+                f.write(json.dumps(["+", seen, key]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(replacement, self.journal_path)
+        old = getattr(self, "_journal", None)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_lines = len(self._seen)
+        if old is not None:
+            old.close()
+
+    def _append(self, records):
+        self._journal.write("".join(json.dumps(record) + "\n" for record in records))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_lines += len(records)
+        # Rewritten once it is mostly stale lines, so the work stays in
+        # proportion to the writes that made it necessary.
+        if self._journal_lines > 2 * self.max_tracked + 1024:
+            self._compact()
+
+    def _trim(self, cutoff=None):
+        while self._seen:
+            key, seen = next(iter(self._seen.items()))
+            if len(self._seen) <= self.max_tracked and (cutoff is None or seen > cutoff):
+                break
+            del self._seen[key]
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
+
+    # --- requests ---
+
+    def check(self, keys, window):
+        """(duplicate flags, first-seen times), as DuplicateFilter.check_many."""
+        now = self._now()
+        cutoff = now - window
+        duplicates = []
+        first_seen = []
+        records = []
+        with self._lock:
+            for key in keys:
+                seen = self._seen.get(key)
+                if seen is not None and seen > cutoff:
+                    duplicates.append(True)
+                    first_seen.append(seen)
+                    continue
+                # Moved to the end, so the dict stays oldest first.
+                self._seen.pop(key, None)
+                self._seen[key] = now
+                records.append(["+", now, key])
+                duplicates.append(False)
+                first_seen.append(now)
+            if records:
+                self._append(records)
+                self._trim(cutoff)
+        return duplicates, first_seen
+
+    def forget(self, key):
+        with self._lock:
+            if self._seen.pop(key, None) is not None:
+                self._append([["-", key]])
+
+    def count(self):
+        with self._lock:
+            return len(self._seen)
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "check":
+            duplicates, first_seen = self.check(request["keys"], request["window"])
+            return {"duplicates": duplicates, "first_seen": first_seen}
+        if op == "forget":
+            self.forget(request["key"])
+            return {"ok": True}
+        if op == "count":
+            return {"count": self.count()}
+        return {"error": f"unknown op {op!r}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.service.handle(json.loads(line))
+            except Exception as e:
+                logger.error(f"❌ Dedup request failed: {e}")
+                reply = {"error": str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        """Also end the open connections, so clients reconnect to the next one."""
+        super().server_close()
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _claim(path):
+    """Remove a socket left by a service that died, but not a live one."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"another dedup service is already listening on {path}")
+
+
+def serve(service, path=None):
+    """Listen on `path`; the caller runs serve_forever() on the result."""
+    path = path or default_socket_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _claim(path)
+    # Owner-only: anyone who can connect can make a signal look new.
+    previous = os.umask(0o177)
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(previous)
+    server.service = service
+    return server
+
+
+def run_dedup_service(stop=None):
+    """Run until `stop` is set, or forever."""
+    if config.DEDUP_BACKEND != "socket":
+        # Supervisor treats a clean exit as "do not restart".
+        logger.info("⏭ DEDUP_BACKEND=sqlite, the dedup service is not needed.")
+        return
+
+    stop = stop or threading.Event()
+    service = DedupService(fsync=config.DEDUP_JOURNAL_FSYNC)
+    path = config.DEDUP_SOCKET or default_socket_path()
+    server = serve(service, path)
+    thread = threading.Thread(target=server.serve_forever, name="dedup-service", daemon=True)
+    thread.start()
+    logger.info(f"🚀 Dedup service listening on {path}.")
+    try:
+        while not stop.is_set():
+            stop.wait(1)
+    except KeyboardInterrupt:
+        logger.info("🛑 Stopping manually.")
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    run_dedup_service(stopping)
+    sys.exit(0)
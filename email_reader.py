@@ -8,23 +8,46 @@ import hmac  # noqa: E402
 import html  # noqa: E402
 import imaplib  # noqa: E402
 import json  # noqa: E402
+import os  # noqa: E402
 import re  # noqa: E402
+import select  # noqa: E402
 import ssl  # noqa: E402
 import sys  # noqa: E402
+import threading  # noqa: E402
 import time  # noqa: E402
 from email.header import decode_header, make_header  # noqa: E402
 
 import config  # noqa: E402
+import exchanges as exchange_registry  # noqa: E402
+import metrics  # noqa: E402
 from dedup import DuplicateFilter, signal_key  # noqa: E402
 from log_setup import redact, redact_text  # noqa: E402
-from signal_handler import process_signal  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from signal_handler import process_signal, queue_signal  # noqa: E402
 
 logger = log_setup.get_logger("email_reader")
 logger.info("🎉 Email Reader initialized!")
 
 # The \Seen flag stops the same message being reprocessed; this catches a
 # genuinely duplicated delivery, which arrives as a different message.
-_duplicates = DuplicateFilter(config.WEBHOOK_DEDUP_SECONDS)
+_duplicates = DuplicateFilter(
+    config.WEBHOOK_DEDUP_SECONDS,
+    backend=config.DEDUP_BACKEND,
+    socket_path=config.DEDUP_SOCKET or None,
+    sqlite_profile=config.DEDUP_SQLITE_PROFILE,
+)
+
+# With SIGNAL_EXECUTION=outbox alerts are queued for the executor service.
+_outbox = Outbox() if config.SIGNAL_EXECUTION == "outbox" else None
+
+# The polling loop's session, kept open between checks.
+_session = None
+# UIDVALIDITY and UIDNEXT of INBOX, as the current session's SELECT reported them.
+_mailbox = {"uidvalidity": None, "uidnext": None}
+# "logins": sessions opened. "reused": checks made on a session already open.
+# "reconnects": sessions found dead or dropped by the server and replaced.
+# "idle_cycles": IDLE rounds completed, each ended by new mail or the timeout.
+_imap_stats = {"logins": 0, "reused": 0, "reconnects": 0, "idle_cycles": 0}
 
 
 def decode_subject(msg):
@@ -84,13 +107,21 @@ def _connect():
     return mail
 
 
-def _handle_message(mail, e_id):
-    status, msg_data = mail.fetch(e_id, "(BODY.PEEK[])")
-    if status != "OK":
-        return
+def _handle_message(mail, uid, header, fetch_seconds):
+    """Act on one message, given its header as fetched for the batch."""
+    timer = metrics.registry.timer()
+    timer.record("fetch", fetch_seconds)
+    started = time.perf_counter()
+    try:
+        _process_message(mail, uid, header, timer)
+    finally:
+        timer.record("total", fetch_seconds + time.perf_counter() - started)
 
-    msg = email.message_from_bytes(msg_data[0][1])
-    alert_data = parse_email_subject(decode_subject(msg))
+
+def _process_message(mail, uid, header, timer):
+    with timer.stage("parse"):
+        msg = email.message_from_bytes(header)
+        alert_data = parse_email_subject(decode_subject(msg))
 
     if not alert_data:
         logger.info("[Email Reader] 📌 Non-trade email detected, leaving it UNSEEN.")
@@ -100,22 +131,34 @@ def _handle_message(mail, e_id):
         logger.warning("[Email Reader] ❌ Alert payload is not a JSON object.")
         return
 
-    if not hmac.compare_digest(str(alert_data.get("PIN", "")), config.WEBHOOK_PIN):
+    with timer.stage("pin"):
+        pin_ok = hmac.compare_digest(str(alert_data.get("PIN", "")), config.WEBHOOK_PIN)
+    if not pin_ok:
         logger.warning("[Email Reader] ❌ Invalid PIN in email alert.")
         return
 
     # Flag before trading. If the process dies mid-order, an unflagged mail
     # would be picked up again on restart and place the order a second time;
     # a missed signal is preferable to a duplicated one.
-    mail.store(e_id, "+FLAGS", "\\Seen")
+    mail.uid("STORE", uid, "+FLAGS", "(\\Seen)")
 
-    key = signal_key(alert_data)
-    if _duplicates.check(key):
+    with timer.stage("dedup"):
+        key = signal_key(alert_data)
+        duplicate = _duplicates.check(key)
+    if duplicate:
         logger.warning(f"[Email Reader] 🔁 Ignoring duplicate signal ({key})")
         return
 
     logger.info(f"[Email Reader] ✅ Processing alert: {redact(alert_data)}")
-    result = process_signal(alert_data)
+    if _outbox is not None:
+        result = queue_signal(_outbox, alert_data, key, "email", timer)
+        if result["status"] != "queued":
+            logger.error(f"[Email Reader] ❌ Signal rejected: {result['message']}")
+            _duplicates.forget(key)
+        return
+
+    result = process_signal(alert_data, timer)
+    logger.info(f"[Email Reader] ⏱ {timer.log_field()}")
     if result["status"] != "success":
         logger.error(f"[Email Reader] ❌ Signal rejected: {result['message']}")
         if result.get("code") == 400:
@@ -123,42 +166,391 @@ def _handle_message(mail, e_id):
             _duplicates.forget(key)
 
 
-def check_inbox():
-    """Connects to the IMAP server, reads unread emails, and processes only trade-related alerts."""
-    mail = None
+def _open_session():
+    logger.info("[Email Reader] 🔄 Connecting to IMAP server...")
+    mail = _connect()
     try:
-        logger.info("[Email Reader] 🔄 Connecting to IMAP server...")
-        mail = _connect()
         mail.login(config.IMAP_EMAIL, config.IMAP_PASSWORD)
         mail.select("INBOX")
-        logger.info("[Email Reader] ✅ IMAP connection successful.")
+    except Exception:
+        _logout(mail)
+        raise
+    _mailbox["uidvalidity"] = _response_code(mail, "UIDVALIDITY")
+    _mailbox["uidnext"] = _response_code(mail, "UIDNEXT")
+    logger.info("[Email Reader] ✅ IMAP connection successful.")
+    return mail
+
+
+def _logout(mail):
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+
+def _response_code(mail, name):
+    """A numeric response code from the last command, e.g. SELECT's UIDNEXT."""
+    _, data = mail.response(name)
+    try:
+        return int(data[-1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
 
-        # Search for unread emails
-        status, data = mail.search(None, '(UNSEEN)')
+# --- which messages are new ---
+
+STATE_FILENAME = "email_reader_state.json"
+
+# Fetched for each new message: enough to tell an alert from other mail.
+_HEADER_ITEMS = "(UID FLAGS BODY.PEEK[HEADER.FIELDS (SUBJECT)])"
+
+_UID = re.compile(rb"\bUID (\d+)")
+_FLAGS = re.compile(rb"\bFLAGS \(([^)]*)\)")
+
+
+def _state_path():
+    return os.path.join(log_setup.log_directory(), STATE_FILENAME)
+
+
+def _mailbox_name():
+    return f"{config.IMAP_EMAIL}@{config.IMAP_SERVER}/INBOX"
+
+
+def _load_state():
+    try:
+        with open(_state_path(), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def _save_state(state):
+    path = _state_path()
+    replacement = path + ".tmp"
+    try:
+        with open(replacement, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(replacement, path)
+    except OSError as e:
+        # Only costs a search of the unread mail on the next start.
+        logger.warning(f"[Email Reader] ⚠ Could not save {path}: {e}")
+
+
+def _parse_headers(data):
+    """[(uid, flags, header bytes)] from a UID FETCH of _HEADER_ITEMS."""
+    messages = []
+    for part in data:
+        if isinstance(part, tuple):
+            meta, header = part
+            uid = _UID.search(meta)
+            if uid is None:
+                continue
+            flags = _FLAGS.search(meta)
+            messages.append([int(uid.group(1)), flags.group(1) if flags else b"", header])
+        elif messages and isinstance(part, bytes):
+            # Some servers send FLAGS after the header literal.
+            flags = _FLAGS.search(part)
+            if flags:
+                messages[-1][1] = flags.group(1)
+    return [tuple(message) for message in messages]
+
+
+def _is_seen(flags):
+    return b"\\SEEN" in flags.upper().split()
+
+
+def _process_new(mail):
+    """Handle the messages that arrived since the last check.
+
+    Remembers the next UID to look at, per mailbox and UIDVALIDITY, so each
+    message is looked at once: an inbox full of other mail costs nothing
+    after the first time. Only the Subject header is fetched, for all new
+    messages in one command. A message already flagged \\Seen, by this
+    reader before it traded or by a person, is skipped.
+
+    Without a saved position (first start, another mailbox, or the server
+    renumbered its UIDs) the unread messages are searched for instead.
+
+    Stops at the first message that fails, and remembers the position
+    before it. A lost connection is raised, for the caller to reconnect.
+    """
+    validity = _mailbox["uidvalidity"]
+    state = _load_state()
+    start = None
+    if validity is not None and state.get("mailbox") == _mailbox_name() \
+            and state.get("uidvalidity") == validity:
+        start = state.get("next_uid")
+
+    started = time.perf_counter()
+    if start is None:
+        status, data = mail.uid("SEARCH", None, "UNSEEN")
         if status != "OK":
             logger.warning("[Email Reader] ⚠ No new emails or failed to search inbox.")
             return
+        uids = data[0].split()
+        wanted = b",".join(uids).decode() if uids else None
+    else:
+        # n:* also returns the last message when none is as new as n.
+        wanted = f"{start}:*"
+    messages = []
+    if wanted:
+        status, data = mail.uid("FETCH", wanted, _HEADER_ITEMS)
+        if status != "OK":
+            logger.warning("[Email Reader] ⚠ Could not fetch new emails.")
+            return
+        messages = sorted(m for m in _parse_headers(data) if start is None or m[0] >= start)
+    fetch_seconds = time.perf_counter() - started
 
-        email_ids = data[0].split()
-        logger.info(f"[Email Reader] 📩 {len(email_ids)} new emails found.")
+    fresh = sum(not _is_seen(flags) for _, flags, _ in messages)
+    logger.info(f"[Email Reader] 📩 {fresh} new emails found.")
 
-        for e_id in email_ids:
-            try:
-                _handle_message(mail, e_id)
-            except Exception as e:
-                logger.error(f"[Email Reader] ❌ Error processing email {e_id}: {e}")
+    # Advanced only past messages fully handled, so a failure leaves the
+    # failed one, and everything after it, for the next check.
+    next_uid = start
+    try:
+        for uid, flags, header in messages:
+            if not _is_seen(flags):
+                try:
+                    _handle_message(mail, str(uid), header, fetch_seconds)
+                except (imaplib.IMAP4.abort, OSError):
+                    raise
+                except Exception as e:
+                    logger.error(f"[Email Reader] ❌ Error processing email {uid}, will retry: {e}")
+                    return
+            next_uid = uid + 1
+        if _mailbox["uidnext"] is not None:
+            next_uid = max(next_uid or 0, _mailbox["uidnext"])
+    finally:
+        if validity is not None and next_uid is not None:
+            _save_state({"mailbox": _mailbox_name(), "uidvalidity": validity, "next_uid": next_uid})
+    logger.info("[Email Reader] ✅ Finished processing emails.")
+
+
+def _drop_session():
+    global _session
+    if _session is not None:
+        _logout(_session)
+        _session = None
+
+
+def _polling_session():
+    """The open session and whether it is new, reconnecting if it died.
 
-        logger.info("[Email Reader] ✅ Finished processing emails.")
+    A live session costs one NOOP, which is also how IMAP reports new mail
+    to a client that is not idling.
+    """
+    global _session
+    if _session is not None:
+        try:
+            status, _ = _session.noop()
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"NOOP answered {status}")
+            _imap_stats["reused"] += 1
+            return _session, False
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.warning(f"[Email Reader] ⚠ IMAP session lost, reconnecting: {e}")
+            _drop_session()
+            _imap_stats["reconnects"] += 1
+    _session = _open_session()
+    _imap_stats["logins"] += 1
+    return _session, True
+
+
+def check_inbox():
+    """Reads unread emails over the kept session and processes only trade-related alerts.
+
+    Fetches only on a new session or when the server has reported new
+    mail, so a check of an unchanged inbox is one round trip.
+    """
+    try:
+        mail, new = _polling_session()
+        changed = "EXISTS" in mail.untagged_responses
+        # Whatever else NOOP reported is of no use, and would pile up.
+        mail.untagged_responses.clear()
+        if new or changed:
+            _process_new(mail)
     except imaplib.IMAP4.error as e:
         logger.error(f"[Email Reader] ❌ IMAP error: {e}")
+        _drop_session()
     except Exception as e:
         logger.error(f"[Email Reader] ❌ Unexpected error: {e}")
+        _drop_session()
+
+
+# --- IMAP IDLE (RFC 2177) ---
+
+# Seconds to wait for the server to answer IDLE or DONE, and the longest
+# pause between reconnect attempts.
+_IDLE_REPLY_TIMEOUT = 30
+_MAX_BACKOFF = 60
+
+_EXISTS = re.compile(rb"^\* \d+ EXISTS$", re.IGNORECASE)
+
+
+class _IdleLines:
+    """The server's lines during IDLE, through imaplib's own reader, with a deadline.
+
+    imaplib (before Python 3.14) has no IDLE, and its reader cannot wait
+    with a deadline: a timeout leaves its buffered file unusable. So it is
+    only read once there is something to read, either already in its buffer
+    or on the socket. Whatever follows the end of IDLE stays in that buffer
+    for the next command.
+    """
+
+    def __init__(self, mail):
+        self.mail = mail
+        self.sock = mail.socket()
+
+    def buffered(self):
+        """Whether a line can be read without waiting on the network, roughly."""
+        previous = self.sock.gettimeout()
+        self.sock.setblocking(False)
+        try:
+            # Reads the socket only if the buffer is empty, and then only
+            # what has already arrived.
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            self.sock.settimeout(previous)
+
+    def next(self, deadline):
+        """The next line without its CRLF, or None once `deadline` passes."""
+        if not self.buffered():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if not readable:
+                return None
+        line = self.mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        return line.rstrip(b"\r\n")
+
+
+def _idle(mail, timeout):
+    """IDLE until the server reports new mail or `timeout` seconds pass.
+
+    Returns True if a message arrived. Always ends the IDLE, so the session
+    can run other commands afterwards.
+    """
+    if hasattr(mail, "idle"):
+        # Python 3.14+.
+        with mail.idle(duration=timeout) as idler:
+            for kind, _ in idler:
+                if kind == "EXISTS":
+                    return True
+        return False
+
+    lines = _IdleLines(mail)
+    previous = lines.sock.gettimeout()
+    # Only for a read that select() has promised data to, should a TLS
+    # record stall half-way.
+    lines.sock.settimeout(_IDLE_REPLY_TIMEOUT)
+    try:
+        # Left over from the last command: new mail may already be among it.
+        arrived = False
+        while lines.buffered():
+            arrived = bool(_EXISTS.match(lines.next(time.monotonic()))) or arrived
+        if arrived:
+            return True
+
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        deadline = time.monotonic() + _IDLE_REPLY_TIMEOUT
+        while True:
+            reply = lines.next(deadline)
+            if reply is None or reply.startswith(tag + b" "):
+                raise imaplib.IMAP4.error(f"IDLE refused: {reply!r}")
+            if reply.startswith(b"+"):
+                break
+            arrived = arrived or bool(_EXISTS.match(reply))
+
+        deadline = time.monotonic() + timeout
+        while not arrived:
+            line = lines.next(deadline)
+            if line is None:
+                break
+            # Anything else (keep-alives, flag changes, expunges) is noise.
+            arrived = bool(_EXISTS.match(line))
+
+        mail.send(b"DONE\r\n")
+        deadline = time.monotonic() + _IDLE_REPLY_TIMEOUT
+        while True:
+            line = lines.next(deadline)
+            if line is None:
+                raise imaplib.IMAP4.abort("no reply to DONE")
+            if line.startswith(tag + b" "):
+                if not line[len(tag) + 1:].upper().startswith(b"OK"):
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+                return arrived
+            arrived = arrived or bool(_EXISTS.match(line))
     finally:
-        if mail is not None:
-            try:
-                mail.logout()
-            except Exception:
-                pass
+        lines.sock.settimeout(previous)
+
+
+def _supports_idle(mail):
+    status, data = mail.capability()
+    return status == "OK" and b"IDLE" in b" ".join(data).upper().split()
+
+
+def watch_inbox(stop=None):
+    """Handle mail as the server announces it, over one long-lived session.
+
+    Returns False, without handling anything, if the server has no IDLE;
+    otherwise runs until `stop` is set. Connection failures are retried
+    with a growing pause, and nothing is missed meanwhile: every session
+    starts by reading the mail that arrived since the UID saved in
+    email_reader_state.json, with one UID FETCH of <next>:*. If that file
+    is missing or the mailbox's UIDVALIDITY has changed, it searches for
+    unread mail instead, once.
+    """
+    stop = stop or threading.Event()
+    backoff = 1
+    while not stop.is_set():
+        mail = None
+        try:
+            mail = _open_session()
+            _imap_stats["logins"] += 1
+            if not _supports_idle(mail):
+                logger.warning("[Email Reader] ⚠ The IMAP server does not support IDLE, polling instead.")
+                return False
+            backoff = 1
+            logger.info("[Email Reader] 👂 Waiting for new mail (IDLE).")
+            while not stop.is_set():
+                mail.untagged_responses.clear()
+                _process_new(mail)
+                if "EXISTS" in mail.untagged_responses:
+                    # Announced alongside the replies to the search or the
+                    # fetches, so IDLE would not report it again.
+                    continue
+                _idle(mail, config.IMAP_IDLE_TIMEOUT)
+                _imap_stats["idle_cycles"] += 1
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.error(f"[Email Reader] ❌ IMAP session lost, reconnecting in {backoff}s: {e}")
+            if mail is not None:
+                _imap_stats["reconnects"] += 1
+        except Exception as e:
+            logger.error(f"[Email Reader] ❌ Unexpected error, reconnecting in {backoff}s: {e}")
+        finally:
+            if mail is not None:
+                _logout(mail)
+        if stop.is_set():
+            break
+        stop.wait(backoff)
+        backoff = min(backoff * 2, _MAX_BACKOFF)
+    return True
+
+
+def _metrics_report():
+    return {
+        "stages": metrics.registry.snapshot(),
+        "connections": exchange_registry.pool_stats(),
+        "outbox": None if _outbox is None else _outbox.stats(),
+        "imap": dict(_imap_stats),
+    }
 
 
 def run_email_reader():
@@ -169,12 +561,21 @@ def run_email_reader():
         return
 
     logger.info("[Email Reader] 🚀 Starting email reader...")
+    if config.EMAIL_METRICS_PORT:
+        metrics.serve(config.EMAIL_METRICS_PORT, _metrics_report)
+    if config.EXCHANGE_WARMUP:
+        # Nothing to answer meanwhile, so simply finish before the first check.
+        exchange_registry.warm_up()
     try:
+        if config.IMAP_IDLE and watch_inbox():
+            return
         while True:
             check_inbox()
             time.sleep(config.IMAP_CHECK_INTERVAL)
     except KeyboardInterrupt:
         logger.info("[Email Reader] 🛑 Stopping manually.")
+    finally:
+        _drop_session()
 
 
 if __name__ == "__main__":
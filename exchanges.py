@@ -6,22 +6,39 @@ placed spot orders on Binance, because only bot_logic set defaultType.
 Everything now shares the clients built here.
 """
 
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import ccxt
 
+import async_exchanges
 import config
+import fake_exchange
+import http_pool
+import market_cache
+import weight_budget
 from log_setup import get_logger
 
 logger = get_logger("exchanges")
 
 SUPPORTED = ("bybit", "binance")
 
+# Shared by every fan_out() caller. Sized well above the number of clients,
+# so a call stuck past its deadline does not starve the next refresh. One
+# more thread per account in ACCOUNTS_FILE, so a group order goes out at once.
+FAN_OUT_WORKERS = 16
+
 
-def _build_bybit():
-    client = ccxt.bybit(
+def _build_bybit(module=ccxt, settings=None):
+    client = module.bybit(
         {
             "apiKey": config.BYBIT_API_KEY,
             "secret": config.BYBIT_API_SECRET,
             "enableRateLimit": True,
+            **(settings or {}),
         }
     )
     # Timestamp synchronization, otherwise Bybit rejects requests as invalid.
@@ -30,8 +47,8 @@ def _build_bybit():
     return client
 
 
-def _build_binance():
-    client = ccxt.binance(
+def _build_binance(module=ccxt, settings=None):
+    client = module.binance(
         {
             "apiKey": config.BINANCE_API_KEY,
             "secret": config.BINANCE_API_SECRET,
@@ -39,6 +56,7 @@ def _build_binance():
             # Must match what the dashboard reads back, or orders land on spot
             # while positions are fetched from futures.
             "options": {"defaultType": "future"},
+            **(settings or {}),
         }
     )
     client.options["warnOnFetchOpenOrdersWithoutSymbol"] = False
@@ -51,6 +69,28 @@ _BUILDERS = {
 }
 
 
+def _build(name, credentials=None):
+    """A blocking ccxt client, or a blocking view of an async one.
+
+    `credentials` replaces the key pair from config, for named accounts.
+    """
+    if config.EXCHANGE_BACKEND == "fake":
+        return fake_exchange.build(name, credentials)
+    builder, _ = _BUILDERS[name]
+    if not config.EXCHANGE_ASYNC:
+        client = builder(settings=credentials)
+        http_pool.configure(client)
+        weight_budget.attach(client)
+    else:
+        raw = builder(async_exchanges.ccxt_async, {**async_exchanges.settings(), **(credentials or {})})
+        http_pool.configure(raw)
+        weight_budget.attach(raw)
+        client = async_exchanges.wrap(raw)
+    # Same exchange, same market list: every account shares the cache.
+    market_cache.attach(name, client)
+    return client
+
+
 def _load():
     loaded = {}
     for name in SUPPORTED:
@@ -58,9 +98,9 @@ def _load():
             logger.info(f"⏭ {name} not listed in EXCHANGES, skipping.")
             continue
 
-        builder, credentials = _BUILDERS[name]
+        _, credentials = _BUILDERS[name]
         key, secret = credentials()
-        if not key or not secret:
+        if config.EXCHANGE_BACKEND == "ccxt" and (not key or not secret):
             # Building a client anyway would let orders be sent with blank
             # credentials and fail at the exchange instead of here.
             logger.warning(f"⏭ {name} has no API credentials configured, skipping.")
@@ -68,21 +108,290 @@ def _load():
 
         logger.info(f"🔄 Setting up {name} API...")
         try:
-            loaded[name] = builder()
+            loaded[name] = _build(name)
             logger.info(f"✅ {name} successfully initialized!")
         except Exception as e:
             logger.error(f"❌ Error initializing {name}: {e}")
 
+    if loaded and config.EXCHANGE_BACKEND == "fake":
+        logger.warning(f"🧪 EXCHANGE_BACKEND=fake: {list(loaded)} are simulated, no order is real.")
     if loaded:
         logger.info(f"🎉 Loaded exchanges: {list(loaded.keys())}")
     else:
         logger.error("❌ No exchanges loaded! Double-check API keys and config.")
+    if config.EXCHANGE_ASYNC and config.EXCHANGE_BACKEND == "ccxt":
+        async_exchanges.close_at_exit(loaded)
     return loaded
 
 
+def _read_accounts_file(path):
+    """The parsed ACCOUNTS_FILE. Raises ConfigError if it is unusable."""
+    try:
+        with open(path) as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise config.ConfigError(f"ACCOUNTS_FILE {path} could not be read: {e}")
+    if not isinstance(spec, dict) or not isinstance(spec.get("accounts"), dict):
+        raise config.ConfigError(f'ACCOUNTS_FILE {path} must be a JSON object with an "accounts" object.')
+
+    for name, account in spec["accounts"].items():
+        if not isinstance(account, dict):
+            raise config.ConfigError(f"Account {name!r} in ACCOUNTS_FILE must be an object.")
+        if account.get("exchange") not in SUPPORTED:
+            raise config.ConfigError(
+                f"Account {name!r} has exchange {account.get('exchange')!r}; "
+                f"expected one of {', '.join(SUPPORTED)}."
+            )
+        if not account.get("api_key") or not account.get("api_secret"):
+            raise config.ConfigError(f"Account {name!r} needs both api_key and api_secret.")
+        scale = account.get("scale", 1)
+        if isinstance(scale, bool) or not isinstance(scale, (int, float)) or scale <= 0:
+            raise config.ConfigError(f"Account {name!r} scale must be a number greater than zero.")
+
+    groups = spec.get("groups", {})
+    if not isinstance(groups, dict):
+        raise config.ConfigError(f'"groups" in ACCOUNTS_FILE {path} must be an object.')
+    for group, members in groups.items():
+        if not isinstance(members, list) or not members:
+            raise config.ConfigError(f"Group {group!r} must be a non-empty list of account names.")
+        unknown = [member for member in members if member not in spec["accounts"]]
+        if unknown:
+            raise config.ConfigError(f"Group {group!r} lists unknown accounts: {', '.join(map(str, unknown))}.")
+    return spec["accounts"], groups
+
+
+def _load_accounts():
+    """Clients for the named accounts in ACCOUNTS_FILE, and its groups.
+
+    Each account gets a client of its own, with its own connections, so the
+    orders of a group never queue behind each other.
+    """
+    if not config.ACCOUNTS_FILE:
+        return {}, {}
+    specs, groups = _read_accounts_file(config.ACCOUNTS_FILE)
+
+    loaded = {}
+    for name, spec in specs.items():
+        exchange = spec["exchange"]
+        if exchange not in config.ENABLED_EXCHANGES:
+            logger.info(f"⏭ Account {name} is on {exchange}, not listed in EXCHANGES, skipping.")
+            continue
+        try:
+            client = _build(exchange, {"apiKey": spec["api_key"], "secret": spec["api_secret"]})
+        except Exception as e:
+            logger.error(f"❌ Error initializing account {name}: {e}")
+            continue
+        loaded[name] = {
+            "name": name,
+            "exchange": exchange,
+            "client": client,
+            "scale": float(spec.get("scale", 1)),
+        }
+
+    if loaded:
+        logger.info(f"🎉 Loaded accounts: {list(loaded)}; groups: {list(groups)}")
+    if config.EXCHANGE_ASYNC and config.EXCHANGE_BACKEND == "ccxt":
+        async_exchanges.close_at_exit({name: account["client"] for name, account in loaded.items()})
+    return loaded, {group: list(members) for group, members in groups.items()}
+
+
 exchanges = _load()
+accounts, groups = _load_accounts()
+
+_pool = ThreadPoolExecutor(
+    max_workers=FAN_OUT_WORKERS + len(accounts), thread_name_prefix="exchange"
+)
+
+# Progress of warm_up(), reported by the services' health checks.
+_warmup_lock = threading.Lock()
+_warmup = {"state": "disabled", "exchanges": {}, "seconds": None}
 
 
 def get(name):
     """Return a configured client, or None if that exchange is unavailable."""
     return exchanges.get(name)
+
+
+def group(name):
+    """The loaded accounts of a group, in file order, or None if it is unknown.
+
+    Members whose exchange is disabled, or whose client failed to build, are
+    left out.
+    """
+    members = groups.get(name)
+    if members is None:
+        return None
+    return [accounts[member] for member in members if member in accounts]
+
+
+def pool_stats():
+    """Connection reuse counters per exchange, for this process."""
+    return {
+        name: client.pool_stats.snapshot()
+        for name, client in exchanges.items()
+        if getattr(client, "pool_stats", None) is not None
+    }
+
+
+def _start(client, method, args):
+    # Async clients run the request on their event loop; no thread is used.
+    # Either way the caller's context goes along, so a trade stays a trade
+    # to the weight budget.
+    if not callable(method) and hasattr(client, "submit"):
+        return client.submit(method, *args)
+    return _pool.submit(contextvars.copy_context().run, *_bind(client, method, args))
+
+
+def _bind(client, method, args):
+    if callable(method):
+        return (method, client, *args)
+    return (getattr(client, method), *args)
+
+
+def _run_all(calls, timeout):
+    futures = {
+        key: _start(client, method, args)
+        for key, (client, method, *args) in calls.items()
+    }
+    done, _ = wait(futures.values(), timeout=timeout)
+    return futures, done
+
+
+def fan_out(calls, timeout=None):
+    """Run one exchange call per key at the same time.
+
+    `calls` maps a key to `(client, method, *args)`, where `method` is the
+    name of a client method or a function called as `method(client, *args)`.
+    Returns the same keys mapped to `(result, error)`, exactly one of which
+    is None. Each call gets the same deadline; one that misses it is
+    reported as an error for its key alone and left to finish in the
+    background.
+    """
+    if timeout is None:
+        timeout = config.EXCHANGE_READ_TIMEOUT
+
+    futures, done = _run_all(calls, timeout)
+
+    outcome = {}
+    for key, future in futures.items():
+        if future not in done:
+            future.cancel()
+            outcome[key] = (None, f"timed out after {timeout:g}s")
+        elif future.exception() is not None:
+            outcome[key] = (None, str(future.exception()))
+        else:
+            outcome[key] = (future.result(), None)
+    return outcome
+
+
+def order_deadline():
+    """Seconds place_orders() waits before calling an order's outcome unknown.
+
+    ccxt gives up on each request after EXCHANGE_TIMEOUT_MS. Twice that
+    leaves room for a request ahead of the order on a cold client (markets,
+    clock offset).
+    """
+    return 2 * config.EXCHANGE_TIMEOUT_MS / 1000
+
+
+def place_orders(calls, timeout=None):
+    """fan_out() for orders, which must not be called failed just for being slow.
+
+    Returns the keys of `calls` mapped to `(state, result)`: ("ok", order),
+    ("error", message) when the exchange refused or was never reached, or
+    ("unknown", message) when the order may have been placed: still running
+    at the deadline, or timed out by ccxt after being sent. An order still
+    running is left to finish, and its outcome is logged when it does.
+    """
+    if timeout is None:
+        timeout = order_deadline()
+
+    futures, done = _run_all(calls, timeout)
+
+    outcome = {}
+    for key, future in futures.items():
+        if future not in done:
+            outcome[key] = ("unknown", f"no answer within {timeout:g}s, the order may still be placed")
+            future.add_done_callback(lambda f, key=key: _log_late_order(key, f))
+        elif isinstance(future.exception(), ccxt.RequestTimeout):
+            outcome[key] = ("unknown", f"request timed out, the order may have been placed: {future.exception()}")
+        elif future.exception() is not None:
+            outcome[key] = ("error", str(future.exception()))
+        else:
+            outcome[key] = ("ok", future.result())
+    return outcome
+
+
+def _log_late_order(key, future):
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        logger.warning(f"⚠ Order for {key} failed after its deadline: {future.exception()}")
+    else:
+        logger.warning(f"⚠ Order for {key} was placed after its deadline: {future.result()}")
+
+
+def _warm(client):
+    """Markets, clock offset and an open connection for one client."""
+    # Usually served from the on-disk market cache, in which case nothing
+    # has touched the network yet.
+    client.load_markets()
+    if client.options.get("adjustForTimeDifference"):
+        client.load_time_difference()
+    else:
+        client.fetch_time()
+
+
+def warm_up(timeout=None):
+    """Pay the first-request costs now instead of inside the first order.
+
+    ccxt otherwise loads the market list lazily on the first order, and
+    Bybit needs its clock offset before it accepts a signed request. The
+    request that fetches the offset, or the server time, also resolves DNS
+    and opens the TLS connection the order will reuse. Exchanges are warmed
+    in parallel; one that fails or misses the deadline is logged and left
+    to warm lazily, as before.
+    """
+    if timeout is None:
+        timeout = config.EXCHANGE_WARMUP_TIMEOUT
+    with _warmup_lock:
+        _warmup.update(state="running", exchanges={}, seconds=None)
+
+    # Accounts are warmed too: each has its own clock offset and connections.
+    clients = dict(exchanges)
+    clients.update({f"account:{name}": account["client"] for name, account in accounts.items()})
+    logger.info(f"🔥 Warming up exchanges: {list(clients)}")
+    started = time.monotonic()
+    outcome = fan_out(
+        {name: (client, _warm) for name, client in clients.items()},
+        timeout=timeout,
+    )
+    results = {}
+    for name, (_, error) in outcome.items():
+        if error is None:
+            results[name] = "ok"
+            logger.info(f"✅ {name} warmed up.")
+        else:
+            results[name] = error
+            logger.warning(f"⚠ {name} warm-up failed, it will warm on first use: {error}")
+
+    with _warmup_lock:
+        _warmup.update(
+            state="done", exchanges=results, seconds=round(time.monotonic() - started, 3)
+        )
+    return results
+
+
+def start_warm_up(timeout=None):
+    """warm_up() in the background, so the service can answer /health."""
+    with _warmup_lock:
+        _warmup["state"] = "running"
+    thread = threading.Thread(target=warm_up, args=(timeout,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_status():
+    """Copy of the warm-up progress: state is disabled, running or done."""
+    with _warmup_lock:
+        return dict(_warmup, exchanges=dict(_warmup["exchanges"]))
@@ -0,0 +1,131 @@
+"""Places the signals the webhook and email reader queue in the outbox.
+
+Runs only with SIGNAL_EXECUTION=outbox (see outbox.py). One worker thread
+per exchange takes that exchange's signals oldest first, one at a time, so
+a close never overtakes the open it closes, and a slow exchange does not
+hold up the others. The clients stay warm for the life of the process.
+"""
+
+import log_setup
+
+# Configure logging before importing modules that create loggers.
+log_setup.configure("executor")
+
+import signal  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+
+import config  # noqa: E402
+import exchanges as exchange_registry  # noqa: E402
+import metrics  # noqa: E402
+from dedup import DuplicateFilter  # noqa: E402
+from outbox import ERROR, OK, Outbox  # noqa: E402
+from signal_handler import process_signal  # noqa: E402
+
+logger = log_setup.get_logger("executor")
+
+_duplicates = DuplicateFilter(
+    config.WEBHOOK_DEDUP_SECONDS,
+    backend=config.DEDUP_BACKEND,
+    socket_path=config.DEDUP_SOCKET or None,
+    sqlite_profile=config.DEDUP_SQLITE_PROFILE,
+)
+
+
+def execute(outbox, row):
+    """Place one claimed signal and record how it ended."""
+    timer = metrics.registry.timer()
+    timer.record("queue_wait", row["started_at"] - row["enqueued_at"])
+    try:
+        result = process_signal(row["payload"], timer)
+    except Exception as e:
+        result = {"status": "error", "message": str(e), "code": 500}
+
+    if result["status"] == "success":
+        outbox.finish(row["id"], OK, result["order"], 200)
+        logger.info(f"✅ Signal {row['id']} from {row['source']} placed. {timer.log_field()}")
+        return
+
+    # Rejected before reaching the exchange: a corrected resend must not be
+    # suppressed. An exchange-side failure keeps the key, as inline.
+    if result.get("code") == 400 and row["dedup_key"]:
+        _duplicates.forget(row["dedup_key"])
+    outbox.finish(row["id"], ERROR, result["message"], result.get("code", 502))
+    logger.error(f"❌ Signal {row['id']} from {row['source']} failed: {result['message']}")
+
+
+def drain(outbox, exchange, stop=None):
+    """Execute the exchange's queued signals until none are left. Returns the count."""
+    done = 0
+    while stop is None or not stop.is_set():
+        row = outbox.claim_next(exchange, config.OUTBOX_MAX_AGE_SECONDS)
+        if row is None:
+            return done
+        execute(outbox, row)
+        done += 1
+    return done
+
+
+def _work(outbox, exchange, stop):
+    logger.info(f"🚀 Executing {exchange} signals.")
+    while not stop.is_set():
+        try:
+            if not drain(outbox, exchange, stop):
+                stop.wait(config.OUTBOX_POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"❌ {exchange} executor error: {e}")
+            stop.wait(1)
+
+
+def _metrics_report(outbox):
+    return {
+        "outbox": outbox.stats(),
+        "stages": metrics.registry.snapshot(),
+        "connections": exchange_registry.pool_stats(),
+    }
+
+
+def run_executor(stop=None):
+    """Run until `stop` is set, or forever."""
+    if config.SIGNAL_EXECUTION != "outbox":
+        # Supervisor treats a clean exit as "do not restart".
+        logger.info("⏭ SIGNAL_EXECUTION=inline, the executor is not needed.")
+        return
+
+    stop = stop or threading.Event()
+    outbox = Outbox()
+    outbox.recover()
+    # Keeping warm clients is the point of this service, so always warm up.
+    exchange_registry.warm_up()
+    if config.EXECUTOR_METRICS_PORT:
+        metrics.serve(config.EXECUTOR_METRICS_PORT, lambda: _metrics_report(outbox))
+
+    workers = [
+        threading.Thread(
+            target=_work, args=(outbox, name, stop), name=f"executor-{name}", daemon=True
+        )
+        # An exchange used only through ACCOUNTS_FILE groups still has a queue.
+        for name in dict.fromkeys(
+            [*exchange_registry.exchanges,
+             *(account["exchange"] for account in exchange_registry.accounts.values())]
+        )
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while not stop.is_set():
+            stop.wait(1)
+    except KeyboardInterrupt:
+        logger.info("🛑 Stopping manually.")
+        stop.set()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    stopping = threading.Event()
+    # On SIGTERM finish the order in flight, then exit, so that it is not
+    # left interrupted with an unknown outcome.
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    run_executor(stopping)
+    sys.exit(0)
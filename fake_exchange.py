@@ -0,0 +1,406 @@
+"""A simulated exchange, for running the whole stack with no network.
+
+Selected with EXCHANGE_BACKEND=fake: every enabled exchange, and every
+account in ACCOUNTS_FILE, is then one of these instead of a ccxt client.
+It answers the ccxt calls TradeX makes (orders, batch orders, cancels,
+positions, open orders, balances, markets) from state kept in memory, so
+the webhook, email reader, executor and dashboard behave as they would
+against a real account, and can be load tested on a laptop.
+
+Each call first waits for a latency drawn from FAKE_EXCHANGE_LATENCY and
+fails with probability FAKE_EXCHANGE_ERROR_RATE, before it changes
+anything. Positions are one-way (netted per symbol) linear USDT contracts
+at a fixed leverage. Market orders, and limit orders that cross, fill at
+the mark price; other limit orders rest until set_price() crosses them.
+A reduceOnly order that would open or grow a position is rejected, and one
+larger than the position only closes it, as on Binance and Bybit.
+
+Nothing here is persisted, and each process has its own simulated account.
+"""
+
+import math
+import random
+import threading
+import time
+
+import ccxt
+
+import config
+from log_setup import get_logger
+
+logger = get_logger("fake_exchange")
+
+LEVERAGE = 10
+TAKER_FEE = 0.00055
+SETTLE = "USDT"
+
+# base -> (starting mark price, amount step, price tick)
+_INSTRUMENTS = {
+    "BTC": (65000.0, 0.001, 0.1),
+    "ETH": (3500.0, 0.01, 0.01),
+    "SOL": (150.0, 0.1, 0.001),
+    "XRP": (0.6, 1.0, 0.0001),
+    "DOGE": (0.15, 1.0, 0.00001),
+}
+
+
+def _market(base, step, tick):
+    return {
+        "id": f"{base}{SETTLE}",
+        "symbol": f"{base}/{SETTLE}:{SETTLE}",
+        "base": base,
+        "quote": SETTLE,
+        "settle": SETTLE,
+        "baseId": base,
+        "quoteId": SETTLE,
+        "settleId": SETTLE,
+        "type": "swap",
+        "spot": False,
+        "swap": True,
+        "future": False,
+        "linear": True,
+        "inverse": False,
+        "contract": True,
+        "contractSize": 1.0,
+        "active": True,
+        "precision": {"amount": step, "price": tick},
+        "limits": {
+            "amount": {"min": step, "max": step * 1_000_000},
+            "price": {"min": tick, "max": None},
+            "cost": {"min": None, "max": None},
+            "leverage": {"min": 1, "max": 100},
+        },
+        "info": {},
+    }
+
+
+def _markets():
+    return [_market(base, step, tick) for base, (_, step, tick) in _INSTRUMENTS.items()]
+
+
+def parse_latency(spec):
+    """A function of a random.Random returning seconds, from a latency spec.
+
+    "0", "fixed:MS", "uniform:LOW_MS:HIGH_MS" or "lognormal:MEDIAN_MS:P99_MS".
+    Raises ConfigError for anything else.
+    """
+    parts = str(spec).strip().lower().split(":")
+    try:
+        numbers = [float(part) for part in parts[1:]]
+    except ValueError:
+        numbers = None
+    kind = parts[0]
+
+    if kind in ("", "0", "none"):
+        return lambda rng: 0.0
+    if numbers is not None and kind == "fixed" and len(numbers) == 1 and numbers[0] >= 0:
+        return lambda rng: numbers[0] / 1000
+    if numbers is not None and kind == "uniform" and len(numbers) == 2 and 0 <= numbers[0] <= numbers[1]:
+        low, high = numbers
+        return lambda rng: rng.uniform(low, high) / 1000
+    if numbers is not None and kind == "lognormal" and len(numbers) == 2 and 0 < numbers[0] <= numbers[1]:
+        median, p99 = numbers
+        # 2.326 is the standard normal's 99th percentile.
+        sigma = math.log(p99 / median) / 2.326
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+    raise config.ConfigError(
+        f"FAKE_EXCHANGE_LATENCY must be 0, fixed:MS, uniform:LOW:HIGH or "
+        f"lognormal:MEDIAN:P99 (milliseconds), got {spec!r}."
+    )
+
+
+class FakeExchange(ccxt.Exchange):
+    """One simulated account on one exchange."""
+
+    def describe(self):
+        return self.deep_extend(super().describe(), {
+            "id": "fake",
+            "name": "Simulated exchange",
+            "rateLimit": 50,
+            "precisionMode": ccxt.TICK_SIZE,
+            "has": {
+                "cancelOrder": True,
+                "createOrder": True,
+                "createOrders": True,
+                "fetchBalance": True,
+                "fetchOpenOrders": True,
+                "fetchPositions": True,
+            },
+        })
+
+    def __init__(self, name="fake", latency="0", error_rate=0.0, balance=10000.0, seed=None,
+                 settings=None):
+        super().__init__(settings or {})
+        self.id = name
+        self._latency = parse_latency(latency)
+        self._error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._wallet = float(balance)
+        self._positions = {}  # symbol -> {"contracts": signed, "entry": price}
+        self._open_orders = {}
+        self._next_order = 0
+        self._marks = {}
+        self.set_markets(_markets())
+        for base, (price, _, _) in _INSTRUMENTS.items():
+            self._marks[f"{base}/{SETTLE}:{SETTLE}"] = price
+
+    # --- simulated network ---
+
+    def _io(self):
+        """Wait, then maybe fail, as a round trip to the exchange would."""
+        with self._lock:
+            delay = self._latency(self._rng)
+            fails = self._rng.random() < self._error_rate
+        if delay:
+            time.sleep(delay)
+        if fails:
+            raise ccxt.ExchangeNotAvailable(f"{self.id} (simulated) is not available")
+
+    # --- markets and time ---
+
+    def fetch_markets(self, params={}):
+        self._io()
+        return _markets()
+
+    def fetch_currencies(self, params={}):
+        return {}
+
+    def fetch_time(self, params={}):
+        self._io()
+        return self.milliseconds()
+
+    def set_price(self, symbol, price):
+        """Move the mark price, filling any resting limit order it crosses."""
+        symbol = self.market(symbol)["symbol"]
+        with self._lock:
+            self._marks[symbol] = float(price)
+            for order in list(self._open_orders.values()):
+                if order["symbol"] == symbol and self._crosses(order["side"], order["price"], price):
+                    del self._open_orders[order["id"]]
+                    try:
+                        self._fill(order, float(price))
+                    except ccxt.BaseError as e:
+                        # E.g. a reduce-only order whose position has gone.
+                        order.update(status="rejected")
+                        logger.warning(f"⚠ Resting order {order['id']} rejected on fill: {e}")
+
+    # --- orders ---
+
+    @staticmethod
+    def _crosses(side, limit, mark):
+        return mark <= limit if side == "buy" else mark >= limit
+
+    def _order(self, symbol, order_type, side, amount, price, reduce_only):
+        self._next_order += 1
+        now = self.milliseconds()
+        return {
+            "id": f"{self.id}-{self._next_order}",
+            "clientOrderId": None,
+            "timestamp": now,
+            "datetime": self.iso8601(now),
+            "lastTradeTimestamp": None,
+            "symbol": symbol,
+            "type": order_type,
+            "timeInForce": "IOC" if order_type == "market" else "GTC",
+            "side": side,
+            "amount": amount,
+            "price": price,
+            "average": None,
+            "filled": 0.0,
+            "remaining": amount,
+            "cost": 0.0,
+            "status": "open",
+            "reduceOnly": reduce_only,
+            "fee": None,
+            "trades": [],
+            "info": {},
+        }
+
+    def _fill(self, order, mark):
+        """Apply a fill at `mark` to the position and wallet. Caller holds the lock."""
+        symbol = order["symbol"]
+        position = self._positions.get(symbol, {"contracts": 0.0, "entry": 0.0})
+        held = position["contracts"]
+        signed = order["amount"] if order["side"] == "buy" else -order["amount"]
+
+        if order["reduceOnly"]:
+            if held == 0 or (held > 0) == (signed > 0):
+                raise ccxt.InvalidOrder(f"{self.id}: reduce-only order would not reduce the position")
+            if abs(signed) > abs(held):
+                signed = -held
+
+        closing = 0.0
+        if held and (held > 0) != (signed > 0):
+            closing = min(abs(signed), abs(held))
+        opening = abs(signed) - closing
+        if opening:
+            free = self._free()
+            needed = opening * mark / LEVERAGE + opening * mark * TAKER_FEE
+            if needed > free:
+                raise ccxt.InsufficientFunds(
+                    f"{self.id}: order needs {needed:.2f} {SETTLE} of margin, {free:.2f} free"
+                )
+
+        filled = abs(signed)
+        self._wallet -= filled * mark * TAKER_FEE
+        if closing:
+            direction = 1 if held > 0 else -1
+            self._wallet += (mark - position["entry"]) * closing * direction
+        remaining = held + signed
+        if remaining == 0 or abs(remaining) < 1e-12:
+            self._positions.pop(symbol, None)
+        else:
+            if opening and closing:
+                entry = mark  # flipped: the new position opened at the mark
+            elif opening:
+                entry = (abs(held) * position["entry"] + opening * mark) / abs(remaining)
+            else:
+                entry = position["entry"]
+            self._positions[symbol] = {"contracts": remaining, "entry": entry}
+
+        order.update(
+            status="closed",
+            filled=filled,
+            remaining=0.0,
+            average=mark,
+            cost=filled * mark,
+            lastTradeTimestamp=self.milliseconds(),
+            fee={"currency": SETTLE, "cost": filled * mark * TAKER_FEE, "rate": TAKER_FEE},
+        )
+        return order
+
+    def _place(self, symbol, order_type, side, amount, price, params):
+        """One order, under the lock. Raises as the exchange would reject it."""
+        market = self.market(symbol)
+        symbol = market["symbol"]
+        if side not in ("buy", "sell"):
+            raise ccxt.InvalidOrder(f"{self.id}: invalid side {side!r}")
+        if order_type not in ("market", "limit"):
+            raise ccxt.InvalidOrder(f"{self.id}: unsupported order type {order_type!r}")
+        amount = float(self.amount_to_precision(symbol, amount))
+        if order_type == "limit":
+            if price is None:
+                raise ccxt.ArgumentsRequired(f"{self.id}: a limit order needs a price")
+            price = float(self.price_to_precision(symbol, price))
+        reduce_only = bool((params or {}).get("reduceOnly"))
+
+        order = self._order(symbol, order_type, side, amount, price, reduce_only)
+        mark = self._marks[symbol]
+        if order_type == "market" or self._crosses(side, price, mark):
+            return self._fill(order, mark)
+        if not reduce_only:
+            needed = amount * price / LEVERAGE
+            if needed > self._free():
+                raise ccxt.InsufficientFunds(f"{self.id}: order needs {needed:.2f} {SETTLE} of margin")
+        self._open_orders[order["id"]] = order
+        return dict(order)
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._io()
+        with self._lock:
+            return self._place(symbol, type, side, amount, price, params)
+
+    def create_orders(self, orders, params={}):
+        """A batch in one round trip; each entry succeeds or is rejected alone."""
+        self._io()
+        results = []
+        with self._lock:
+            for entry in orders:
+                try:
+                    results.append(self._place(
+                        entry["symbol"], entry["type"], entry["side"], entry["amount"],
+                        entry.get("price"), entry.get("params"),
+                    ))
+                except ccxt.BaseError as e:
+                    results.append({"id": None, "status": "rejected", "info": {"msg": str(e)}})
+        return results
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._io()
+        with self._lock:
+            order = self._open_orders.pop(id, None)
+        if order is None:
+            raise ccxt.OrderNotFound(f"{self.id}: order {id} not found")
+        order.update(status="canceled")
+        return order
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._io()
+        with self._lock:
+            orders = [dict(order) for order in self._open_orders.values()]
+        if symbol is not None:
+            orders = [order for order in orders if order["symbol"] == self.market(symbol)["symbol"]]
+        return orders
+
+    # --- account ---
+
+    def _used(self):
+        used = sum(abs(p["contracts"]) * p["entry"] / LEVERAGE for p in self._positions.values())
+        used += sum(
+            o["amount"] * o["price"] / LEVERAGE
+            for o in self._open_orders.values()
+            if not o["reduceOnly"]
+        )
+        return used
+
+    def _unrealized(self, symbol, position):
+        return (self._marks[symbol] - position["entry"]) * position["contracts"]
+
+    def _free(self):
+        upnl = sum(self._unrealized(s, p) for s, p in self._positions.items())
+        return self._wallet + upnl - self._used()
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._io()
+        with self._lock:
+            positions = []
+            for symbol, position in self._positions.items():
+                if symbols and symbol not in symbols:
+                    continue
+                mark = self._marks[symbol]
+                contracts = abs(position["contracts"])
+                notional = contracts * mark
+                positions.append({
+                    "symbol": symbol,
+                    "side": "long" if position["contracts"] > 0 else "short",
+                    "contracts": contracts,
+                    "contractSize": 1.0,
+                    "entryPrice": position["entry"],
+                    "markPrice": mark,
+                    "notional": notional,
+                    "leverage": LEVERAGE,
+                    "initialMargin": contracts * position["entry"] / LEVERAGE,
+                    "unrealizedPnl": self._unrealized(symbol, position),
+                    "liquidationPrice": None,
+                    "marginRatio": None,
+                    "marginMode": "cross",
+                    "info": {},
+                })
+            return positions
+
+    def fetch_balance(self, params={}):
+        self._io()
+        with self._lock:
+            used = self._used()
+            free = self._free()
+            total = self._wallet
+        return {
+            SETTLE: {"free": free, "used": used, "total": total},
+            "free": {SETTLE: free},
+            "used": {SETTLE: used},
+            "total": {SETTLE: total},
+            "info": {},
+        }
+
+
+def build(name, credentials=None):
+    """A simulated client for exchange `name`, configured from config."""
+    return FakeExchange(
+        name,
+        latency=config.FAKE_EXCHANGE_LATENCY,
+        error_rate=config.FAKE_EXCHANGE_ERROR_RATE,
+        balance=config.FAKE_EXCHANGE_BALANCE,
+        seed=config.FAKE_EXCHANGE_SEED,
+        settings=credentials,
+    )
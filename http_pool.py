@@ -0,0 +1,204 @@
+"""Connection pooling for the exchange clients, and counters that prove it.
+
+An order that has to open a new connection first pays DNS, TCP and a TLS
+handshake, easily more than the order itself. ccxt's default sessions do
+pool connections, but nothing showed whether they were actually reused
+between one signal and the next: the async client's pool drops a
+connection after 15 idle seconds, and a firewall or NAT may silently drop
+an idle socket long before the exchange does.
+
+configure() sizes each client's pool, keeps idle connections usable for
+EXCHANGE_KEEPALIVE_SECONDS, applies EXCHANGE_TIMEOUT_MS, and attaches a
+PoolStats counting new versus reused connections and the time spent
+connecting.
+"""
+
+import inspect
+import socket
+import threading
+import time
+
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from urllib3.connection import HTTPConnection
+
+import config
+
+# Idle seconds before the OS starts probing a pooled socket, so middleboxes
+# see traffic and keep the connection open.
+TCP_KEEPALIVE_IDLE = 30
+
+
+class PoolStats:
+    """New versus reused connections for one client."""
+
+    def __init__(self):
+        self.new = 0
+        self.reused = 0
+        self.connect_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def opened(self, seconds):
+        with self._lock:
+            self.new += 1
+            self.connect_seconds += seconds
+
+    def reuse(self):
+        with self._lock:
+            self.reused += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.new + self.reused
+            return {
+                "new": self.new,
+                "reused": self.reused,
+                "reuse_rate": round(self.reused / total, 4) if total else None,
+                "connect_ms_total": round(self.connect_seconds * 1000, 3),
+                "connect_ms_avg": round(self.connect_seconds * 1000 / self.new, 3) if self.new else None,
+            }
+
+
+def _socket_options():
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE))
+    return options
+
+
+def _count_connections(pool, stats):
+    """Count what urllib3 hands out: a pooled socket, or a fresh connect."""
+    get_conn = pool._get_conn
+    new_conn = pool._new_conn
+
+    def _get_conn(timeout=None):
+        conn = get_conn(timeout)
+        # A connection with a live socket was used before and kept.
+        if getattr(conn, "sock", None) is not None:
+            stats.reuse()
+        return conn
+
+    def _new_conn():
+        conn = new_conn()
+        connect = conn.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            connect()
+            stats.opened(time.perf_counter() - started)
+
+        conn.connect = timed_connect
+        return conn
+
+    pool._get_conn = _get_conn
+    pool._new_conn = _new_conn
+
+
+class _CountingPoolManager(PoolManager):
+    def __init__(self, *args, stats, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        _count_connections(pool, self.stats)
+        return pool
+
+
+class PooledAdapter(HTTPAdapter):
+    """requests adapter with a sized, counted, keep-alive connection pool."""
+
+    def __init__(self, stats, pool_size):
+        self.stats = stats
+        # ccxt retries nothing itself; neither should the transport, or an
+        # order could be sent twice.
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        pool_kwargs.setdefault("socket_options", _socket_options())
+        self.poolmanager = _CountingPoolManager(
+            num_pools=connections, maxsize=maxsize, block=block, stats=self.stats, **pool_kwargs
+        )
+
+
+def _configure_sync(client, stats):
+    adapter = PooledAdapter(stats, config.EXCHANGE_POOL_SIZE)
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    if config.EXCHANGE_KEEPALIVE_SECONDS <= 0:
+        client.session.headers["Connection"] = "close"
+
+
+def _trace(stats):
+    trace = aiohttp.TraceConfig()
+
+    async def create_start(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def create_end(session, context, params):
+        stats.opened(time.perf_counter() - context.connect_started)
+
+    async def reused(session, context, params):
+        stats.reuse()
+
+    trace.on_connection_create_start.append(create_start)
+    trace.on_connection_create_end.append(create_end)
+    trace.on_connection_reuseconn.append(reused)
+    return trace
+
+
+def _configure_async(client, stats):
+    """Replace the aiohttp session ccxt would open with a tuned one.
+
+    ccxt opens its session lazily, on the event loop, from open(). The
+    wrapper lets ccxt set up the loop and SSL context as usual, then builds
+    the connector itself. The client still owns the session, so close()
+    tears it down as before.
+    """
+    original = client.open
+
+    def open(lazy=False):
+        if client.session is not None or not client.own_session:
+            return original(lazy)
+        client.own_session = False
+        try:
+            original(lazy)
+        finally:
+            client.own_session = True
+
+        keepalive = config.EXCHANGE_KEEPALIVE_SECONDS
+        tuning = {"keepalive_timeout": keepalive} if keepalive > 0 else {"force_close": True}
+        client.tcp_connector = aiohttp.TCPConnector(
+            ssl=client.ssl_context,
+            loop=client.asyncio_loop,
+            enable_cleanup_closed=True,
+            family=socket.AF_UNSPEC,
+            happy_eyeballs_delay=0,
+            limit_per_host=config.EXCHANGE_POOL_SIZE,
+            **tuning,
+        )
+        client.session = aiohttp.ClientSession(
+            loop=client.asyncio_loop,
+            connector=client.tcp_connector,
+            trust_env=client.aiohttp_trust_env,
+            trace_configs=[_trace(stats)],
+        )
+
+    client.open = open
+
+
+def configure(client):
+    """Apply pool, keep-alive and timeout settings; returns the client's PoolStats."""
+    stats = PoolStats()
+    client.timeout = config.EXCHANGE_TIMEOUT_MS
+    if inspect.iscoroutinefunction(client.fetch):
+        _configure_async(client, stats)
+    else:
+        _configure_sync(client, stats)
+    client.pool_stats = stats
+    return stats
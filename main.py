@@ -9,6 +9,8 @@ import threading
 import config
 import serve
 from email_reader import run_email_reader
+from dedup_service import run_dedup_service
+from executor import run_executor
 
 logging.basicConfig(level=logging.INFO)
 
@@ -37,6 +39,22 @@ def start_gunicorn(service):
     processes.append(subprocess.Popen(command, env=serve.environment(service)))
 
 
+def start_executor():
+    """Start the outbox executor in a background thread."""
+    logging.info("Starting Executor...")
+    executor_thread = threading.Thread(target=run_executor, daemon=True)
+    executor_thread.start()
+    return executor_thread
+
+
+def start_dedup_service():
+    """Start the dedup service in a background thread."""
+    logging.info("Starting Dedup Service...")
+    dedup_thread = threading.Thread(target=run_dedup_service, daemon=True)
+    dedup_thread.start()
+    return dedup_thread
+
+
 def start_email_reader():
     """Start the email reader in a background thread."""
     logging.info("Starting Email Reader...")
@@ -46,6 +64,10 @@ def start_email_reader():
 
 
 if __name__ == "__main__":
+    # Before the services that check against it.
+    if config.DEDUP_BACKEND == "socket":
+        start_dedup_service()
+
     # MODE is validated in config, so no second check is needed here.
     if config.WEBHOOK_ENABLED:
         start_gunicorn("webhook")
@@ -53,6 +75,9 @@ if __name__ == "__main__":
     if config.EMAIL_ENABLED:
         start_email_reader()
 
+    if config.SIGNAL_EXECUTION == "outbox":
+        start_executor()
+
     # Always start the dashboard
     start_gunicorn("dashboard")
 
@@ -0,0 +1,225 @@
+"""On-disk copy of each exchange's market list, shared by every service.
+
+ccxt downloads the full market list, several MB per exchange, the first time
+a client needs it. Every gunicorn process and the email reader used to do
+that separately, and again after every supervisor restart. The list changes
+rarely, so it is kept on disk beside the logs and loaded from there; the
+network is only used when the file is missing, too old, or written by a
+different cache format or ccxt version.
+"""
+
+import inspect
+import json
+import os
+import threading
+import time
+
+import ccxt
+
+import config
+import log_setup
+
+logger = log_setup.get_logger("market_cache")
+
+# Bump when the file layout changes, so old files are ignored, not misread.
+CACHE_VERSION = 1
+
+DIRECTORY_NAME = "markets"
+
+
+def default_directory():
+    """Beside the dedup store, which every service can already write."""
+    return os.path.join(log_setup.log_directory(), DIRECTORY_NAME)
+
+
+def _path(name, directory=None):
+    return os.path.join(directory or default_directory(), f"{name}.json")
+
+
+def _now():
+    # Wall clock: the age must be comparable across processes.
+    return time.time()
+
+
+def save(name, client, directory=None):
+    """Write the client's loaded markets. Never raises."""
+    if not client.markets:
+        return
+    path = _path(name, directory)
+    document = {
+        "version": CACHE_VERSION,
+        "ccxt": ccxt.__version__,
+        "exchange": client.id,
+        "saved_at": _now(),
+        "markets": client.markets,
+        "currencies": client.currencies,
+    }
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so a reader never sees half a file.
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(document, f, default=str)
+        os.replace(temporary, path)
+        logger.info(f"💾 Saved {len(client.markets)} {name} markets to {path}")
+    except Exception as e:
+        logger.error(f"❌ Could not save {name} markets to {path}: {e}")
+
+
+def restore(name, client, max_age, directory=None):
+    """Load markets from disk into the client. Returns their age, or None."""
+    path = _path(name, directory)
+    try:
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"⚠ Ignoring unreadable market cache {path}: {e}")
+        return None
+
+    if (
+        document.get("version") != CACHE_VERSION
+        or document.get("ccxt") != ccxt.__version__
+        or document.get("exchange") != client.id
+    ):
+        logger.info(f"⏭ Market cache {path} is from another version, ignoring it.")
+        return None
+
+    age = _now() - float(document.get("saved_at") or 0)
+    if age > max_age:
+        logger.info(f"⏭ Market cache {path} is {age:.0f}s old, ignoring it.")
+        return None
+
+    client.set_markets(document["markets"], document.get("currencies"))
+    logger.info(f"📂 Loaded {len(client.markets)} {name} markets from disk ({age:.0f}s old)")
+    return age
+
+
+# Seconds between checks once the markets are due for a refresh, so a
+# refresh that keeps failing is not retried on every request.
+_RETRY_SECONDS = 60
+
+# Background refreshes by exchange name: one at a time for all its clients.
+_refreshing = {}
+_refreshing_lock = threading.Lock()
+
+
+class _Freshness:
+    """When a client's markets were fetched, and refreshing them once due.
+
+    Checked on every load_markets(), which ccxt also calls before most
+    requests, so a service that runs for weeks keeps current markets.
+    """
+
+    def __init__(self, name, client, directory):
+        self.name = name
+        self.client = client
+        self.directory = directory
+        self.loaded_at = None
+        # Modification time of the file when this client last read or wrote it.
+        self.file_mtime = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(_path(self.name, self.directory))
+        except OSError:
+            return None
+
+    def loaded(self, age=0.0):
+        """Markets fetched `age` seconds ago, and now in the file too."""
+        self.loaded_at = _now() - age
+        self.file_mtime = self._mtime()
+
+    def check(self):
+        now = _now()
+        with self._lock:
+            if self.loaded_at is None or now - self.loaded_at <= config.MARKET_CACHE_REFRESH_AGE:
+                return
+            if now - self.checked_at < _RETRY_SECONDS:
+                return
+            self.checked_at = now
+        # Another process, or another account on this exchange, may already
+        # have fetched newer markets; then reading the file is enough.
+        mtime = self._mtime()
+        if mtime is not None and mtime != self.file_mtime:
+            target = getattr(self.client, "unwrapped", self.client)
+            age = restore(self.name, target, config.MARKET_CACHE_MAX_AGE, self.directory)
+            if age is not None:
+                self.loaded(age)
+                return
+        refresh_in_background(self.name, self.client)
+
+
+def _persist_network_loads(name, client, directory):
+    """Save whenever ccxt actually downloads markets, however it was asked.
+
+    ccxt calls self.load_markets() lazily from inside order methods; an
+    instance attribute shadows the class method, so those loads are caught
+    as well as explicit ones. An async client (see async_exchanges) awaits
+    load_markets() internally, so it is wrapped with a coroutine instead.
+    Returns the client's _Freshness.
+    """
+    target = getattr(client, "unwrapped", client)
+    original = target.load_markets
+    freshness = _Freshness(name, client, directory)
+
+    if inspect.iscoroutinefunction(original):
+
+        async def load_markets(reload=False, params={}):
+            needed = reload or not target.markets
+            markets = await original(reload, params)
+            if needed:
+                save(name, target, directory)
+                freshness.loaded()
+            else:
+                freshness.check()
+            return markets
+
+    else:
+
+        def load_markets(reload=False, params={}):
+            needed = reload or not target.markets
+            markets = original(reload, params)
+            if needed:
+                save(name, target, directory)
+                freshness.loaded()
+            else:
+                freshness.check()
+            return markets
+
+    target.load_markets = load_markets
+    return freshness
+
+
+def refresh_in_background(name, client):
+    """Reload the markets in a thread, unless one is already running for `name`."""
+    def refresh():
+        try:
+            client.load_markets(True)
+        except Exception as e:
+            logger.warning(f"⚠ Background refresh of {name} markets failed: {e}")
+
+    with _refreshing_lock:
+        running = _refreshing.get(name)
+        if running is not None and running.is_alive():
+            return running
+        thread = threading.Thread(target=refresh, name=f"markets-{name}", daemon=True)
+        thread.start()
+        _refreshing[name] = thread
+    return thread
+
+
+def attach(name, client, directory=None):
+    """Serve the client's markets from disk, refreshing them when stale."""
+    if config.MARKET_CACHE_MAX_AGE <= 0:
+        return None
+    freshness = _persist_network_loads(name, client, directory)
+    age = restore(name, client, config.MARKET_CACHE_MAX_AGE, directory)
+    if age is not None:
+        freshness.loaded(age)
+        # Usable now, and refreshed in the background if already due.
+        freshness.check()
+    return age
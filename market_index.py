@@ -0,0 +1,77 @@
+"""Pre-trade checks against the exchange's market list, without a round trip.
+
+validate_signal() used to check only that fields were present and positive.
+An unknown symbol or a quantity below the exchange minimum was rejected by
+the exchange itself, a full round trip later, as a 502 that also kept the
+dedup key. The market list is already in memory (see market_cache.py), so
+those checks are done here instead. Quantity and price are rounded to the
+exchange's precision, so a good signal is never refused over decimals.
+
+Nothing here touches the network. If a client has not loaded its markets,
+the checks are skipped and the exchange decides, as before.
+"""
+
+import ccxt
+
+
+def _market(client, symbol):
+    """The market ccxt would send an order for `symbol` to, or None.
+
+    Left to ccxt: an exchange id such as BTCUSDT can name a spot and a
+    contract market, and each exchange class chooses between them its own
+    way (binance by its legacy defaultType "future", for one).
+    """
+    try:
+        return client.market(symbol)
+    except ccxt.BadSymbol:
+        return None
+
+
+def _limit(market, field, bound):
+    value = ((market.get("limits") or {}).get(field) or {}).get(bound)
+    return None if value is None else float(value)
+
+
+def prepare(client, exchange_name, symbol, quantity, price):
+    """Resolve and round an order locally.
+
+    Returns ((symbol, quantity, price), None) with the unified symbol and
+    the rounded numbers, or (None, message) when the exchange would refuse
+    the order anyway.
+    """
+    if not getattr(client, "markets", None):
+        return (symbol, quantity, price), None
+
+    market = _market(client, symbol)
+    if market is None:
+        return None, f"Unknown SYMBOL '{symbol}' on {exchange_name}"
+    if market.get("active") is False:
+        return None, f"SYMBOL '{symbol}' is not currently trading on {exchange_name}"
+    unified = market["symbol"]
+
+    minimum = _limit(market, "amount", "min")
+    try:
+        # Truncated, never rounded up: the position must not grow.
+        rounded = float(client.amount_to_precision(unified, quantity))
+    except ccxt.InvalidOrder:
+        rounded = 0.0
+    if rounded <= 0 or (minimum is not None and rounded < minimum):
+        floor = minimum if minimum is not None else (market.get("precision") or {}).get("amount")
+        if floor is None:
+            return None, f"QUANTITY {quantity:g} rounds to zero for {unified}"
+        return None, f"QUANTITY {quantity:g} is below the minimum {float(floor):g} for {unified}"
+    maximum = _limit(market, "amount", "max")
+    if maximum is not None and rounded > maximum:
+        return None, f"QUANTITY {quantity:g} is above the maximum {maximum:g} for {unified}"
+
+    if price is not None:
+        price = float(client.price_to_precision(unified, price))
+        if price <= 0:
+            return None, f"PRICE is below the tick size for {unified}"
+        minimum_cost = _limit(market, "cost", "min")
+        if minimum_cost is not None and rounded * price < minimum_cost:
+            return None, (
+                f"Order value {rounded * price:g} is below the minimum {minimum_cost:g} for {unified}"
+            )
+
+    return (unified, rounded, price), None
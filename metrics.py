@@ -0,0 +1,158 @@
+"""Where a signal's time goes, stage by stage.
+
+Each stage of the signal pipeline (IP check, throttle, parse, PIN, dedup,
+validation, the exchange round trip) is timed with a monotonic clock and
+recorded in an in-process histogram. The buckets grow geometrically, so a
+percentile read from them is within about 20% of the true value whether
+the stage takes microseconds or seconds, in constant memory.
+
+Histograms are per process: each gunicorn worker and the email reader
+report their own.
+"""
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_setup import get_logger
+
+logger = get_logger("metrics")
+
+# Bucket upper bounds in seconds: 10 µs to a little over 60 s, each 2^(1/4)
+# times the last.
+_SMALLEST = 1e-5
+_GROWTH = 2 ** 0.25
+BOUNDS = tuple(_SMALLEST * _GROWTH ** i for i in range(92))
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """Counts of observations per latency bucket."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def _quantile(self, q):
+        # Caller holds the lock. The bucket's upper bound, never above the
+        # largest value actually seen.
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                bound = BOUNDS[index] if index < len(BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            if not self.count:
+                return {"count": 0}
+            report = {
+                "count": self.count,
+                "mean_ms": round(self.total / self.count * 1000, 3),
+                "max_ms": round(self.max * 1000, 3),
+            }
+            for q in QUANTILES:
+                report[f"p{round(q * 100):d}_ms"] = round(self._quantile(q) * 1000, 3)
+            return report
+
+
+class StageTimer:
+    """The stages of one request, recorded as they finish."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.registry.observe(name, seconds)
+
+    def server_timing(self):
+        """Value for a Server-Timing response header."""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+    def log_field(self):
+        return " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.stages.items())
+
+
+class Registry:
+    """One histogram per stage name."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def timer(self):
+        return StageTimer(self)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histogram.snapshot() for name, histogram in histograms.items()}
+
+
+# The process's own stages; the webhook and email reader both record here.
+registry = Registry()
+
+
+def serve(port, collect, host="127.0.0.1"):
+    """Answer GET /metrics with collect() as JSON, from a daemon thread.
+
+    For services with no web server of their own, i.e. the email reader.
+    Binds to loopback: the numbers reveal trading activity.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = json.dumps(collect()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info(f"📈 Metrics served on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,221 @@
+"""Durable queue of accepted signals, drained by the executor service.
+
+With SIGNAL_EXECUTION=inline the webhook and the email reader each place
+orders themselves, from separate processes with separate, often cold,
+exchange clients. With SIGNAL_EXECUTION=outbox they only check and record
+the signal here. The executor (executor.py) is the one process that talks
+to the exchanges. It keeps its clients warm and works through each
+exchange's signals in arrival order.
+
+The queue is a SQLite table beside the dedup store, for the same reasons
+(see dedup.py): every service can reach it, it is safe for concurrent
+writers, and it needs nothing running alongside. A signal is committed
+before the sender gets its 202, so a crash after that point delays it but
+cannot lose it.
+
+Signals are executed at most once. A row that was running when the
+executor died is marked interrupted, not retried: the order may already
+be on the exchange, and placing it again could double a position.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import log_setup
+
+logger = log_setup.get_logger("outbox")
+
+DB_FILENAME = "outbox.sqlite3"
+
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+ERROR = "error"
+EXPIRED = "expired"
+INTERRUPTED = "interrupted"
+
+# Finished rows are kept this long for /webhook/status, then deleted.
+RETENTION_SECONDS = 7 * 24 * 3600
+
+# Started rows that queue wait percentiles are computed over.
+WAIT_SAMPLE = 500
+
+
+def default_db_path():
+    return os.path.join(log_setup.log_directory(), DB_FILENAME)
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Outbox:
+    """The signals table, shared by every process that opens the same path."""
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        # sqlite3 connections are not shareable between threads.
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS signals ("
+            "  id          TEXT PRIMARY KEY,"
+            "  exchange    TEXT NOT NULL,"
+            "  payload     TEXT NOT NULL,"
+            "  dedup_key   TEXT,"
+            "  source      TEXT NOT NULL,"
+            "  status      TEXT NOT NULL,"
+            "  enqueued_at REAL NOT NULL,"
+            "  started_at  REAL,"
+            "  finished_at REAL,"
+            "  result      TEXT,"
+            "  code        INTEGER"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS signals_status ON signals (status, exchange, enqueued_at)")
+
+    def _now(self):
+        # Wall clock: rows are compared across processes.
+        return time.time()
+
+    def enqueue(self, signal_id, exchange, payload, dedup_key=None, source="webhook"):
+        """Commit a signal for execution. Raises if it could not be stored.
+
+        The PIN is not stored: the signal was authenticated on the way in.
+        """
+        stored = {k: v for k, v in payload.items() if str(k).lower() != "pin"}
+        self._connect().execute(
+            "INSERT INTO signals (id, exchange, payload, dedup_key, source, status, enqueued_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (signal_id, exchange, json.dumps(stored, default=str), dedup_key, source,
+             PENDING, self._now()),
+        )
+
+    def claim_next(self, exchange, max_age):
+        """Mark the oldest pending signal for `exchange` running and return it.
+
+        One at a time, so that after a crash the only signal whose outcome
+        is unknown is the one that was actually being placed. Pending
+        signals older than `max_age` seconds are expired instead: a signal
+        that sat out an outage no longer describes the market.
+        """
+        now = self._now()
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so two executors cannot
+        # claim the same row.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_age > 0:
+                expired = conn.execute(
+                    "UPDATE signals SET status = ?, finished_at = ?, result = ?"
+                    " WHERE status = ? AND enqueued_at < ?",
+                    (EXPIRED, now, json.dumps(f"not executed within {max_age:g}s"),
+                     PENDING, now - max_age),
+                ).rowcount
+                if expired:
+                    logger.warning(f"⌛ Expired {expired} signal(s) older than {max_age:g}s.")
+            row = conn.execute(
+                "SELECT * FROM signals WHERE status = ? AND exchange = ?"
+                " ORDER BY enqueued_at LIMIT 1",
+                (PENDING, exchange),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE signals SET status = ?, started_at = ? WHERE id = ?",
+                    (RUNNING, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else self._row(row, status=RUNNING, started_at=now)
+
+    def finish(self, signal_id, status, result=None, code=None):
+        self._connect().execute(
+            "UPDATE signals SET status = ?, finished_at = ?, result = ?, code = ? WHERE id = ?",
+            (status, self._now(), json.dumps(result, default=str), code, signal_id),
+        )
+
+    def recover(self):
+        """Settle what a previous executor left behind. Call once at startup."""
+        now = self._now()
+        conn = self._connect()
+        interrupted = conn.execute(
+            "UPDATE signals SET status = ?, finished_at = ?, result = ? WHERE status = ?",
+            (INTERRUPTED, now,
+             json.dumps("executor stopped mid-order; check the exchange before resending"),
+             RUNNING),
+        ).rowcount
+        if interrupted:
+            logger.warning(
+                f"⚠ {interrupted} signal(s) were in progress when the executor stopped. "
+                "They are not retried, since the order may have been placed."
+            )
+        conn.execute(
+            "DELETE FROM signals WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - RETENTION_SECONDS,),
+        )
+        return interrupted
+
+    def get(self, signal_id):
+        row = self._connect().execute("SELECT * FROM signals WHERE id = ?", (signal_id,)).fetchone()
+        return None if row is None else self._row(row)
+
+    def stats(self):
+        """Queue depth and how long signals wait before the executor starts them."""
+        now = self._now()
+        conn = self._connect()
+        depth, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM signals WHERE status = ?", (PENDING,)
+        ).fetchone()
+        running = conn.execute(
+            "SELECT COUNT(*) FROM signals WHERE status = ?", (RUNNING,)
+        ).fetchone()[0]
+        waits = sorted(
+            row[0] for row in conn.execute(
+                "SELECT started_at - enqueued_at FROM signals WHERE started_at IS NOT NULL"
+                " ORDER BY started_at DESC LIMIT ?",
+                (WAIT_SAMPLE,),
+            )
+        )
+        report = {
+            "depth": depth,
+            "running": running,
+            "oldest_pending_ms": None if oldest is None else round((now - oldest) * 1000, 3),
+        }
+        if waits:
+            report["wait_ms"] = {
+                "count": len(waits),
+                "p50": round(_percentile(waits, 0.5) * 1000, 3),
+                "p99": round(_percentile(waits, 0.99) * 1000, 3),
+                "max": round(waits[-1] * 1000, 3),
+            }
+        return report
+
+    @staticmethod
+    def _row(row, **overrides):
+        entry = dict(row)
+        entry.update(overrides)
+        entry["payload"] = json.loads(entry["payload"])
+        if entry.get("result") is not None:
+            entry["result"] = json.loads(entry["result"])
+        return entry
@@ -25,6 +25,18 @@ SERVICES = {
 }
 
 
+def _worker_options(service):
+    """Extra gunicorn options for services that need more than sync workers.
+
+    The dashboard holds a /stream connection open per viewer, which would
+    monopolise a sync worker. Threads keep it to one process, so the login
+    lockout is still shared.
+    """
+    if service == "dashboard":
+        return ["-k", "gthread", "--threads", str(config.DASHBOARD_THREADS)]
+    return []
+
+
 def build_command(service):
     """gunicorn argv for a service, using the configured bind address."""
     try:
@@ -40,6 +52,7 @@ def build_command(service):
         "gunicorn",
         "-w", str(WORKERS),
         "-b", f"{host}:{port}",
+        *_worker_options(service),
         app,
     ]
 
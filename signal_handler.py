@@ -6,7 +6,11 @@ exchange.
 """
 
 import exchanges as exchange_registry
+import market_index
+import metrics
+import weight_budget
 from log_setup import get_logger, redact
+from signal_results import new_signal_id
 
 logger = get_logger("signal_handler")
 
@@ -64,6 +68,11 @@ def validate_signal(data):
         if problem:
             return None, _error(problem)
 
+    if "GROUP" in data:
+        return _validate_group(
+            str(data["GROUP"]).strip(), exchange_name, symbol, side, order_type, quantity, price
+        )
+
     exchange = exchange_registry.get(exchange_name)
     if exchange is None:
         # Unconfigured exchanges used to reach the API with blank credentials.
@@ -72,6 +81,13 @@ def validate_signal(data):
             code=400,
         )
 
+    # Symbol, size and tick checks against the cached market list, so a
+    # signal the exchange would refuse fails here without a round trip.
+    prepared, problem = market_index.prepare(exchange, exchange_name, symbol, quantity, price)
+    if problem:
+        return None, _error(problem)
+    symbol, quantity, price = prepared
+
     order = {
         "exchange_name": exchange_name,
         "exchange": exchange,
@@ -84,26 +100,187 @@ def validate_signal(data):
     return order, None
 
 
-def process_signal(data):
-    """Validate and place an order. Always returns a result dict."""
+def _validate_group(group, exchange_name, symbol, side, order_type, quantity, price):
+    """validate_signal() for a signal sent to every account of a group.
+
+    Each account gets QUANTITY times its scale, checked and rounded against
+    its own client. An account whose share is too small for the market is
+    skipped and reported; the signal is refused only if no account is left.
+    """
+    members = exchange_registry.group(group)
+    if members is None:
+        return None, _error(f"Unknown GROUP '{group}'")
+    if not members:
+        return None, _error(f"GROUP '{group}' has no usable accounts")
+
+    legs = {}
+    for account in members:
+        if account["exchange"] != exchange_name:
+            return None, _error(
+                f"Account '{account['name']}' in GROUP '{group}' is on {account['exchange']}, "
+                f"not {exchange_name}"
+            )
+        prepared, problem = market_index.prepare(
+            account["client"], exchange_name, symbol, quantity * account["scale"], price
+        )
+        if problem:
+            logger.warning(f"⏭ Skipping account {account['name']}: {problem}")
+            legs[account["name"]] = {"error": problem}
+            continue
+        leg_symbol, leg_quantity, leg_price = prepared
+        legs[account["name"]] = {
+            "exchange": account["client"],
+            "symbol": leg_symbol,
+            "quantity": leg_quantity,
+            "price": leg_price,
+        }
+
+    if all("error" in leg for leg in legs.values()):
+        reasons = "; ".join(f"{name}: {leg['error']}" for name, leg in legs.items())
+        return None, _error(f"No account in GROUP '{group}' can take this order. {reasons}")
+
+    order = {
+        "exchange_name": exchange_name,
+        "group": group,
+        "legs": legs,
+        "symbol": symbol,
+        "side": side,
+        "order_type": order_type,
+        "quantity": quantity,
+        "price": price,
+    }
+    return order, None
+
+
+def process_signal(data, timer=None):
+    """Validate and place an order. Always returns a result dict.
+
+    Validation and the exchange round trip are recorded as stages on
+    `timer`, or on a fresh one when the caller is not timing the request.
+    """
+    if timer is None:
+        timer = metrics.registry.timer()
     try:
-        order, problem = validate_signal(data)
+        with timer.stage("validate"):
+            order, problem = validate_signal(data)
         if problem:
             return problem
+    except Exception as e:
+        logger.error(f"❌ Error processing signal: {e}")
+        return {"status": "error", "message": str(e), "code": 502}
+    return place_order(order, data, timer)
 
+
+def place_order(order, data, timer=None):
+    """Send an order from validate_signal() to its exchange.
+
+    Split out so a caller can validate while the sender waits and place the
+    order after answering. Always returns a result dict.
+    """
+    if timer is None:
+        timer = metrics.registry.timer()
+    if "legs" in order:
+        return _place_group(order, data, timer)
+    try:
         logger.info(
             f"Placing order on {order['exchange_name']}: {redact(data)}"
         )
-        placed = order["exchange"].create_order(
-            order["symbol"],
-            order["order_type"],
-            order["side"],
-            order["quantity"],
-            order["price"],
-        )
+        with timer.stage("exchange"), weight_budget.trading():
+            placed = order["exchange"].create_order(
+                order["symbol"],
+                order["order_type"],
+                order["side"],
+                order["quantity"],
+                order["price"],
+            )
         logger.info(f"✅ Order placed successfully: {placed}")
         return {"status": "success", "order": placed, "code": 200}
     except Exception as e:
         # The exchange rejected it (margin, symbol, permissions, connectivity).
         logger.error(f"❌ Error processing signal: {e}")
         return {"status": "error", "message": str(e), "code": 502}
+
+
+def _place_group(order, data, timer):
+    """Send a group's orders at once, one per account.
+
+    The result carries each account's outcome under "accounts". It is a
+    success only if every account's order was placed; if some were, or may
+    have been, the code is 207, because resending would double the ones
+    that landed. An order with no answer by the deadline is "unknown", not
+    failed: it may still fill.
+    """
+    legs = order["legs"]
+    logger.info(
+        f"Placing order on {len(legs)} accounts of group {order['group']}: {redact(data)}"
+    )
+    calls = {
+        name: (leg["exchange"], "create_order", leg["symbol"], order["order_type"],
+               order["side"], leg["quantity"], leg["price"])
+        for name, leg in legs.items()
+        if "error" not in leg
+    }
+    with timer.stage("exchange"), weight_budget.trading():
+        outcome = exchange_registry.place_orders(calls)
+
+    accounts = {}
+    placed = {}
+    failures = []
+    unknown = []
+    for name, leg in legs.items():
+        if "error" in leg:
+            accounts[name] = {"status": "skipped", "error": leg["error"], "code": 400}
+            failures.append(f"{name}: {leg['error']}")
+            continue
+        state, result = outcome[name]
+        if state == "ok":
+            accounts[name] = {"status": "ok", "quantity": leg["quantity"], "order": result}
+            placed[name] = result
+        elif state == "unknown":
+            accounts[name] = {"status": "unknown", "quantity": leg["quantity"], "error": result, "code": 504}
+            unknown.append(f"{name}: {result}")
+        else:
+            accounts[name] = {"status": "error", "quantity": leg["quantity"], "error": result, "code": 502}
+            failures.append(f"{name}: {result}")
+
+    if not failures and not unknown:
+        logger.info(f"✅ Order placed on all {len(placed)} accounts of group {order['group']}")
+        return {"status": "success", "order": placed, "accounts": accounts, "code": 200}
+
+    parts = []
+    if failures:
+        parts.append(f"{len(failures)} of {len(legs)} accounts failed")
+    if unknown:
+        parts.append(f"{len(unknown)} of {len(legs)} accounts have an unknown outcome, check them on the exchange")
+    message = ", ".join(parts) + ". " + "; ".join(failures + unknown)
+    logger.error(f"❌ Group {order['group']}: {message}")
+    return {
+        "status": "error",
+        "message": message,
+        "accounts": accounts,
+        "code": 207 if placed or unknown else 502,
+    }
+
+
+def queue_signal(outbox, data, dedup_key, source, timer=None):
+    """Validate a signal and commit it to the outbox for the executor.
+
+    Returns a result dict like process_signal(); a queued signal carries
+    its signal_id instead of an order. Nothing has reached the exchange
+    whatever the outcome, so a failed signal may always be resent.
+    """
+    if timer is None:
+        timer = metrics.registry.timer()
+    try:
+        with timer.stage("validate"):
+            order, problem = validate_signal(data)
+        if problem:
+            return problem
+        signal_id = new_signal_id()
+        with timer.stage("enqueue"):
+            outbox.enqueue(signal_id, order["exchange_name"], data, dedup_key, source)
+    except Exception as e:
+        logger.error(f"❌ Could not queue signal: {e}")
+        return {"status": "error", "message": "Could not queue the signal", "code": 503}
+    logger.info(f"📥 Queued signal {signal_id} for {order['exchange_name']}")
+    return {"status": "queued", "signal_id": signal_id, "code": 202}
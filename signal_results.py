@@ -0,0 +1,59 @@
+"""Outcome of signals that were acknowledged before their order was placed.
+
+With WEBHOOK_ASYNC_EXECUTION the webhook answers 202 with a signal id as
+soon as a signal is validated, and the order goes to the exchange
+afterwards. The sender, or an operator, looks the outcome up here by that
+id. Only the most recent signals are kept, so a flood of them cannot grow
+memory without limit.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+PENDING = "pending"
+
+
+def new_signal_id():
+    """Unguessable, so knowing an id is what entitles you to its result."""
+    return secrets.token_urlsafe(16)
+
+
+class ResultStore:
+    """The last `max_tracked` signals' states, oldest evicted first."""
+
+    def __init__(self, max_tracked=1024):
+        self.max_tracked = max_tracked
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _now(self):
+        # Reported to clients, so wall clock.
+        return time.time()
+
+    def accept(self, signal_id):
+        with self._lock:
+            self._entries[signal_id] = {
+                "signal_id": signal_id,
+                "status": PENDING,
+                "accepted_at": self._now(),
+            }
+            while len(self._entries) > self.max_tracked:
+                self._entries.popitem(last=False)
+
+    def finish(self, signal_id, **outcome):
+        """Record the final state. Ignored if the entry was already evicted."""
+        with self._lock:
+            entry = self._entries.get(signal_id)
+            if entry is not None:
+                entry.update(outcome, finished_at=self._now())
+
+    def get(self, signal_id):
+        with self._lock:
+            entry = self._entries.get(signal_id)
+            return None if entry is None else dict(entry)
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for entry in self._entries.values() if entry["status"] == PENDING)
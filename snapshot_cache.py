@@ -0,0 +1,129 @@
+"""Short-lived cache of exchange state, shared by every dashboard request.
+
+The dashboard page polls several endpoints, each open tab polls them again,
+and summary stats used to re-fetch the positions the table had just loaded.
+Without a cache every one of those is a full round trip per exchange, and a
+few open tabs are enough to approach an exchange's request-weight limit.
+
+Entries expire after a per-kind TTL. Concurrent misses on the same kind are
+collapsed into a single load (single-flight): the first caller fetches and
+everyone else who arrives meanwhile waits for its result instead of issuing
+their own request.
+"""
+
+import threading
+import time
+
+
+class _Flight:
+    """One load in progress, which later callers wait on."""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SnapshotCache:
+    """Values keyed by kind, each kept for that kind's TTL in seconds."""
+
+    def __init__(self, ttls):
+        self.ttls = dict(ttls)
+        self._entries = {}      # kind -> (value, stored_at)
+        self._flights = {}      # kind -> _Flight
+        self._generations = {}  # kind -> bumped by invalidate()
+        self._counters = {kind: {"hits": 0, "misses": 0, "coalesced": 0} for kind in self.ttls}
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return time.monotonic()
+
+    def get(self, kind, loader):
+        """Cached value for `kind`, calling `loader()` on a miss."""
+        return self.get_many([kind], lambda kinds: {kind: loader()})[kind]
+
+    def get_many(self, kinds, loader):
+        """Cached values for several kinds at once.
+
+        `loader(missing)` is called at most once, with only the kinds this
+        caller has to fetch itself, and must return kind -> value. Loading
+        them together lets the caller fetch them in a single round trip.
+        """
+        values, waiting, leading = {}, {}, {}
+        with self._lock:
+            now = self._now()
+            for kind in kinds:
+                counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "coalesced": 0})
+                entry = self._entries.get(kind)
+                if entry is not None and now - entry[1] < self.ttls.get(kind, 0):
+                    counters["hits"] += 1
+                    values[kind] = entry[0]
+                elif kind in self._flights:
+                    counters["coalesced"] += 1
+                    waiting[kind] = self._flights[kind]
+                else:
+                    counters["misses"] += 1
+                    flight = _Flight(self._generations.get(kind, 0))
+                    self._flights[kind] = flight
+                    leading[kind] = flight
+
+        if leading:
+            try:
+                loaded = loader(list(leading))
+            except BaseException as e:
+                self._finish(leading, error=e)
+                raise
+            self._finish(leading, loaded=loaded)
+            values.update({kind: loaded[kind] for kind in leading})
+
+        for kind, flight in waiting.items():
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            values[kind] = flight.value
+        return values
+
+    def _finish(self, flights, loaded=None, error=None):
+        with self._lock:
+            now = self._now()
+            for kind, flight in flights.items():
+                if self._flights.get(kind) is flight:
+                    del self._flights[kind]
+                if error is None:
+                    flight.value = loaded[kind]
+                    # Invalidated while loading: the result may predate the
+                    # change, so hand it to the waiters but do not keep it.
+                    if flight.generation == self._generations.get(kind, 0):
+                        self._entries[kind] = (flight.value, now)
+                else:
+                    flight.error = error
+        for flight in flights.values():
+            flight.done.set()
+
+    def invalidate(self, *kinds):
+        """Forget cached values, e.g. after placing or cancelling an order."""
+        with self._lock:
+            for kind in kinds:
+                self._entries.pop(kind, None)
+                # A load already running started before the change; later
+                # callers must not join it.
+                self._flights.pop(kind, None)
+                self._generations[kind] = self._generations.get(kind, 0) + 1
+
+    def stats(self):
+        """Per-kind age and hit counters, for diagnostics."""
+        with self._lock:
+            now = self._now()
+            report = {}
+            for kind, counters in self._counters.items():
+                entry = self._entries.get(kind)
+                served = counters["hits"] + counters["coalesced"]
+                total = served + counters["misses"]
+                report[kind] = dict(
+                    counters,
+                    ttl=self.ttls.get(kind, 0),
+                    age=None if entry is None else round(now - entry[1], 3),
+                    hit_rate=round(served / total, 4) if total else None,
+                )
+            return report
@@ -0,0 +1,137 @@
+"""One background refresher pushing dashboard changes to every viewer.
+
+Polling made exchange load grow with the number of open dashboards, and a
+change could take a full poll interval to show up. Here a single thread
+refreshes the snapshot and hands each viewer only the sections that changed.
+It runs only while somebody is watching.
+"""
+
+import json
+import queue
+import threading
+
+from log_setup import get_logger
+
+logger = get_logger("snapshot_feed")
+
+# Sections of a bot_logic snapshot that are sent, and compared, separately.
+SECTIONS = ("positions", "pending_orders", "summary_stats", "errors")
+
+
+class Subscription:
+    """One viewer's queue of pending updates."""
+
+    def __init__(self, feed, max_pending=16):
+        self._feed = feed
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def _offer(self, update, full):
+        try:
+            self._queue.put_nowait(update)
+        except queue.Full:
+            # A viewer this far behind gets everything again, rather than a
+            # run of deltas it can no longer apply in order.
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(full)
+
+    def next(self, timeout):
+        """The next update, or None if nothing changed within `timeout`."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._feed.unsubscribe(self)
+
+
+class SnapshotFeed:
+    """Refreshes with `fetch()` every `interval` seconds while subscribed.
+
+    At most `max_viewers` subscriptions at once, if given.
+    """
+
+    def __init__(self, fetch, interval, max_viewers=None):
+        self.fetch = fetch
+        self.interval = interval
+        self.max_viewers = max_viewers
+        self._subscribers = set()
+        self._latest = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Start receiving updates. The first one is always the full state.
+
+        Returns None when max_viewers are already subscribed.
+        """
+        subscription = Subscription(self)
+        with self._lock:
+            if self.max_viewers is not None and len(self._subscribers) >= self.max_viewers:
+                return None
+            self._subscribers.add(subscription)
+            if self._latest is not None:
+                subscription._offer(self._latest, self._latest)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="snapshot-feed", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                self._wake.set()
+
+    def viewers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _run(self):
+        logger.info("📡 Snapshot feed started.")
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody watching: stop calling the exchanges. The last
+                    # state is dropped too, since it will be stale by the
+                    # time anyone reconnects.
+                    self._thread = None
+                    self._latest = None
+                    logger.info("📡 Snapshot feed stopped, no viewers left.")
+                    return
+
+            try:
+                self.publish(self.fetch())
+            except Exception as e:
+                logger.error(f"❌ Snapshot feed refresh failed: {e}")
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def publish(self, snapshot):
+        """Send the sections that differ from the last published snapshot."""
+        with self._lock:
+            previous = self._latest
+            self._latest = snapshot
+            if previous is None:
+                changed = list(SECTIONS)
+            else:
+                changed = [s for s in SECTIONS if snapshot.get(s) != previous.get(s)]
+            if not changed:
+                return
+            update = {section: snapshot.get(section) for section in changed}
+            update["version"] = snapshot.get("version")
+            for subscription in self._subscribers:
+                subscription._offer(update, snapshot)
+
+
+def format_event(update):
+    """A Server-Sent Events message carrying one update."""
+    return f"event: snapshot\ndata: {json.dumps(update, default=str)}\n\n"
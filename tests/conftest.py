@@ -4,9 +4,12 @@ Every test runs against an environment built here, never against the real
 .env, and never touches a live exchange.
 """
 
+import atexit
 import importlib
 import os
+import shutil
 import sys
+import tempfile
 
 import bcrypt
 import dotenv
@@ -14,6 +17,13 @@ import pytest
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Test modules import app modules at collection, before any fixture runs,
+# and the first get_logger() opens a log file. Keep it out of the tree (and
+# out of a real TRADEX_LOG_DIR); app_env points each test at its own.
+_COLLECTION_LOGS = tempfile.mkdtemp(prefix="tradex-tests-")
+atexit.register(shutil.rmtree, _COLLECTION_LOGS, ignore_errors=True)
+os.environ["TRADEX_LOG_DIR"] = _COLLECTION_LOGS
+
 TEST_PASSWORD = "correct-horse-battery-staple"
 TEST_PIN = "test-pin-abcdef123456"
 
@@ -40,10 +50,16 @@ BASE_ENV = {
 RELOAD_ORDER = [
     "config",
     "serve",
+    "market_cache",
+    "http_pool",
+    "weight_budget",
+    "dedup_service",
+    "fake_exchange",
     "exchanges",
     "signal_handler",
     "bot_logic",
     "email_reader",
+    "executor",
     "webhook_receiver",
     "dashboard_app",
 ]
@@ -61,7 +77,10 @@ def reload_app(env, monkeypatch, tmp_path, modules=RELOAD_ORDER):
 
     for key in list(os.environ):
         if key.startswith(("FLASK_", "DASHBOARD_", "WEBHOOK_", "BYBIT_", "BINANCE_",
-                           "IMAP_", "SESSION_", "LOGIN_", "MODE", "EXCHANGES")):
+                           "IMAP_", "SESSION_", "LOGIN_", "MODE", "EXCHANGE", "ACCOUNTS_",
+                           "WEIGHT_", "FAKE_EXCHANGE_", "DEDUP_", "MARKET_CACHE_",
+                           "SNAPSHOT_", "OUTBOX_", "CLOSE_ALL_", "EMAIL_", "EXECUTOR_",
+                           "TRUST_PROXY_", "METRICS_", "SIGNAL_EXECUTION")):
             monkeypatch.delenv(key, raising=False)
 
     for key, value in env.items():
@@ -95,11 +114,22 @@ def app_env(monkeypatch, tmp_path):
 class FakeExchange:
     """Records ccxt calls instead of reaching an exchange."""
 
+    id = "fake"
+
     def __init__(self, positions=None, raises=None):
+        self.options = {}
         self.calls = []
         self._positions = positions or []
         self._raises = raises
         self.fetch_positions_count = 0
+        self.load_markets_count = 0
+
+    def load_markets(self, reload=False):
+        self.load_markets_count += 1
+        return {}
+
+    def fetch_time(self):
+        return 0
 
     def create_order(self, symbol, order_type, side, amount, price=None, params=None):
         self.calls.append(
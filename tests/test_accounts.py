@@ -0,0 +1,216 @@
+"""Named accounts from ACCOUNTS_FILE and signals sent to a whole group."""
+
+import json
+import time
+
+import ccxt
+import pytest
+
+from conftest import TEST_PIN, FakeExchange
+
+ACCOUNTS = {
+    "accounts": {
+        "alpha": {"exchange": "bybit", "api_key": "alpha-key", "api_secret": "alpha-secret"},
+        "beta": {"exchange": "bybit", "api_key": "beta-key", "api_secret": "beta-secret", "scale": 0.5},
+        "gamma": {"exchange": "binance", "api_key": "gamma-key", "api_secret": "gamma-secret"},
+    },
+    "groups": {"copy": ["alpha", "beta"], "mixed": ["alpha", "gamma"]},
+}
+
+
+def _signal(**overrides):
+    payload = {
+        "EXCHANGE": "bybit",
+        "SYMBOL": "BTC/USDT:USDT",
+        "SIDE": "buy",
+        "ORDER_TYPE": "market",
+        "QUANTITY": "0.02",
+        "GROUP": "copy",
+    }
+    payload.update(overrides)
+    return payload
+
+
+class _SlowExchange(FakeExchange):
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def create_order(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return super().create_order(*args, **kwargs)
+
+
+@pytest.fixture
+def accounts_file(tmp_path):
+    def _write(spec=ACCOUNTS):
+        path = tmp_path / "accounts.json"
+        path.write_text(json.dumps(spec))
+        return str(path)
+    return _write
+
+
+def _boot(app_env, accounts_file, modules=("config", "exchanges", "signal_handler"), **env):
+    return app_env(modules=list(modules), ACCOUNTS_FILE=accounts_file(), **env)
+
+
+def _stub_accounts(exchanges, **stubs):
+    for name, stub in stubs.items():
+        exchanges.accounts[name]["client"] = stub
+    return stubs
+
+
+def test_accounts_get_their_own_clients(app_env, accounts_file):
+    exchanges = _boot(app_env, accounts_file)["exchanges"]
+
+    assert exchanges.accounts["alpha"]["client"].apiKey == "alpha-key"
+    assert exchanges.accounts["beta"]["client"].apiKey == "beta-key"
+    assert exchanges.accounts["beta"]["scale"] == 0.5
+    assert exchanges.accounts["alpha"]["client"] is not exchanges.get("bybit")
+    assert [a["name"] for a in exchanges.group("copy")] == ["alpha", "beta"]
+    assert exchanges.group("nope") is None
+
+
+def test_accounts_on_disabled_exchanges_are_skipped(app_env, accounts_file):
+    exchanges = _boot(app_env, accounts_file, EXCHANGES="bybit")["exchanges"]
+    assert "gamma" not in exchanges.accounts
+    assert [a["name"] for a in exchanges.group("mixed")] == ["alpha"]
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ({"groups": {}}, '"accounts"'),
+        ({"accounts": {"a": {"exchange": "kraken", "api_key": "k", "api_secret": "s"}}}, "kraken"),
+        ({"accounts": {"a": {"exchange": "bybit", "api_key": "k"}}}, "api_secret"),
+        ({"accounts": {"a": {"exchange": "bybit", "api_key": "k", "api_secret": "s", "scale": 0}}},
+         "scale"),
+        ({"accounts": {}, "groups": {"g": ["missing"]}}, "unknown accounts"),
+    ],
+)
+def test_bad_accounts_file_stops_startup(app_env, accounts_file, spec, expected):
+    path = accounts_file(spec)
+    with pytest.raises(Exception) as raised:
+        app_env(modules=["config", "exchanges"], ACCOUNTS_FILE=path)
+    assert type(raised.value).__name__ == "ConfigError"
+    assert expected in str(raised.value)
+
+
+def test_group_order_is_scaled_per_account(app_env, accounts_file):
+    modules = _boot(app_env, accounts_file)
+    stubs = _stub_accounts(modules["exchanges"], alpha=FakeExchange(), beta=FakeExchange())
+
+    result = modules["signal_handler"].process_signal(_signal())
+
+    assert result["status"] == "success"
+    assert set(result["order"]) == {"alpha", "beta"}
+    assert stubs["alpha"].calls[0]["amount"] == 0.02
+    assert stubs["beta"].calls[0]["amount"] == 0.01
+
+
+def test_group_orders_are_sent_at_once(app_env, accounts_file):
+    accounts = {f"sub{n}": {"exchange": "bybit", "api_key": f"k{n}", "api_secret": f"s{n}"}
+                for n in range(20)}
+    path = accounts_file({"accounts": accounts, "groups": {"copy": list(accounts)}})
+    modules = app_env(modules=["config", "exchanges", "signal_handler"], ACCOUNTS_FILE=path)
+    _stub_accounts(modules["exchanges"], **{name: _SlowExchange(delay=0.3) for name in accounts})
+
+    started = time.monotonic()
+    result = modules["signal_handler"].process_signal(_signal())
+    elapsed = time.monotonic() - started
+
+    assert result["status"] == "success"
+    assert len(result["order"]) == 20
+    assert elapsed < 1.5, "20 accounts must not be placed one after another"
+
+
+def test_partial_group_failure_is_reported_per_account(app_env, accounts_file):
+    modules = _boot(app_env, accounts_file)
+    _stub_accounts(
+        modules["exchanges"],
+        alpha=FakeExchange(),
+        beta=FakeExchange(raises=RuntimeError("insufficient margin")),
+    )
+
+    result = modules["signal_handler"].process_signal(_signal())
+
+    assert result["status"] == "error"
+    assert result["code"] == 207
+    assert result["accounts"]["alpha"]["status"] == "ok"
+    assert "insufficient margin" in result["accounts"]["beta"]["error"]
+
+
+def test_group_orders_are_not_held_to_the_read_deadline(app_env, accounts_file):
+    modules = _boot(app_env, accounts_file, EXCHANGE_READ_TIMEOUT="0.05")
+    _stub_accounts(modules["exchanges"], alpha=_SlowExchange(delay=0.2), beta=FakeExchange())
+
+    result = modules["signal_handler"].process_signal(_signal())
+
+    assert result["status"] == "success"
+
+
+def test_order_without_an_answer_is_unknown_not_failed(app_env, accounts_file):
+    modules = _boot(app_env, accounts_file, EXCHANGE_TIMEOUT_MS="100")
+    stubs = _stub_accounts(modules["exchanges"], alpha=FakeExchange(), beta=_SlowExchange(delay=0.5))
+
+    result = modules["signal_handler"].process_signal(_signal())
+
+    assert result["code"] == 207
+    assert result["accounts"]["beta"]["status"] == "unknown"
+    assert "unknown outcome" in result["message"]
+    assert "failed" not in result["message"]
+    # It was only slow: the order still goes through.
+    deadline = time.monotonic() + 2
+    while not stubs["beta"].calls and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert len(stubs["beta"].calls) == 1
+
+
+def test_ccxt_timeout_is_unknown_not_failed(app_env, accounts_file):
+    modules = _boot(app_env, accounts_file)
+    _stub_accounts(
+        modules["exchanges"],
+        alpha=FakeExchange(raises=ccxt.RequestTimeout("bybit POST timed out")),
+        beta=FakeExchange(raises=ccxt.RequestTimeout("bybit POST timed out")),
+    )
+
+    result = modules["signal_handler"].process_signal(_signal())
+
+    assert result["code"] == 207, "resending could double orders that landed"
+    assert {a["status"] for a in result["accounts"].values()} == {"unknown"}
+
+
+@pytest.mark.parametrize(
+    "overrides, expected",
+    [
+        ({"GROUP": "nope"}, "Unknown GROUP"),
+        ({"GROUP": "mixed"}, "is on binance"),
+    ],
+)
+def test_bad_group_signal_is_rejected(app_env, accounts_file, overrides, expected):
+    modules = _boot(app_env, accounts_file)
+    stubs = _stub_accounts(modules["exchanges"], alpha=FakeExchange(), beta=FakeExchange())
+
+    result = modules["signal_handler"].process_signal(_signal(**overrides))
+
+    assert result["code"] == 400
+    assert expected in result["message"]
+    assert all(stub.calls == [] for stub in stubs.values())
+
+
+def test_webhook_reports_each_account(app_env, accounts_file):
+    modules = _boot(
+        app_env, accounts_file, modules=("config", "exchanges", "signal_handler", "webhook_receiver")
+    )
+    _stub_accounts(
+        modules["exchanges"],
+        alpha=FakeExchange(),
+        beta=FakeExchange(raises=RuntimeError("insufficient margin")),
+    )
+    client = modules["webhook_receiver"].app.test_client()
+
+    response = client.post("/webhook", json=dict(_signal(), PIN=TEST_PIN))
+
+    assert response.status_code == 207
+    assert response.json["accounts"]["alpha"]["status"] == "ok"
+    assert response.json["accounts"]["beta"]["status"] == "error"
@@ -0,0 +1,104 @@
+"""Async ccxt clients on a shared event loop, behind blocking wrappers."""
+
+import asyncio
+import threading
+import time
+
+import ccxt.async_support as ccxt_async
+
+import async_exchanges
+
+
+class _AsyncExchange:
+    """Async stand-in for a ccxt.async_support client."""
+
+    id = "fake"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.options = {}
+        self.threads = []
+        self.cancelled = 0
+
+    async def fetch_positions(self):
+        self.threads.append(threading.current_thread().name)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [{"symbol": "BTC/USDT:USDT"}]
+
+    async def fetch_balance(self):
+        raise RuntimeError("exchange down")
+
+    def market(self, symbol):
+        return {"symbol": symbol}
+
+
+def test_blocking_client_looks_synchronous():
+    raw = _AsyncExchange()
+    client = async_exchanges.wrap(raw)
+
+    assert client.fetch_positions() == [{"symbol": "BTC/USDT:USDT"}]
+    assert raw.threads == [async_exchanges.loop.name], "ran on the shared loop"
+    assert client.market("ETH/USDT") == {"symbol": "ETH/USDT"}
+    assert client.options is raw.options
+
+
+def test_blocking_client_raises_the_exchange_error():
+    client = async_exchanges.wrap(_AsyncExchange())
+    try:
+        client.fetch_balance()
+    except RuntimeError as e:
+        assert "exchange down" in str(e)
+    else:
+        raise AssertionError("the error must reach the caller")
+
+
+def test_attributes_set_on_the_wrapper_reach_the_client():
+    raw = _AsyncExchange()
+    client = async_exchanges.wrap(raw)
+    client.markets = {"BTC/USDT": {}}
+    assert raw.markets == {"BTC/USDT": {}}
+
+
+def test_async_clients_are_built_on_the_shared_loop(app_env):
+    exchanges = app_env(modules=["config", "exchanges"], EXCHANGE_ASYNC="true")["exchanges"]
+    binance = exchanges.get("binance")
+
+    assert isinstance(binance, async_exchanges.BlockingClient)
+    assert isinstance(binance.unwrapped, ccxt_async.binance)
+    assert binance.options["defaultType"] == "future", "same settings as the sync client"
+    assert binance.unwrapped.asyncio_loop is async_exchanges.loop.loop
+    assert exchanges.get("bybit").options["adjustForTimeDifference"] is True
+
+
+def test_fan_out_keeps_many_requests_in_flight_without_threads(app_env):
+    exchanges = app_env(modules=["config", "exchanges"])["exchanges"]
+    raw = _AsyncExchange(delay=0.2)
+    client = async_exchanges.wrap(raw)
+    calls = {n: (client, "fetch_positions") for n in range(3 * exchanges.FAN_OUT_WORKERS)}
+
+    started = time.monotonic()
+    outcome = exchanges.fan_out(calls, timeout=5)
+    elapsed = time.monotonic() - started
+
+    assert all(error is None for _, error in outcome.values())
+    # More calls than pool threads, yet all of them waited together.
+    assert elapsed < 0.2 * 2
+    assert set(raw.threads) == {async_exchanges.loop.name}
+
+
+def test_fan_out_cancels_an_async_call_that_misses_the_deadline(app_env):
+    exchanges = app_env(modules=["config", "exchanges"])["exchanges"]
+    raw = _AsyncExchange(delay=5)
+    client = async_exchanges.wrap(raw)
+
+    outcome = exchanges.fan_out({"slow": (client, "fetch_positions")}, timeout=0.1)
+
+    assert outcome["slow"] == (None, "timed out after 0.1s")
+    deadline = time.monotonic() + 2
+    while not raw.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert raw.cancelled == 1, "the request itself is cancelled, not left running"
@@ -0,0 +1,49 @@
+"""The webhook load generator produces a usable report."""
+
+from benchmarks import dedup_contention
+from benchmarks.webhook_load import Workload, _flask_sender, run
+from conftest import TEST_PIN
+from dedup import SQLITE_PROFILES
+
+
+def test_load_run_reports_every_kind_of_request(app_env):
+    modules = app_env(
+        modules=["config", "fake_exchange", "exchanges", "signal_handler", "webhook_receiver"],
+        EXCHANGE_BACKEND="fake",
+        FAKE_EXCHANGE_LATENCY="0",
+        FAKE_EXCHANGE_BALANCE="1000000000",
+    )
+    workload = Workload(TEST_PIN, duplicates=0.2, bad_pins=0.1, invalid=0.1, seed=3)
+
+    report = run(_flask_sender(modules["webhook_receiver"].app), workload, requests=120, concurrency=4)
+
+    assert report["completed"] == 120
+    assert report["unexpected"] == 0, report["by_kind"]
+    assert set(report["by_kind"]) == {"valid", "duplicate", "bad_pin", "invalid"}
+    assert report["latency"]["p50_ms"] <= report["latency"]["p99_ms"]
+    assert report["throughput_rps"] > 0
+
+
+def test_rate_is_held_open_loop(app_env):
+    modules = app_env(
+        modules=["config", "fake_exchange", "exchanges", "signal_handler", "webhook_receiver"],
+        EXCHANGE_BACKEND="fake",
+        FAKE_EXCHANGE_LATENCY="0",
+    )
+    workload = Workload(TEST_PIN, seed=3)
+
+    report = run(_flask_sender(modules["webhook_receiver"].app), workload, requests=20, rate=100, concurrency=2)
+
+    assert report["elapsed_s"] >= 0.19, "20 requests at 100/s take about 0.2 s"
+
+
+def test_dedup_contention_reports_lock_waits(tmp_path):
+    report = dedup_contention.run(
+        SQLITE_PROFILES["safe"], processes=2, operations=100, forgets=0.1, directory=str(tmp_path)
+    )
+
+    assert report["operations"] == 200
+    assert report["latency"]["check"]["count"] + report["latency"]["forget"]["count"] == 200
+    # One BEGIN per check that reached SQLite and per forget.
+    assert report["lock_wait"]["count"] == 200
+    assert report["failed_open"] == 0
@@ -1,5 +1,8 @@
 """Position closing safety and API-call efficiency."""
 
+import threading
+import time
+
 POSITION = {
     "symbol": "BTC/USDT:USDT",
     "side": "long",
@@ -78,3 +81,251 @@ def test_unknown_exchange_is_reported(app_env, fake_exchange):
     bot_logic, _ = _boot(app_env, fake_exchange)
     result = bot_logic.close_position("kraken", "BTC/USDT:USDT")
     assert result["status"] == "error"
+
+
+class _SlowExchange:
+    """Answers after `delay` seconds, like an exchange under load."""
+
+    def __init__(self, delay, positions=()):
+        self.delay = delay
+        self.positions = list(positions)
+
+    def fetch_positions(self):
+        time.sleep(self.delay)
+        return self.positions
+
+
+def test_exchanges_are_read_in_parallel(app_env, fake_exchange):
+    """A refresh should cost the slowest exchange, not the sum of them."""
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    bot_logic.exchanges.clear()
+    for name in ("bybit", "binance", "third"):
+        bot_logic.exchanges[name] = _SlowExchange(0.3, [POSITION])
+
+    started = time.monotonic()
+    positions = bot_logic.get_positions()
+    elapsed = time.monotonic() - started
+
+    assert all(len(positions[name]) == 1 for name in ("bybit", "binance", "third"))
+    assert elapsed < 0.8, f"reads ran one after another ({elapsed:.2f}s)"
+
+
+def test_hung_exchange_does_not_hold_up_the_others(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    bot_logic.exchanges["binance"] = _SlowExchange(2.0, [POSITION])
+
+    started = time.monotonic()
+    outcome = bot_logic.exchange_registry.fan_out(
+        {name: (client, "fetch_positions") for name, client in bot_logic.exchanges.items()},
+        timeout=0.2,
+    )
+
+    assert time.monotonic() - started < 1.0
+    assert outcome["bybit"][1] is None and len(outcome["bybit"][0]) == 1
+    assert outcome["binance"][0] is None
+    assert "timed out" in outcome["binance"][1]
+
+
+def test_failing_exchange_shows_as_empty(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    broken = fake_exchange()
+
+    def fetch_positions():
+        raise RuntimeError("503 Service Unavailable")
+
+    broken.fetch_positions = fetch_positions
+    bot_logic.exchanges["binance"] = broken
+
+    positions = bot_logic.get_positions()
+
+    assert positions["binance"] == []
+    assert len(positions["bybit"]) == 1
+
+
+def test_dashboard_polls_share_one_fetch(app_env, fake_exchange):
+    """Positions table plus summary stats used to fetch positions twice."""
+    bot_logic, stub = _boot(app_env, fake_exchange)
+
+    bot_logic.get_positions()
+    bot_logic.calculate_summary_stats()
+    bot_logic.get_positions()
+
+    assert stub.fetch_positions_count == 1
+
+
+def test_close_refetches_instead_of_using_the_cache(app_env, fake_exchange):
+    """A cached size could close only part of a position that has grown."""
+    bot_logic, stub = _boot(app_env, fake_exchange)
+    bot_logic.get_positions()
+
+    stub._positions = [dict(POSITION, contracts=0.8)]
+    bot_logic.close_position("bybit", "BTC/USDT:USDT")
+
+    assert stub.calls[0]["amount"] == 0.8
+    bot_logic.get_positions()
+    assert stub.fetch_positions_count == 3, "the close must invalidate the cache"
+
+
+def test_snapshot_comes_from_one_fetch(app_env, fake_exchange):
+    """The PnL total must describe the positions listed beside it."""
+    bot_logic, stub = _boot(app_env, fake_exchange)
+
+    snapshot = bot_logic.get_snapshot()
+
+    assert stub.fetch_positions_count == 1
+    assert snapshot["positions"]["bybit"][0]["symbol"] == "BTC/USDT:USDT"
+    assert snapshot["pending_orders"] == {"bybit": []}
+    assert snapshot["summary_stats"]["total_pnl"] == 120.0
+    assert snapshot["summary_stats"]["portfolio_value"] == 1000.0
+    assert snapshot["errors"] == {}
+
+
+def test_snapshot_version_moves_only_when_content_changes(app_env, fake_exchange):
+    bot_logic, stub = _boot(app_env, fake_exchange)
+
+    first = bot_logic.get_snapshot()["version"]
+    assert bot_logic.get_snapshot()["version"] == first
+
+    stub._positions = [dict(POSITION, unrealizedPnl=-5.0)]
+    bot_logic.cache.invalidate("positions")
+    assert bot_logic.get_snapshot()["version"] == first + 1
+
+
+def test_snapshot_names_the_exchange_that_failed(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    broken = fake_exchange()
+
+    def fetch_open_orders():
+        raise RuntimeError("418 I'm a teapot")
+
+    broken.fetch_open_orders = fetch_open_orders
+    bot_logic.exchanges["binance"] = broken
+
+    snapshot = bot_logic.get_snapshot()
+
+    assert snapshot["pending_orders"]["binance"] == []
+    assert "teapot" in snapshot["errors"]["binance"][0]
+    assert "bybit" not in snapshot["errors"]
+
+
+class _BatchExchange:
+    """Supports createOrders, and can reject individual entries."""
+
+    has = {"createOrders": True}
+
+    def __init__(self, positions, reject=(), batch_error=None):
+        self._positions = positions
+        self.reject = set(reject)
+        self.batch_error = batch_error
+        self.batches = []
+        self.singles = []
+
+    def fetch_positions(self):
+        return self._positions
+
+    def create_orders(self, orders):
+        self.batches.append(orders)
+        if self.batch_error:
+            raise self.batch_error
+        return [
+            {"info": {"msg": "ReduceOnly Order is rejected"}, "status": "rejected"}
+            if order["symbol"] in self.reject
+            else {"id": f"o-{order['symbol']}", "symbol": order["symbol"]}
+            for order in orders
+        ]
+
+    def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+        self.singles.append({"symbol": symbol, "params": params})
+        return {"id": f"s-{symbol}", "symbol": symbol}
+
+
+def _positions(count):
+    return [dict(POSITION, symbol=f"SYM{i}/USDT:USDT") for i in range(count)]
+
+
+def test_close_all_sends_one_batch_where_supported(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    batch = _BatchExchange(_positions(3))
+    bot_logic.exchanges["bybit"] = batch
+
+    results = bot_logic.close_all_positions()
+
+    assert len(batch.batches) == 1
+    assert all(o["params"] == {"reduceOnly": True} for o in batch.batches[0])
+    assert all(r["status"] == "success" for r in results.values())
+    assert len(results) == 3
+
+
+def test_batches_respect_the_exchange_limit(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    bot_logic.exchanges.clear()
+    batch = _BatchExchange(_positions(12))
+    bot_logic.exchanges["binance"] = batch
+
+    bot_logic.close_all_positions()
+
+    assert sorted(len(b) for b in batch.batches) == [2, 5, 5]
+
+
+def test_rejected_batch_entry_is_reported_per_position(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    batch = _BatchExchange(_positions(3), reject={"SYM1/USDT:USDT"})
+    bot_logic.exchanges["bybit"] = batch
+
+    results = bot_logic.close_all_positions()
+
+    assert results["SYM0/USDT:USDT"]["status"] == "success"
+    assert results["SYM1/USDT:USDT"] == {
+        "status": "error", "message": "ReduceOnly Order is rejected"
+    }
+    assert results["SYM2/USDT:USDT"]["status"] == "success"
+
+
+def test_failed_batch_falls_back_to_single_closes(app_env, fake_exchange):
+    bot_logic, _ = _boot(app_env, fake_exchange)
+    batch = _BatchExchange(_positions(2), batch_error=RuntimeError("batch endpoint down"))
+    bot_logic.exchanges["bybit"] = batch
+
+    results = bot_logic.close_all_positions()
+
+    assert len(batch.singles) == 2
+    assert all(s["params"] == {"reduceOnly": True} for s in batch.singles)
+    assert all(r["status"] == "success" for r in results.values())
+
+
+class _SlowCloser(_BatchExchange):
+    has = {}
+
+    def __init__(self, positions, delay):
+        super().__init__(positions)
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create_order(self, *args, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return super().create_order(*args, **kwargs)
+
+
+def test_closes_run_concurrently_within_the_cap(app_env, fake_exchange):
+    """The last position must not wait for every earlier round trip."""
+    bot_logic = app_env(
+        modules=["config", "exchanges", "bot_logic"], CLOSE_ALL_CONCURRENCY="3"
+    )["bot_logic"]
+    bot_logic.exchanges.clear()
+    slow = _SlowCloser(_positions(6), delay=0.2)
+    bot_logic.exchanges["bybit"] = slow
+
+    started = time.monotonic()
+    results = bot_logic.close_all_positions()
+    elapsed = time.monotonic() - started
+
+    assert len(results) == 6
+    assert slow.peak == 3, f"expected the cap to be reached, peak was {slow.peak}"
+    assert elapsed < 0.9, f"closes ran one after another ({elapsed:.2f}s)"
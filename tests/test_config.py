@@ -56,3 +56,17 @@ def test_mode_flags(app_env):
     config = app_env(modules=["config"], MODE="webhook")["config"]
     assert config.WEBHOOK_ENABLED is True
     assert config.EMAIL_ENABLED is False
+
+
+def test_invalid_signal_execution_is_rejected(app_env):
+    with pytest.raises(Exception) as exc:
+        app_env(modules=["config"], SIGNAL_EXECUTION="later")
+    assert "SIGNAL_EXECUTION" in str(exc.value)
+
+
+def test_dashboard_streams_must_leave_a_thread_free(app_env):
+    config = app_env(modules=["config"], DASHBOARD_THREADS="4")["config"]
+    assert config.DASHBOARD_MAX_STREAMS == 2
+    with pytest.raises(Exception) as exc:
+        app_env(modules=["config"], DASHBOARD_THREADS="4", DASHBOARD_MAX_STREAMS="4")
+    assert "DASHBOARD_MAX_STREAMS" in str(exc.value)
@@ -1,5 +1,7 @@
 """Dashboard authentication, lockout and CSRF."""
 
+import time
+
 from conftest import TEST_PASSWORD
 
 
@@ -47,7 +49,7 @@ def test_repeated_failures_lock_the_client_out(app_env):
 
 def test_protected_routes_redirect_when_logged_out(app_env):
     _, client = _boot(app_env)
-    for route in ("/", "/positions", "/logs", "/summary_stats"):
+    for route in ("/", "/positions", "/logs", "/summary_stats", "/metrics", "/snapshot", "/stream"):
         assert client.get(route).status_code == 302
 
 
@@ -72,8 +74,8 @@ def test_post_succeeds_with_csrf_token(app_env):
     assert response.status_code == 302
 
 
-def _logged_in(app_env):
-    dashboard, client = _boot(app_env)
+def _logged_in(app_env, **env):
+    dashboard, client = _boot(app_env, **env)
     client.post("/login", data={"password": TEST_PASSWORD})
     with client.session_transaction() as sess:
         token = sess["csrf_token"]
@@ -146,3 +148,89 @@ def test_logs_endpoint_is_tailed(app_env, tmp_path):
     assert body["status"] == "success"
     assert len(body["logs"]["big.log"]) == dashboard.LOG_TAIL_LINES
     assert body["logs"]["big.log"][-1].strip() == "line 1999"
+
+
+def test_metrics_report_cache_counters(app_env):
+    _, client, _ = _logged_in(app_env)
+    body = client.get("/metrics").get_json()
+    assert set(body["cache"]) == {"positions", "orders", "balances"}
+
+
+def test_snapshot_endpoint_returns_every_section(app_env):
+    dashboard, client, _ = _logged_in(app_env)
+    dashboard.get_snapshot = lambda: {
+        "positions": {}, "pending_orders": {}, "errors": {}, "version": 3,
+        "summary_stats": {"portfolio_value": 0.0, "total_pnl": 0.0, "margin_used": 0.0},
+    }
+
+    body = client.get("/snapshot").get_json()
+
+    assert body["version"] == 3
+    assert {"positions", "pending_orders", "summary_stats", "errors"} <= set(body)
+
+
+def test_stream_pushes_the_snapshot(app_env):
+    dashboard, client, _ = _logged_in(app_env)
+    dashboard._feed.fetch = lambda: {
+        "positions": {}, "pending_orders": {}, "errors": {}, "version": 7,
+        "summary_stats": {"portfolio_value": 0.0, "total_pnl": 0.0, "margin_used": 0.0},
+    }
+
+    response = client.get("/stream", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+    event = next(chunks)
+    response.close()
+
+    assert event.startswith(b"event: snapshot")
+    assert b'"version": 7' in event
+
+
+def _quiet_feed(dashboard):
+    dashboard._feed.fetch = lambda: {
+        "positions": {}, "pending_orders": {}, "errors": {}, "version": 1,
+        "summary_stats": {"portfolio_value": 0.0, "total_pnl": 0.0, "margin_used": 0.0},
+    }
+
+
+def test_streams_leave_threads_for_the_rest_of_the_dashboard(app_env):
+    dashboard, client, _ = _logged_in(app_env, DASHBOARD_THREADS="3")
+    _quiet_feed(dashboard)
+    assert dashboard.config.DASHBOARD_MAX_STREAMS == 1
+
+    first = client.get("/stream", buffered=False)
+    next(iter(first.response))
+    refused = client.get("/stream", buffered=False)
+    assert refused.status_code == 503, "the page polls /snapshot instead"
+    assert client.get("/metrics").get_json()["stream_viewers"] == 1
+
+    first.close()
+    second = client.get("/stream", buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+def test_stream_stops_after_logout(app_env):
+    dashboard, client, _ = _logged_in(app_env)
+    _quiet_feed(dashboard)
+    response = client.get("/stream", buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    next(chunks)
+
+    client.get("/logout")
+
+    assert list(chunks) == []
+    response.close()
+    assert dashboard._feed.viewers() == 0
+
+
+def test_stream_stops_when_the_session_expires(app_env):
+    dashboard, client, _ = _logged_in(app_env, SESSION_LIFETIME_HOURS="0.000001")
+    _quiet_feed(dashboard)
+    response = client.get("/stream", buffered=False)
+    time.sleep(0.01)
+
+    assert [chunk for chunk in response.response if not chunk.startswith(b"retry:")] == []
+    response.close()
@@ -1,5 +1,7 @@
 """Duplicate signal suppression."""
 
+import pytest
+
 from conftest import TEST_PIN
 from dedup import DuplicateFilter, signal_key
 
@@ -67,6 +69,13 @@ def test_distinct_keys_do_not_collide(tmp_path):
     assert f.check("b") is False
 
 
+def test_check_many_flags_each_key_in_one_go(tmp_path):
+    f = _filter(tmp_path)
+    f.check("a")
+    assert f.check_many(["a", "b", "c", "b"]) == [True, False, False, True]
+    assert f.check_many(["b", "c"]) == [True, True]
+
+
 def test_window_expiry_allows_the_signal_again(tmp_path, monkeypatch):
     f = _filter(tmp_path)
     clock = [1000.0]
@@ -113,6 +122,57 @@ def test_tracking_is_bounded(tmp_path):
     assert f.count() <= 10
 
 
+def test_pruning_is_batched(tmp_path, monkeypatch):
+    f = _filter(tmp_path, window_seconds=3600, max_tracked=80)
+    prunes = []
+    original = f._prune
+    monkeypatch.setattr(f, "_prune", lambda *a: prunes.append(1) or original(*a))
+
+    for i in range(500):
+        f.check(f"key-{i}")
+    # Once per 11 new keys (80 -> 70, then past 80 again), not once per key.
+    assert len(prunes) == 39
+    assert 70 <= f.count() <= 80
+
+
+def test_row_count_is_tracked_without_counting(tmp_path):
+    f = _filter(tmp_path, max_tracked=20)
+    for i in range(50):
+        f.check(f"key-{i}")
+    f.forget("key-49")
+    f.forget("never-seen")
+    tracked = f._connect().execute("SELECT value FROM meta WHERE name = 'rows'").fetchone()[0]
+    assert tracked == f.count()
+
+
+def test_expired_rows_are_ignored_before_they_are_pruned(tmp_path, monkeypatch):
+    f = _filter(tmp_path, memory_size=0)
+    clock = [1000.0]
+    monkeypatch.setattr(f, "_now", lambda: clock[0])
+    f.check("k")
+    clock[0] += 61
+    assert f.count() == 1, "nothing has pruned it yet"
+    assert f.check("k") is False
+    assert f.check("k") is True, "and the new sighting opens a new window"
+
+
+def test_sqlite_profile_sets_the_connection_up(tmp_path):
+    f = _filter(tmp_path, sqlite_profile="fast")
+    conn = f._connect()
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert _filter(tmp_path)._connect().execute("PRAGMA synchronous").fetchone()[0] == 2
+
+
+def test_timed_checkpoints_replace_automatic_ones(tmp_path):
+    f = _filter(tmp_path, sqlite_profile={"wal_autocheckpoint": 0, "checkpoint_seconds": 0.05})
+    assert f._connect().execute("PRAGMA wal_autocheckpoint").fetchone()[0] == 0
+    f.check("k")
+    assert f._checkpointer.is_alive()
+
+    with pytest.raises(ValueError):
+        _filter(tmp_path, sqlite_profile={"wal_autocheckpoint": 0})
+
+
 # --- shared across processes ---
 
 def test_separate_instances_share_state(tmp_path):
@@ -170,6 +230,54 @@ def test_concurrent_writers_agree_on_a_single_winner(tmp_path):
     assert results.count(True) == 7
 
 
+# --- in-process memory ---
+
+def test_repeat_is_answered_from_memory(tmp_path, monkeypatch):
+    f = _filter(tmp_path)
+    f.check("k")
+
+    def unavailable():
+        raise AssertionError("the shared store was consulted")
+
+    monkeypatch.setattr(f, "_connect", unavailable)
+    assert f.check("k") is True
+    assert f.check_many(["k", "k"]) == [True, True]
+
+
+def test_memory_keeps_the_first_sighting(tmp_path, monkeypatch):
+    """A key learned as a duplicate expires with the other process's window,
+    not a full window after this process first saw it."""
+    webhook = _filter(tmp_path)
+    email = _filter(tmp_path)
+    clock = [1000.0]
+    monkeypatch.setattr(webhook, "_now", lambda: clock[0])
+    monkeypatch.setattr(email, "_now", lambda: clock[0])
+
+    webhook.check("k")
+    clock[0] += 50
+    assert email.check("k") is True
+    clock[0] += 11
+    assert email.check("k") is False
+
+
+def test_forget_elsewhere_clears_memory(tmp_path):
+    webhook = _filter(tmp_path)
+    email = _filter(tmp_path)
+    webhook.check("k")
+    assert email.check("k") is True       # now remembered by email
+
+    webhook.forget("k")
+    assert email.check("k") is False
+
+
+def test_memory_is_bounded(tmp_path):
+    f = _filter(tmp_path, memory_size=10)
+    for i in range(100):
+        f.check(f"key-{i}")
+    assert len(f._memory) == 10
+    assert f.check("key-0") is True, "still known to the shared store"
+
+
 # --- webhook integration ---
 
 def _client(app_env, fake_exchange, **env):
@@ -0,0 +1,153 @@
+"""The duplicate window held by dedup_service.py, behind DEDUP_BACKEND=socket."""
+
+import threading
+
+import pytest
+
+from conftest import TEST_PIN
+from dedup import DuplicateFilter
+
+
+@pytest.fixture
+def ds(app_env):
+    return app_env(modules=["config", "dedup_service"])["dedup_service"]
+
+
+@pytest.fixture
+def running(ds, tmp_path):
+    """Start a service; returns (socket path, service). Stopped afterwards."""
+    servers = []
+
+    def start(**kwargs):
+        path = str(tmp_path / "dedup.sock")
+        service = ds.DedupService(str(tmp_path / "dedup.journal"), **kwargs)
+        server = ds.serve(service, path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return path, service
+
+    def stop():
+        server, service = servers.pop()
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+    start.stop = stop
+    yield start
+    while servers:
+        stop()
+
+
+def _filter(tmp_path, path, **kwargs):
+    kwargs.setdefault("window_seconds", 60)
+    return DuplicateFilter(path=str(tmp_path / "unused.sqlite3"), backend="socket",
+                           socket_path=path, **kwargs)
+
+
+def test_processes_share_the_window(running, tmp_path):
+    path, _ = running()
+    webhook = _filter(tmp_path, path)
+    email = _filter(tmp_path, path)
+
+    assert webhook.check("k") is False
+    assert email.check("k") is True
+    assert webhook.check_many(["a", "a", "k"]) == [False, True, True]
+    assert not (tmp_path / "unused.sqlite3").exists()
+
+
+def test_forget_is_seen_by_every_client(running, tmp_path):
+    path, _ = running()
+    webhook = _filter(tmp_path, path)
+    email = _filter(tmp_path, path)
+    webhook.check("k")
+    assert email.check("k") is True
+
+    webhook.forget("k")
+    assert email.check("k") is False
+
+
+def test_window_expires(running, tmp_path):
+    path, service = running()
+    clock = [1000.0]
+    service._now = lambda: clock[0]
+    f = _filter(tmp_path, path, memory_size=0)
+
+    f.check("k")
+    clock[0] += 61
+    assert f.check("k") is False
+
+
+def test_journal_survives_a_restart(running, tmp_path):
+    path, _ = running()
+    f = _filter(tmp_path, path)
+    f.check("kept")
+    f.check("dropped")
+    f.forget("dropped")
+    running.stop()
+
+    path, service = running()
+    assert service.count() == 1
+    # A fresh client, so memory cannot answer for the service.
+    f = _filter(tmp_path, path)
+    assert f.check("kept") is True
+    assert f.check("dropped") is False
+
+
+def test_client_reconnects_after_a_restart(running, tmp_path):
+    path, _ = running()
+    f = _filter(tmp_path, path, memory_size=0)
+    f.check("k")
+    running.stop()
+
+    running()
+    assert f.check("k") is True, "the stale connection must be replaced, not fail open"
+
+
+def test_fails_open_while_the_service_is_down(tmp_path):
+    f = _filter(tmp_path, str(tmp_path / "missing.sock"), memory_size=0)
+    assert f.check("k") is False
+    assert f.check("k") is False
+    f.forget("k")  # logged, not raised
+
+
+def test_journal_is_compacted_and_bounded(running, tmp_path):
+    path, service = running(max_tracked=10)
+    f = _filter(tmp_path, path, memory_size=0)
+    for i in range(2000):
+        f.check(f"key-{i}")
+
+    assert service.count() == 10
+    lines = (tmp_path / "dedup.journal").read_text().splitlines()
+    assert len(lines) <= 2 * 10 + 1024 + 1
+
+
+def test_a_second_service_is_refused(ds, running, tmp_path):
+    path, _ = running()
+    with pytest.raises(RuntimeError):
+        ds.serve(ds.DedupService(str(tmp_path / "other.journal")), path)
+
+
+def test_torn_last_line_is_skipped(ds, tmp_path):
+    journal = tmp_path / "dedup.journal"
+    journal.write_text('["+", 1000.0, "a"]\n["+", 10')
+    service = ds.DedupService(str(journal))
+    assert service.count() == 1
+
+
+def test_webhook_uses_the_service(app_env, running, tmp_path, fake_exchange):
+    path, service = running()
+    modules = app_env(
+        modules=["config", "exchanges", "signal_handler", "webhook_receiver"],
+        DEDUP_BACKEND="socket",
+        DEDUP_SOCKET=path,
+    )
+    stub = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = stub
+    client = modules["webhook_receiver"].app.test_client()
+
+    payload = {"PIN": TEST_PIN, "EXCHANGE": "bybit", "SYMBOL": "BTC/USDT:USDT",
+               "SIDE": "buy", "ORDER_TYPE": "market", "QUANTITY": "0.01"}
+    client.post("/webhook", json=payload)
+    client.post("/webhook", json=payload)
+    assert len(stub.calls) == 1
+    assert service.count() == 1
@@ -4,7 +4,13 @@ The dashboard serves logs/*.log over HTTP via /logs, so anything written
 there is effectively published to whoever can reach the dashboard.
 """
 
+import imaplib
 import json
+import socket
+import threading
+import time
+
+import pytest
 
 from conftest import TEST_PIN
 
@@ -93,3 +99,475 @@ def test_zero_width_obfuscated_subject_does_not_leak_the_pin(app_env, tmp_path):
         'Alert: {"P​IN": "' + TEST_PIN + '", "EXCHANGE": "bybit"}'
     )
     assert TEST_PIN not in _log_text(tmp_path)
+
+
+class _Mailbox:
+    """Just enough of imaplib.IMAP4 for the UID commands the reader sends."""
+
+    def __init__(self, *subjects, uidvalidity=7):
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        # uid -> [subject, flags]
+        self.messages = {}
+        self.commands = []
+        # Set to an exception for the next STORE to raise.
+        self.store_error = None
+        for subject in subjects:
+            self.deliver(subject)
+
+    def deliver(self, subject, seen=False):
+        self.messages[self.uidnext] = [subject, {"\\Seen"} if seen else set()]
+        self.uidnext += 1
+
+    def select(self, reader):
+        """What _open_session records after SELECT."""
+        reader._mailbox.update(uidvalidity=reader._response_code(self, "UIDVALIDITY"),
+                               uidnext=reader._response_code(self, "UIDNEXT"))
+
+    def response(self, name):
+        return name, [str({"UIDVALIDITY": self.uidvalidity, "UIDNEXT": self.uidnext}[name]).encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == "SEARCH":
+            unseen = [str(u).encode() for u, (_, flags) in self.messages.items() if not flags]
+            return "OK", [b" ".join(unseen)]
+        if command == "STORE":
+            error, self.store_error = self.store_error, None
+            if error is not None:
+                raise error
+            self.messages[int(args[0])][1].add("\\Seen")
+            return "OK", [b""]
+        wanted, _ = args
+        if wanted.endswith(":*"):
+            uids = [u for u in self.messages if u >= int(wanted[:-2])]
+            # As servers do: n:* always includes the last message.
+            uids = uids or [max(self.messages)]
+        else:
+            uids = [int(u) for u in wanted.split(",")]
+        data = []
+        for sequence, uid in enumerate(uids, 1):
+            subject, flags = self.messages[uid]
+            header = f"Subject: {subject}\r\n\r\n".encode()
+            meta = f"{sequence} (UID {uid} FLAGS ({' '.join(flags)}) " \
+                   f"BODY[HEADER.FIELDS (SUBJECT)] {{{len(header)}}}"
+            data += [(meta.encode(), header), b")"]
+        return "OK", data
+
+    def fetches(self):
+        return [c for c in self.commands if c[0] == "FETCH"]
+
+
+def _recording(reader, monkeypatch):
+    handled = []
+    original = reader._handle_message
+
+    def handle(mail, uid, header, fetch_seconds):
+        handled.append(int(uid))
+        original(mail, uid, header, fetch_seconds)
+
+    monkeypatch.setattr(reader, "_handle_message", handle)
+    return handled
+
+
+def test_alert_stages_are_timed(app_env, fake_exchange):
+    modules = app_env(modules=["config", "exchanges", "signal_handler", "email_reader"])
+    reader = modules["email_reader"]
+    stub = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = stub
+    box = _Mailbox(_alert_subject())
+    box.select(reader)
+
+    reader._process_new(box)
+
+    assert len(stub.calls) == 1
+    assert box.messages[1][1] == {"\\Seen"}
+    report = reader._metrics_report()["stages"]
+    for stage in ("fetch", "parse", "pin", "dedup", "validate", "exchange", "total"):
+        assert report[stage]["count"] >= 1, stage
+
+
+# --- UID-incremental fetching ---
+
+def test_only_new_messages_are_fetched(app_env, fake_exchange, monkeypatch):
+    modules = app_env(modules=["config", "exchanges", "signal_handler", "email_reader"])
+    reader = modules["email_reader"]
+    stub = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = stub
+    handled = _recording(reader, monkeypatch)
+    box = _Mailbox(*[f"newsletter {n}" for n in range(40)])
+    box.select(reader)
+
+    reader._process_new(box)
+    assert box.commands[0] == ("SEARCH", None, "UNSEEN"), "no saved position yet"
+    assert len(box.fetches()) == 1, "one FETCH for the whole batch"
+    assert "HEADER.FIELDS (SUBJECT)" in box.fetches()[0][2]
+    assert "BODY.PEEK[]" not in box.fetches()[0][2]
+
+    box.deliver(_alert_subject())
+    box.commands.clear()
+    reader._process_new(box)
+
+    assert box.commands[0] == ("FETCH", "41:*", reader._HEADER_ITEMS)
+    assert handled == list(range(1, 42)), "the newsletters are not classified again"
+    assert len(stub.calls) == 1
+
+
+def test_the_last_message_is_not_handled_twice(app_env, monkeypatch):
+    reader = _boot(app_env)
+    handled = _recording(reader, monkeypatch)
+    box = _Mailbox("hello", "world")
+    box.select(reader)
+
+    reader._process_new(box)
+    reader._process_new(box)
+    reader._process_new(box)
+
+    assert handled == [1, 2]
+
+
+def test_position_survives_a_restart(app_env, monkeypatch):
+    reader = _boot(app_env)
+    box = _Mailbox("hello", "world")
+    box.select(reader)
+    reader._process_new(box)
+
+    reader = _boot(app_env)
+    handled = _recording(reader, monkeypatch)
+    box.deliver("again")
+    box.commands.clear()
+    box.select(reader)
+    reader._process_new(box)
+
+    assert [c[0] for c in box.commands] == ["FETCH"]
+    assert handled == [3]
+
+
+def test_new_uidvalidity_starts_over(app_env, monkeypatch):
+    reader = _boot(app_env)
+    handled = _recording(reader, monkeypatch)
+    box = _Mailbox("hello", "world")
+    box.select(reader)
+    reader._process_new(box)
+
+    # The server renumbered the mailbox: old UIDs mean nothing now.
+    box = _Mailbox("renumbered", uidvalidity=8)
+    box.select(reader)
+    reader._process_new(box)
+
+    assert box.commands[0] == ("SEARCH", None, "UNSEEN")
+    assert handled == [1, 2, 1]
+
+
+def test_messages_already_read_are_skipped(app_env, monkeypatch):
+    reader = _boot(app_env)
+    handled = _recording(reader, monkeypatch)
+    box = _Mailbox("hello")
+    box.select(reader)
+    reader._process_new(box)
+
+    box.deliver(_alert_subject(), seen=True)
+    box.deliver("unread")
+    reader._process_new(box)
+
+    assert handled == [1, 3]
+
+
+def test_alert_is_retried_after_the_connection_drops(app_env, fake_exchange, monkeypatch):
+    modules = app_env(modules=["config", "exchanges", "signal_handler", "email_reader"])
+    reader = modules["email_reader"]
+    stub = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = stub
+    handled = _recording(reader, monkeypatch)
+    box = _Mailbox("hello")
+    box.select(reader)
+    reader._process_new(box)
+
+    box.deliver(_alert_subject())
+    box.deliver("after the alert")
+    box.store_error = imaplib.IMAP4.abort("socket error: EOF")
+    with pytest.raises(imaplib.IMAP4.abort):
+        reader._process_new(box)
+    assert stub.calls == []
+
+    # The next session starts from the alert, not past it.
+    box.select(reader)
+    reader._process_new(box)
+    assert len(stub.calls) == 1
+    assert handled == [1, 2, 2, 3]
+
+
+def test_a_failed_message_stops_the_batch(app_env, monkeypatch):
+    reader = _boot(app_env)
+    box = _Mailbox("hello")
+    box.select(reader)
+    reader._process_new(box)
+    box.deliver("broken")
+    box.deliver("later")
+    handled = []
+
+    def handle(mail, uid, header, fetch_seconds):
+        if uid == "2" and not handled:
+            handled.append("failed")
+            raise ValueError("cannot decode")
+        handled.append(int(uid))
+
+    monkeypatch.setattr(reader, "_handle_message", handle)
+    reader._process_new(box)
+    assert handled == ["failed"]
+    reader._process_new(box)
+    assert handled == ["failed", 2, 3]
+
+
+def test_flags_after_the_header_are_read(app_env):
+    reader = _boot(app_env)
+    data = [(b"1 (UID 9 BODY[HEADER.FIELDS (SUBJECT)] {11}", b"Subject: x\r\n"),
+            b" FLAGS (\\Seen))"]
+    assert reader._parse_headers(data) == [(9, b"\\Seen", b"Subject: x\r\n")]
+
+
+# --- IMAP IDLE ---
+
+class _IdleMail(imaplib.IMAP4):
+    """A real imaplib client, its server scripted over a socketpair.
+
+    `script` is what the server sends once the client has connected: lines,
+    with {tag} standing for the tag of the client's last command, or None to
+    wait for the client's next line. Received lines are recorded with their
+    tag as TAG.
+    """
+
+    def __init__(self, script):
+        self._client, server = socket.socketpair()
+        self.received = []
+        greeting = [b"* OK ready", None, b"* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK done"]
+
+        def serve():
+            reader = server.makefile("rb")
+            tag = b""
+            for step in greeting + list(script):
+                if step is None:
+                    line = reader.readline().strip()
+                    if line != b"DONE":
+                        tag, _, rest = line.partition(b" ")
+                        line = b"TAG " + rest
+                    self.received.append(line)
+                else:
+                    server.sendall(step.replace(b"{tag}", tag) + b"\r\n")
+
+        threading.Thread(target=serve, daemon=True).start()
+        super().__init__("scripted")
+        self.received.clear()
+
+    def open(self, host="", port=imaplib.IMAP4_PORT, timeout=None):
+        self.host, self.port = host, port
+        self.sock = self._client
+        self.file = self.sock.makefile("rb")
+
+
+def test_idle_returns_when_mail_arrives(app_env):
+    reader = _boot(app_env)
+    mail = _IdleMail([None, b"+ idling", b"* OK still here", b"* 4 EXISTS",
+                      None, b"{tag} OK IDLE terminated"])
+
+    started = time.monotonic()
+    assert reader._idle(mail, 30) is True
+    assert time.monotonic() - started < 5
+    assert mail.received == [b"TAG IDLE", b"DONE"]
+
+
+def test_idle_is_ended_at_the_timeout(app_env):
+    reader = _boot(app_env)
+    mail = _IdleMail([None, b"+ idling", None, b"{tag} OK IDLE terminated"])
+
+    started = time.monotonic()
+    assert reader._idle(mail, 0.2) is False
+    assert time.monotonic() - started >= 0.2
+    assert mail.received == [b"TAG IDLE", b"DONE"]
+
+
+def test_idle_refused_is_an_error(app_env):
+    reader = _boot(app_env)
+    mail = _IdleMail([None, b"{tag} BAD Unknown command"])
+    with pytest.raises(imaplib.IMAP4.error):
+        reader._idle(mail, 1)
+
+
+def test_what_follows_idle_is_left_for_the_next_command(app_env):
+    reader = _boot(app_env)
+    # The reply to DONE and the next untagged response in one read.
+    mail = _IdleMail([None, b"+ idling", None, b"{tag} OK IDLE terminated\r\n* 7 RECENT",
+                      None, b"{tag} OK NOOP completed"])
+
+    assert reader._idle(mail, 0.1) is False
+    assert mail.noop()[0] == "OK", "the next command is still in step"
+    assert mail.untagged_responses.get("RECENT") == [b"7"]
+
+
+@pytest.mark.skipif(hasattr(imaplib.IMAP4, "idle"), reason="imaplib's own idle() is used")
+def test_mail_already_buffered_is_not_idled_over(app_env):
+    reader = _boot(app_env)
+    mail = _IdleMail([None, b"{tag} OK NOOP completed\r\n* 5 EXISTS"])
+    mail.noop()
+
+    started = time.monotonic()
+    assert reader._idle(mail, 30) is True
+    assert time.monotonic() - started < 5
+    assert mail.received == [b"TAG NOOP"]
+
+
+class _Session:
+    def __init__(self, capabilities=b"IMAP4rev1 IDLE"):
+        self.capabilities = capabilities
+        self.untagged_responses = {}
+        self.logged_out = False
+
+    def capability(self):
+        return "OK", [self.capabilities]
+
+    def logout(self):
+        self.logged_out = True
+
+
+class _Stop(threading.Event):
+    """Records the pauses instead of sleeping through them."""
+
+    def __init__(self):
+        super().__init__()
+        self.pauses = []
+
+    def wait(self, timeout=None):
+        self.pauses.append(timeout)
+        return self.is_set()
+
+
+def test_server_without_idle_falls_back_to_polling(app_env, monkeypatch):
+    reader = _boot(app_env)
+    session = _Session(capabilities=b"IMAP4rev1")
+    monkeypatch.setattr(reader, "_open_session", lambda: session)
+
+    assert reader.watch_inbox(_Stop()) is False
+    assert session.logged_out
+
+
+def test_lost_sessions_are_reopened_with_backoff(app_env, monkeypatch):
+    reader = _boot(app_env)
+    stop = _Stop()
+    attempts = []
+
+    def open_session():
+        attempts.append(1)
+        if len(attempts) <= 3:
+            raise OSError("connection refused")
+        return _Session()
+
+    def idle(mail, timeout):
+        if len(attempts) == 4:
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        stop.set()
+
+    monkeypatch.setattr(reader, "_open_session", open_session)
+    monkeypatch.setattr(reader, "_process_new", lambda mail: None)
+    monkeypatch.setattr(reader, "_idle", idle)
+
+    assert reader.watch_inbox(stop) is True
+    # Growing after each failure, and back to the start once a session opened.
+    assert stop.pauses == [1, 2, 4, 1]
+    assert reader._metrics_report()["imap"] == {
+        "logins": 2, "reused": 0, "reconnects": 1, "idle_cycles": 1,
+    }, "an IDLE round is not a reused session"
+
+
+def test_mail_announced_during_a_search_is_not_left_waiting(app_env, monkeypatch):
+    reader = _boot(app_env)
+    stop = _Stop()
+    session = _Session()
+    searches = []
+
+    def process_unseen(mail):
+        searches.append(1)
+        if len(searches) == 1:
+            mail.untagged_responses["EXISTS"] = [b"5"]
+
+    def idle(mail, timeout):
+        stop.set()
+
+    monkeypatch.setattr(reader, "_open_session", lambda: session)
+    monkeypatch.setattr(reader, "_process_new", process_unseen)
+    monkeypatch.setattr(reader, "_idle", idle)
+
+    reader.watch_inbox(stop)
+    assert len(searches) == 2, "searched again before going idle"
+
+
+# --- the polling session ---
+
+class _PolledSession(_Session):
+    def __init__(self):
+        super().__init__()
+        self.noops = 0
+        self.dead = False
+
+    def noop(self):
+        if self.dead:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+        self.noops += 1
+        return "OK", [b"NOOP completed"]
+
+
+def _polling(app_env, monkeypatch):
+    reader = _boot(app_env)
+    opened = []
+    searched = []
+
+    def open_session():
+        opened.append(_PolledSession())
+        opened[-1].untagged_responses["EXISTS"] = [b"3"]  # as SELECT reports it
+        return opened[-1]
+
+    monkeypatch.setattr(reader, "_open_session", open_session)
+    monkeypatch.setattr(reader, "_process_new", lambda mail: searched.append(mail))
+    return reader, opened, searched
+
+
+def test_polling_keeps_one_session(app_env, monkeypatch):
+    reader, opened, searched = _polling(app_env, monkeypatch)
+
+    for _ in range(3):
+        reader.check_inbox()
+
+    assert len(opened) == 1
+    assert opened[0].noops == 2
+    assert not opened[0].logged_out
+    assert len(searched) == 1, "an unchanged inbox is not searched again"
+
+    opened[0].untagged_responses["EXISTS"] = [b"4"]  # as NOOP reports new mail
+    reader.check_inbox()
+    assert len(searched) == 2
+    assert reader._metrics_report()["imap"] == {"logins": 1, "reused": 3, "reconnects": 0, "idle_cycles": 0}
+
+
+def test_polling_reconnects_when_the_session_dies(app_env, monkeypatch):
+    reader, opened, searched = _polling(app_env, monkeypatch)
+    reader.check_inbox()
+    opened[0].dead = True
+
+    reader.check_inbox()
+
+    assert len(opened) == 2
+    assert opened[0].logged_out
+    assert len(searched) == 2, "a new session always searches"
+    assert reader._metrics_report()["imap"] == {"logins": 2, "reused": 0, "reconnects": 1, "idle_cycles": 0}
+
+
+def test_polling_drops_the_session_after_an_error(app_env, monkeypatch):
+    reader, opened, _ = _polling(app_env, monkeypatch)
+
+    def broken(mail):
+        raise imaplib.IMAP4.error("SEARCH failed")
+
+    monkeypatch.setattr(reader, "_process_new", broken)
+    reader.check_inbox()
+    assert opened[0].logged_out
+    reader.check_inbox()
+    assert len(opened) == 2
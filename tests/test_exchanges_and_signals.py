@@ -1,5 +1,7 @@
 """The critical trading-path fixes."""
 
+import time
+
 import pytest
 
 
@@ -91,3 +93,56 @@ def test_exchange_failure_is_reported_not_swallowed(app_env, fake_exchange):
     assert result["status"] == "error"
     assert "insufficient margin" in result["message"]
     assert result["code"] == 502
+
+
+# --- warm-up ---
+
+class _SlowMarkets:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.loaded = 0
+        self.options = {"adjustForTimeDifference": True}
+        self.clock_synced = False
+
+    def load_time_difference(self):
+        self.clock_synced = True
+
+    def load_markets(self, reload=False):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.loaded += 1
+        return {}
+
+
+def test_warm_up_loads_markets_on_every_exchange(app_env):
+    exchanges = app_env(modules=["config", "exchanges"])["exchanges"]
+    clients = {"bybit": _SlowMarkets(), "binance": _SlowMarkets()}
+    exchanges.exchanges.clear()
+    exchanges.exchanges.update(clients)
+
+    results = exchanges.warm_up()
+
+    assert results == {"bybit": "ok", "binance": "ok"}
+    assert all(c.loaded == 1 for c in clients.values())
+    assert all(c.clock_synced for c in clients.values())
+    assert exchanges.warmup_status()["state"] == "done"
+
+
+def test_warm_up_failure_is_reported_not_fatal(app_env):
+    exchanges = app_env(modules=["config", "exchanges"])["exchanges"]
+    exchanges.exchanges.clear()
+    exchanges.exchanges["bybit"] = _SlowMarkets(error=RuntimeError("DNS failure"))
+    exchanges.exchanges["binance"] = _SlowMarkets(delay=2.0)
+
+    results = exchanges.warm_up(timeout=0.2)
+
+    assert "DNS failure" in results["bybit"]
+    assert "timed out" in results["binance"]
+    assert exchanges.warmup_status()["state"] == "done"
+
+
+def test_warm_up_is_off_by_default(app_env):
+    exchanges = app_env(modules=["config", "exchanges"])["exchanges"]
+    assert exchanges.warmup_status()["state"] == "disabled"
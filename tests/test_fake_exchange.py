@@ -0,0 +1,174 @@
+"""The in-memory exchange behind EXCHANGE_BACKEND=fake."""
+
+import random
+import time
+
+import ccxt
+import pytest
+
+from conftest import TEST_PIN
+
+BTC = "BTC/USDT:USDT"
+
+
+@pytest.fixture
+def fake(app_env):
+    return app_env(modules=["config", "fake_exchange"])["fake_exchange"]
+
+
+def _position(client, symbol=BTC):
+    return next((p for p in client.fetch_positions() if p["symbol"] == symbol), None)
+
+
+def test_market_order_opens_a_position_at_the_mark(fake):
+    client = fake.FakeExchange("bybit")
+    order = client.create_order("BTCUSDT", "market", "buy", 0.0105)
+
+    assert order["status"] == "closed"
+    assert order["filled"] == 0.01, "truncated to the amount step"
+    position = _position(client)
+    assert position["side"] == "long"
+    assert position["contracts"] == 0.01
+    assert position["entryPrice"] == 65000.0
+
+    client.set_price(BTC, 66000.0)
+    assert _position(client)["unrealizedPnl"] == pytest.approx(10.0)
+
+
+def test_closing_realizes_pnl(fake):
+    client = fake.FakeExchange("bybit", balance=1000.0)
+    client.create_order(BTC, "market", "sell", 0.1)
+    client.set_price(BTC, 64000.0)
+    client.create_order(BTC, "market", "buy", 0.1, None, {"reduceOnly": True})
+
+    assert _position(client) is None
+    fees = (0.1 * 65000 + 0.1 * 64000) * fake.TAKER_FEE
+    assert client.fetch_balance()["total"]["USDT"] == pytest.approx(1000.0 + 100.0 - fees)
+
+
+def test_reduce_only_never_opens_or_grows_a_position(fake):
+    client = fake.FakeExchange("bybit")
+    with pytest.raises(ccxt.InvalidOrder):
+        client.create_order(BTC, "market", "sell", 0.01, None, {"reduceOnly": True})
+
+    client.create_order(BTC, "market", "buy", 0.01)
+    with pytest.raises(ccxt.InvalidOrder):
+        client.create_order(BTC, "market", "buy", 0.01, None, {"reduceOnly": True})
+
+    # Larger than the position: closes it, does not flip it.
+    order = client.create_order(BTC, "market", "sell", 0.05, None, {"reduceOnly": True})
+    assert order["filled"] == 0.01
+    assert _position(client) is None
+
+
+def test_plain_order_past_the_position_flips_it(fake):
+    client = fake.FakeExchange("bybit")
+    client.create_order(BTC, "market", "buy", 0.01)
+    client.set_price(BTC, 66000.0)
+    client.create_order(BTC, "market", "sell", 0.03)
+
+    position = _position(client)
+    assert position["side"] == "short"
+    assert position["contracts"] == pytest.approx(0.02)
+    assert position["entryPrice"] == 66000.0
+
+
+def test_limit_orders_rest_until_crossed(fake):
+    client = fake.FakeExchange("bybit")
+    resting = client.create_order(BTC, "limit", "buy", 0.01, 64000.04)
+    assert resting["price"] == 64000.0
+    assert [o["id"] for o in client.fetch_open_orders()] == [resting["id"]]
+
+    client.set_price(BTC, 63990.0)
+    assert client.fetch_open_orders() == []
+    assert _position(client)["entryPrice"] == 63990.0
+
+    other = client.create_order(BTC, "limit", "buy", 0.01, 60000.0)
+    assert client.cancel_order(other["id"], BTC)["status"] == "canceled"
+    with pytest.raises(ccxt.OrderNotFound):
+        client.cancel_order(other["id"], BTC)
+
+
+def test_orders_need_margin(fake):
+    client = fake.FakeExchange("bybit", balance=100.0)
+    with pytest.raises(ccxt.InsufficientFunds):
+        client.create_order(BTC, "market", "buy", 1.0)
+    assert client.fetch_positions() == []
+
+
+def test_batch_orders_succeed_or_fail_one_by_one(fake):
+    client = fake.FakeExchange("bybit")
+    client.create_order(BTC, "market", "buy", 0.01)
+    results = client.create_orders([
+        {"symbol": BTC, "type": "market", "side": "sell", "amount": 0.01,
+         "params": {"reduceOnly": True}},
+        {"symbol": "ETH/USDT:USDT", "type": "market", "side": "sell", "amount": 0.1,
+         "params": {"reduceOnly": True}},
+    ])
+    assert results[0]["status"] == "closed"
+    assert results[1]["status"] == "rejected"
+
+
+def test_latency_and_errors_are_simulated(fake):
+    slow = fake.FakeExchange("bybit", latency="fixed:50")
+    started = time.monotonic()
+    slow.fetch_balance()
+    assert time.monotonic() - started >= 0.05
+
+    broken = fake.FakeExchange("bybit", error_rate=1.0)
+    with pytest.raises(ccxt.ExchangeNotAvailable):
+        broken.create_order(BTC, "market", "buy", 0.01)
+    broken._error_rate = 0.0
+    assert broken.fetch_positions() == [], "a failed call changes nothing"
+
+
+def test_lognormal_latency_matches_its_percentiles(fake):
+    draw = fake.parse_latency("lognormal:20:100")
+    rng = random.Random(1)
+    samples = sorted(draw(rng) for _ in range(20000))
+    assert samples[10000] == pytest.approx(0.020, rel=0.05)
+    assert samples[19800] == pytest.approx(0.100, rel=0.15)
+
+
+@pytest.mark.parametrize("spec", ["fast", "fixed:-1", "uniform:50:10", "lognormal:20"])
+def test_bad_latency_spec_is_refused(fake, spec):
+    with pytest.raises(Exception) as raised:
+        fake.parse_latency(spec)
+    assert type(raised.value).__name__ == "ConfigError"
+
+
+def _stack(app_env):
+    return app_env(
+        modules=["config", "fake_exchange", "exchanges", "signal_handler", "bot_logic",
+                 "webhook_receiver"],
+        EXCHANGE_BACKEND="fake",
+        FAKE_EXCHANGE_LATENCY="0",
+        BYBIT_API_KEY=None,
+        BYBIT_API_SECRET=None,
+    )
+
+
+def test_backend_replaces_every_exchange_without_credentials(app_env):
+    modules = _stack(app_env)
+    clients = modules["exchanges"].exchanges
+    assert set(clients) == {"bybit", "binance"}
+    assert all(isinstance(c, modules["fake_exchange"].FakeExchange) for c in clients.values())
+    assert clients["bybit"].id == "bybit"
+
+
+def test_whole_stack_runs_against_the_fake(app_env):
+    modules = _stack(app_env)
+    client = modules["webhook_receiver"].app.test_client()
+
+    response = client.post("/webhook", json={
+        "PIN": TEST_PIN, "EXCHANGE": "bybit", "SYMBOL": "ETHUSDT",
+        "SIDE": "buy", "ORDER_TYPE": "market", "QUANTITY": "0.5",
+    })
+    assert response.status_code == 200
+    positions = modules["bot_logic"].get_positions()
+    assert positions["bybit"][0]["symbol"] == "ETH/USDT:USDT"
+
+    results = modules["bot_logic"].close_all_positions()
+    assert results["ETH/USDT:USDT"]["status"] == "success"
+    modules["bot_logic"].cache.invalidate("positions")
+    assert modules["bot_logic"].get_positions()["bybit"] == []
@@ -0,0 +1,80 @@
+"""Exchange connection pooling, checked against a local keep-alive server."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ccxt
+import ccxt.async_support as ccxt_async
+import pytest
+
+import async_exchanges
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive unless the client says otherwise
+
+    def do_GET(self):
+        body = b'{"retCode": 0, "ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _pool(app_env, **env):
+    return app_env(modules=["config", "http_pool"], **env)["http_pool"]
+
+
+def test_sync_client_reuses_its_connection(app_env, server):
+    http_pool = _pool(app_env, EXCHANGE_TIMEOUT_MS="2500")
+    client = ccxt.bybit()
+    stats = http_pool.configure(client)
+
+    assert client.fetch(server) == {"retCode": 0, "ok": True}
+    assert client.fetch(server) == {"retCode": 0, "ok": True}
+
+    report = stats.snapshot()
+    assert (report["new"], report["reused"]) == (1, 1)
+    assert report["connect_ms_total"] > 0
+    assert client.timeout == 2500
+    assert client.pool_stats is stats
+
+
+def test_keepalive_can_be_turned_off(app_env, server):
+    http_pool = _pool(app_env, EXCHANGE_KEEPALIVE_SECONDS="0")
+    client = ccxt.bybit()
+    stats = http_pool.configure(client)
+
+    client.fetch(server)
+    client.fetch(server)
+
+    assert (stats.new, stats.reused) == (2, 0)
+
+
+def test_async_client_reuses_its_connection(app_env, server):
+    http_pool = _pool(app_env)
+    raw = ccxt_async.bybit(async_exchanges.settings())
+    stats = http_pool.configure(raw)
+    client = async_exchanges.wrap(raw)
+    try:
+        assert client.fetch(server) == {"retCode": 0, "ok": True}
+        assert client.fetch(server) == {"retCode": 0, "ok": True}
+        assert raw.tcp_connector.limit_per_host == 10
+    finally:
+        client.close()
+
+    assert (stats.new, stats.reused) == (1, 1)
@@ -0,0 +1,221 @@
+"""On-disk market list shared between services and restarts."""
+
+import json
+import threading
+
+import ccxt
+import ccxt.async_support as ccxt_async
+import pytest
+
+import async_exchanges
+
+MARKET = {
+    "id": "BTCUSDT",
+    "symbol": "BTC/USDT:USDT",
+    "base": "BTC",
+    "quote": "USDT",
+    "settle": "USDT",
+    "baseId": "BTC",
+    "quoteId": "USDT",
+    "settleId": "USDT",
+    "type": "swap",
+    "spot": False,
+    "swap": True,
+    "linear": True,
+    "contract": True,
+    "active": True,
+    "precision": {"amount": 0.001, "price": 0.1},
+    "limits": {"amount": {"min": 0.001, "max": 100.0}},
+}
+
+
+@pytest.fixture
+def cache(app_env):
+    return app_env(modules=["config", "market_cache"])["market_cache"]
+
+
+def _client(downloads=None):
+    """A real ccxt client whose market download is counted, not sent."""
+    client = ccxt.bybit({"apiKey": "k", "secret": "s"})
+
+    def fetch_markets(params={}):
+        if downloads is None:
+            raise AssertionError("the network must not be used")
+        downloads.append(1)
+        return [dict(MARKET)]
+
+    client.fetch_markets = fetch_markets
+    client.fetch_currencies = lambda params={}: {}
+    return client
+
+
+def test_saved_markets_load_without_the_network(cache, tmp_path):
+    source = _client(downloads=[])
+    source.load_markets()
+    cache.save("bybit", source, directory=str(tmp_path))
+
+    fresh = _client()
+    age = cache.restore("bybit", fresh, max_age=60, directory=str(tmp_path))
+
+    assert age is not None and age < 60
+    assert fresh.market("BTC/USDT:USDT")["id"] == "BTCUSDT"
+    fresh.load_markets()  # already loaded, so no download
+
+
+def test_missing_file_means_no_markets(cache, tmp_path):
+    assert cache.restore("bybit", _client(), max_age=60, directory=str(tmp_path)) is None
+
+
+def test_file_older_than_max_age_is_ignored(cache, tmp_path, monkeypatch):
+    source = _client(downloads=[])
+    source.load_markets()
+    cache.save("bybit", source, directory=str(tmp_path))
+
+    saved_at = cache._now()
+    monkeypatch.setattr(cache, "_now", lambda: saved_at + 120)
+
+    assert cache.restore("bybit", _client(), max_age=60, directory=str(tmp_path)) is None
+
+
+def test_file_from_another_ccxt_version_is_ignored(cache, tmp_path):
+    source = _client(downloads=[])
+    source.load_markets()
+    cache.save("bybit", source, directory=str(tmp_path))
+
+    path = tmp_path / "bybit.json"
+    document = json.loads(path.read_text())
+    document["ccxt"] = "0.0.1"
+    path.write_text(json.dumps(document))
+
+    assert cache.restore("bybit", _client(), max_age=60, directory=str(tmp_path)) is None
+
+
+def test_corrupt_file_is_ignored(cache, tmp_path):
+    (tmp_path / "bybit.json").write_text("{not json")
+    assert cache.restore("bybit", _client(), max_age=60, directory=str(tmp_path)) is None
+
+
+def test_network_load_is_written_for_the_next_process(cache, tmp_path):
+    """However ccxt decides to load markets, the download is kept."""
+    downloads = []
+    first = _client(downloads)
+    cache.attach("bybit", first, directory=str(tmp_path))
+    first.load_markets()
+
+    second = _client()
+    assert cache.attach("bybit", second, directory=str(tmp_path)) is not None
+    assert "BTC/USDT:USDT" in second.markets
+    assert downloads == [1]
+
+
+def test_stale_cache_is_used_and_refreshed_in_the_background(cache, tmp_path, monkeypatch):
+    source = _client(downloads=[])
+    source.load_markets()
+    cache.save("bybit", source, directory=str(tmp_path))
+    saved_at = cache._now()
+    monkeypatch.setattr(cache, "_now", lambda: saved_at + cache.config.MARKET_CACHE_REFRESH_AGE + 1)
+
+    downloads = []
+    client = _client(downloads)
+    refreshed = []
+    monkeypatch.setattr(
+        cache, "refresh_in_background", lambda name, c: refreshed.append(name)
+    )
+
+    assert cache.attach("bybit", client, directory=str(tmp_path)) is not None
+    assert "BTC/USDT:USDT" in client.markets, "usable while the refresh runs"
+    assert refreshed == ["bybit"]
+    assert downloads == []
+
+
+def _clock(cache, monkeypatch):
+    now = [cache._now()]
+    monkeypatch.setattr(cache, "_now", lambda: now[0])
+    return now
+
+
+def test_long_running_client_refreshes_once_due(cache, tmp_path, monkeypatch):
+    now = _clock(cache, monkeypatch)
+    downloads = []
+    client = _client(downloads)
+    cache.attach("bybit", client, directory=str(tmp_path))
+    client.load_markets()
+    refreshed = []
+    monkeypatch.setattr(cache, "refresh_in_background", lambda name, c: refreshed.append(name))
+
+    client.load_markets()
+    assert refreshed == []
+
+    now[0] += cache.config.MARKET_CACHE_REFRESH_AGE + 1
+    client.load_markets()
+    client.load_markets()
+    assert refreshed == ["bybit"], "checked again only after a pause"
+
+    now[0] += cache._RETRY_SECONDS
+    client.load_markets()
+    assert refreshed == ["bybit", "bybit"]
+    assert downloads == [1], "requests never wait for the refresh"
+
+
+def test_markets_refreshed_elsewhere_are_read_from_the_file(cache, tmp_path, monkeypatch):
+    now = _clock(cache, monkeypatch)
+    downloads = []
+    first = _client(downloads)
+    cache.attach("bybit", first, directory=str(tmp_path))
+    first.load_markets()
+    second = _client()
+    cache.attach("bybit", second, directory=str(tmp_path))
+
+    now[0] += cache.config.MARKET_CACHE_REFRESH_AGE + 1
+    first.load_markets(True)  # as another process's refresh would
+    monkeypatch.setattr(cache, "refresh_in_background", lambda name, c: pytest.fail("downloaded"))
+    second.load_markets()
+
+    assert downloads == [1, 1]
+    assert "BTC/USDT:USDT" in second.markets
+
+
+def test_one_background_refresh_per_exchange(cache):
+    started = []
+    release = threading.Event()
+
+    class _Slow:
+        def load_markets(self, reload=False):
+            started.append(1)
+            release.wait(5)
+
+    first = cache.refresh_in_background("bybit", _Slow())
+    assert cache.refresh_in_background("bybit", _Slow()) is first
+    release.set()
+    first.join(5)
+    assert started == [1]
+
+
+def test_cache_can_be_disabled(app_env, tmp_path):
+    cache = app_env(modules=["config", "market_cache"], MARKET_CACHE_MAX_AGE="0")["market_cache"]
+    assert cache.attach("bybit", _client(), directory=str(tmp_path)) is None
+
+
+def test_async_client_downloads_are_written_too(cache, tmp_path):
+    """ccxt's async clients await load_markets(), so the wrapper must be async."""
+    downloads = []
+    raw = ccxt_async.bybit({"apiKey": "k", "secret": "s", **async_exchanges.settings()})
+
+    async def fetch_markets(params={}):
+        downloads.append(1)
+        return [dict(MARKET)]
+
+    async def fetch_currencies(params={}):
+        return {}
+
+    raw.fetch_markets = fetch_markets
+    raw.fetch_currencies = fetch_currencies
+    client = async_exchanges.wrap(raw)
+
+    cache.attach("bybit", client, directory=str(tmp_path))
+    client.load_markets()
+
+    second = _client()
+    assert cache.attach("bybit", second, directory=str(tmp_path)) is not None
+    assert "BTC/USDT:USDT" in second.markets
+    assert downloads == [1]
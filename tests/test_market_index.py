@@ -0,0 +1,154 @@
+"""Pre-trade symbol, size and tick checks against the cached market list."""
+
+import ccxt
+import pytest
+
+import market_index
+
+SWAP = {
+    "id": "BTCUSDT",
+    "symbol": "BTC/USDT:USDT",
+    "base": "BTC",
+    "quote": "USDT",
+    "settle": "USDT",
+    "baseId": "BTC",
+    "quoteId": "USDT",
+    "settleId": "USDT",
+    "type": "swap",
+    "spot": False,
+    "swap": True,
+    "linear": True,
+    "contract": True,
+    "active": True,
+    "precision": {"amount": 0.001, "price": 0.1},
+    "limits": {"amount": {"min": 0.001, "max": 100.0}, "cost": {"min": 5.0}},
+}
+SPOT = dict(
+    SWAP,
+    symbol="BTC/USDT",
+    settle=None,
+    settleId=None,
+    type="spot",
+    spot=True,
+    swap=False,
+    linear=None,
+    contract=False,
+)
+DELISTED = dict(SWAP, id="LUNAUSDT", symbol="LUNA/USDT:USDT", base="LUNA", baseId="LUNA", active=False)
+
+
+class _Orders:
+    """A real ccxt client with markets set locally and orders recorded."""
+
+    def __init__(self, markets, **options):
+        super().__init__({"apiKey": "k", "secret": "s", "options": options})
+        self.set_markets(markets)
+        self.calls = []
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self.calls.append({"symbol": symbol, "amount": amount, "price": price})
+        return {"id": "order-1", "symbol": symbol, "status": "closed"}
+
+
+class _Recording(_Orders, ccxt.bybit):
+    pass
+
+
+class _RecordingBinance(_Orders, ccxt.binance):
+    pass
+
+
+def _prepare(client, symbol="BTC/USDT:USDT", quantity=0.01, price=None):
+    return market_index.prepare(client, "bybit", symbol, quantity, price)
+
+
+def test_quantity_is_truncated_to_precision():
+    """Never rounded up, so a close cannot open the other way."""
+    prepared, problem = _prepare(_Recording([SWAP]), quantity=0.0129)
+    assert problem is None
+    assert prepared == ("BTC/USDT:USDT", 0.012, None)
+
+
+def test_price_is_rounded_to_the_tick():
+    prepared, problem = _prepare(_Recording([SWAP]), price=65000.04)
+    assert problem is None
+    assert prepared[2] == 65000.0
+
+
+@pytest.mark.parametrize(
+    "symbol, quantity, price, expected",
+    [
+        ("DOGE/USDT:USDT", 1, None, "Unknown SYMBOL"),
+        ("LUNA/USDT:USDT", 1, None, "not currently trading"),
+        ("BTC/USDT:USDT", 0.0004, None, "below the minimum"),
+        ("BTC/USDT:USDT", 250, None, "above the maximum"),
+        ("BTC/USDT:USDT", 0.001, 1000.0, "Order value"),
+    ],
+)
+def test_orders_the_exchange_would_refuse_are_rejected(symbol, quantity, price, expected):
+    prepared, problem = _prepare(_Recording([SWAP, DELISTED]), symbol, quantity, price)
+    assert prepared is None
+    assert expected in problem
+
+
+def test_exchange_id_resolves_like_ccxt():
+    """'BTCUSDT' names both markets; ccxt picks by the client's default type."""
+    swap = _Recording([SPOT, SWAP], defaultType="swap")
+    spot = _Recording([SPOT, SWAP], defaultType="spot")
+    assert _prepare(swap, "BTCUSDT")[0][0] == swap.market("BTCUSDT")["symbol"] == "BTC/USDT:USDT"
+    assert _prepare(spot, "BTCUSDT")[0][0] == spot.market("BTCUSDT")["symbol"] == "BTC/USDT"
+
+
+def test_binance_perpetual_is_checked_against_its_own_limits():
+    """binance's defaultType "future" means the linear swap, not a future."""
+    spot = dict(SPOT, limits={"amount": {"min": 0.001}, "cost": {"min": 5.0}})
+    perpetual = dict(SWAP, limits={"amount": {"min": 0.001}, "cost": {"min": 0.1}})
+    client = _RecordingBinance([spot, perpetual], defaultType="future")
+
+    for symbol in ("BTCUSDT", "BTC/USDT"):
+        prepared, problem = market_index.prepare(client, "binance", symbol, 0.01, 100.0)
+        assert problem is None, symbol
+        assert prepared[0] == client.market(symbol)["symbol"] == "BTC/USDT:USDT"
+
+
+def test_reloaded_markets_are_used():
+    client = _Recording([SWAP])
+    assert "Unknown SYMBOL" in _prepare(client, "LUNA/USDT:USDT")[1]
+
+    client.set_markets([SWAP, DELISTED])
+    assert "not currently trading" in _prepare(client, "LUNA/USDT:USDT")[1]
+
+
+def test_client_without_markets_is_left_to_the_exchange(fake_exchange):
+    prepared, problem = _prepare(fake_exchange(), "ANYTHING", 0.0000001)
+    assert problem is None
+    assert prepared == ("ANYTHING", 0.0000001, None)
+
+
+def test_signal_is_rejected_without_an_exchange_call(app_env):
+    modules = app_env(modules=["config", "exchanges", "signal_handler"])
+    client = _Recording([SWAP])
+    modules["exchanges"].exchanges["bybit"] = client
+
+    result = modules["signal_handler"].process_signal(
+        {"EXCHANGE": "bybit", "SYMBOL": "BTC/USDT:USDT", "SIDE": "buy",
+         "ORDER_TYPE": "market", "QUANTITY": "0.0001"}
+    )
+
+    assert result["status"] == "error"
+    assert result["code"] == 400
+    assert client.calls == []
+
+
+def test_signal_is_sent_with_exchange_precision(app_env):
+    modules = app_env(modules=["config", "exchanges", "signal_handler"])
+    client = _Recording([SWAP])
+    modules["exchanges"].exchanges["bybit"] = client
+
+    result = modules["signal_handler"].process_signal(
+        {"EXCHANGE": "bybit", "SYMBOL": "BTCUSDT", "SIDE": "buy", "ORDER_TYPE": "limit",
+         "QUANTITY": "0.01234", "PRICE": "65000.06"}
+    )
+
+    assert result["status"] == "success"
+    assert client.calls == [{"symbol": "BTC/USDT:USDT", "amount": 0.012, "price": 65000.1}]
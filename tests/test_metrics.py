@@ -0,0 +1,58 @@
+"""Stage latency histograms."""
+
+import json
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+def test_percentiles_are_within_a_bucket_of_the_truth():
+    histogram = metrics.Histogram()
+    for ms in range(1, 1001):
+        histogram.observe(ms / 1000)
+
+    report = histogram.snapshot()
+    assert report["count"] == 1000
+    assert report["p50_ms"] == pytest.approx(500, rel=0.2)
+    assert report["p99_ms"] == pytest.approx(990, rel=0.2)
+    assert report["max_ms"] == 1000
+    assert report["p99_ms"] <= report["max_ms"]
+
+
+def test_empty_histogram_reports_only_its_count():
+    assert metrics.Histogram().snapshot() == {"count": 0}
+
+
+def test_stage_timer_feeds_the_registry_and_the_header():
+    registry = metrics.Registry()
+    timer = registry.timer()
+    with timer.stage("parse"):
+        pass
+    timer.record("exchange", 0.25)
+
+    assert timer.server_timing().endswith("exchange;dur=250.000")
+    assert timer.server_timing().startswith("parse;dur=")
+    assert "exchange=250.0ms" in timer.log_field()
+    assert set(registry.snapshot()) == {"parse", "exchange"}
+
+
+def test_stage_is_recorded_even_when_it_raises():
+    registry = metrics.Registry()
+    timer = registry.timer()
+    with pytest.raises(ValueError):
+        with timer.stage("validate"):
+            raise ValueError("bad")
+    assert registry.snapshot()["validate"]["count"] == 1
+
+
+def test_serve_answers_on_loopback():
+    server = metrics.serve(0, lambda: {"stages": {"pin": {"count": 1}}})
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert json.load(response) == {"stages": {"pin": {"count": 1}}}
+    finally:
+        server.shutdown()
+        server.server_close()
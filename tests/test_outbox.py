@@ -0,0 +1,135 @@
+"""Durable signal queue and the executor that drains it."""
+
+from conftest import TEST_PIN
+
+import outbox as outbox_module
+from outbox import ERROR, EXPIRED, INTERRUPTED, OK, PENDING, RUNNING, Outbox
+
+
+def _signal(**overrides):
+    payload = {
+        "PIN": TEST_PIN,
+        "EXCHANGE": "bybit",
+        "SYMBOL": "BTC/USDT:USDT",
+        "SIDE": "buy",
+        "ORDER_TYPE": "market",
+        "QUANTITY": "0.01",
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_signals_are_claimed_per_exchange_oldest_first(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.enqueue("a", "bybit", _signal(SIDE="buy"))
+    box.enqueue("b", "binance", _signal(EXCHANGE="binance"))
+    box.enqueue("c", "bybit", _signal(SIDE="sell"))
+
+    first = box.claim_next("bybit", max_age=60)
+    assert first["id"] == "a" and first["status"] == RUNNING
+    assert "PIN" not in first["payload"], "the PIN is never written to disk"
+    assert box.claim_next("bybit", max_age=60)["id"] == "c"
+    assert box.claim_next("bybit", max_age=60) is None
+    assert box.get("b")["status"] == PENDING
+
+
+def test_stale_signals_expire_instead_of_trading_late(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.enqueue("old", "bybit", _signal())
+    now = box._now()
+    monkeypatch.setattr(box, "_now", lambda: now + 61)
+
+    assert box.claim_next("bybit", max_age=60) is None
+    assert box.get("old")["status"] == EXPIRED
+
+
+def test_signal_in_flight_at_a_crash_is_not_retried(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    box = Outbox(path)
+    box.enqueue("a", "bybit", _signal())
+    box.enqueue("b", "bybit", _signal(SIDE="sell"))
+    box.claim_next("bybit", max_age=60)
+
+    restarted = Outbox(path)
+    assert restarted.recover() == 1
+    assert restarted.get("a")["status"] == INTERRUPTED
+    assert restarted.claim_next("bybit", max_age=60)["id"] == "b"
+
+
+def test_stats_report_depth_and_wait(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.enqueue("a", "bybit", _signal())
+    box.enqueue("b", "bybit", _signal(SIDE="sell"))
+    assert box.stats()["depth"] == 2
+
+    box.claim_next("bybit", max_age=60)
+    report = box.stats()
+    assert (report["depth"], report["running"]) == (1, 1)
+    assert report["wait_ms"]["count"] == 1
+    assert report["oldest_pending_ms"] >= 0
+
+
+def _executor(app_env, fake_exchange, **env):
+    modules = app_env(
+        modules=["config", "exchanges", "signal_handler", "executor", "webhook_receiver"],
+        SIGNAL_EXECUTION="outbox",
+        **env,
+    )
+    stub = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = stub
+    return modules, stub
+
+
+def test_executor_places_queued_signals_in_order(app_env, fake_exchange):
+    modules, stub = _executor(app_env, fake_exchange)
+    box = Outbox()
+    box.enqueue("a", "bybit", _signal(SIDE="buy"))
+    box.enqueue("b", "bybit", _signal(SIDE="sell"))
+
+    assert modules["executor"].drain(box, "bybit") == 2
+
+    assert [call["side"] for call in stub.calls] == ["buy", "sell"]
+    assert box.get("a")["status"] == OK
+    assert box.get("a")["result"]["id"] == "order-1"
+
+
+def test_exchange_failure_is_recorded(app_env, fake_exchange):
+    modules, _ = _executor(app_env, fake_exchange)
+    modules["exchanges"].exchanges["bybit"] = fake_exchange(raises=RuntimeError("margin"))
+    box = Outbox()
+    box.enqueue("a", "bybit", _signal())
+
+    modules["executor"].drain(box, "bybit")
+
+    row = box.get("a")
+    assert (row["status"], row["code"]) == (ERROR, 502)
+    assert "margin" in row["result"]
+
+
+def test_webhook_queues_and_reports_the_outcome(app_env, fake_exchange):
+    modules, stub = _executor(app_env, fake_exchange)
+    client = modules["webhook_receiver"].app.test_client()
+
+    response = client.post("/webhook", json=_signal())
+    assert response.status_code == 202
+    signal_id = response.get_json()["signal_id"]
+    assert stub.calls == [], "the webhook itself never trades"
+    assert client.get(f"/webhook/status/{signal_id}").get_json()["status"] == PENDING
+    assert client.get("/metrics").get_json()["outbox"]["depth"] == 1
+
+    modules["executor"].drain(outbox_module.Outbox(), "bybit")
+
+    status = client.get(f"/webhook/status/{signal_id}").get_json()
+    assert status["status"] == OK
+    assert status["order"]["id"] == "order-1"
+    assert len(stub.calls) == 1
+
+
+def test_webhook_rejects_invalid_signals_before_queueing(app_env, fake_exchange):
+    modules, _ = _executor(app_env, fake_exchange)
+    client = modules["webhook_receiver"].app.test_client()
+
+    response = client.post("/webhook", json=_signal(SIDE="sideways"))
+
+    assert response.status_code == 400
+    assert Outbox().stats()["depth"] == 0
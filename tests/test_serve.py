@@ -39,6 +39,16 @@ def test_each_service_runs_a_single_worker(app_env):
         assert command[command.index("-w") + 1] == "1"
 
 
+def test_dashboard_uses_threads_for_streaming(app_env):
+    """A /stream viewer holds its connection open; a sync worker would be
+    stuck on it and the rest of the dashboard would stop answering."""
+    serve = _serve(app_env, DASHBOARD_THREADS="12")
+    command = serve.build_command("dashboard")
+    assert command[command.index("-k") + 1] == "gthread"
+    assert command[command.index("--threads") + 1] == "12"
+    assert "--threads" not in serve.build_command("webhook")
+
+
 def test_services_map_to_the_right_app(app_env):
     serve = _serve(app_env)
     assert serve.build_command("dashboard")[-1] == "dashboard_app:app"
@@ -0,0 +1,31 @@
+"""Results of signals executed after they were acknowledged."""
+
+from signal_results import PENDING, ResultStore, new_signal_id
+
+
+def test_result_moves_from_pending_to_final():
+    store = ResultStore()
+    store.accept("a")
+    assert store.get("a")["status"] == PENDING
+    assert store.pending() == 1
+
+    store.finish("a", status="ok", order={"id": "1"})
+
+    entry = store.get("a")
+    assert entry["status"] == "ok"
+    assert entry["finished_at"] >= entry["accepted_at"]
+    assert store.pending() == 0
+
+
+def test_only_the_newest_signals_are_kept():
+    store = ResultStore(max_tracked=2)
+    for signal_id in ("a", "b", "c"):
+        store.accept(signal_id)
+    assert store.get("a") is None
+    store.finish("a", status="ok")  # evicted: ignored, not resurrected
+    assert store.get("a") is None
+    assert store.get("c")["status"] == PENDING
+
+
+def test_signal_ids_are_unique():
+    assert len({new_signal_id() for _ in range(100)}) == 100
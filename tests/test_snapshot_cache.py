@@ -0,0 +1,152 @@
+"""Shared exchange-state cache and its single-flight loading."""
+
+import threading
+import time
+
+from snapshot_cache import SnapshotCache
+
+
+def _cache(**ttls):
+    return SnapshotCache(ttls or {"positions": 5})
+
+
+def test_fresh_entry_is_served_without_loading():
+    cache = _cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "value"
+
+    assert cache.get("positions", loader) == "value"
+    assert cache.get("positions", loader) == "value"
+    assert len(calls) == 1
+
+
+def test_entry_expires_after_its_ttl(monkeypatch):
+    cache = _cache()
+    clock = [100.0]
+    monkeypatch.setattr(cache, "_now", lambda: clock[0])
+    calls = []
+
+    cache.get("positions", lambda: calls.append(1))
+    clock[0] += 4.9
+    cache.get("positions", lambda: calls.append(1))
+    clock[0] += 0.2
+    cache.get("positions", lambda: calls.append(1))
+
+    assert len(calls) == 2
+
+
+def test_zero_ttl_always_loads():
+    cache = _cache(positions=0)
+    calls = []
+    for _ in range(3):
+        cache.get("positions", lambda: calls.append(1))
+    assert len(calls) == 3
+
+
+def test_concurrent_misses_share_one_load():
+    """Several tabs refreshing at once must cost one exchange call."""
+    cache = _cache()
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("positions", loader)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+    assert cache.stats()["positions"]["coalesced"] == 4
+
+
+def test_failed_load_reaches_every_waiter_and_is_not_cached():
+    cache = _cache()
+    release = threading.Event()
+
+    def loader():
+        release.wait(2)
+        raise RuntimeError("exchange down")
+
+    errors = []
+
+    def worker():
+        try:
+            cache.get("positions", loader)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert errors == ["exchange down"] * 3
+    assert cache.get("positions", lambda: "recovered") == "recovered"
+
+
+def test_get_many_loads_only_what_is_missing_in_one_call():
+    cache = _cache(positions=5, balances=5)
+    cache.get("positions", lambda: "cached")
+    requested = []
+
+    def loader(kinds):
+        requested.append(list(kinds))
+        return {kind: f"fresh-{kind}" for kind in kinds}
+
+    values = cache.get_many(["positions", "balances"], loader)
+
+    assert values == {"positions": "cached", "balances": "fresh-balances"}
+    assert requested == [["balances"]]
+
+
+def test_invalidate_forces_a_reload():
+    cache = _cache()
+    cache.get("positions", lambda: "before")
+    cache.invalidate("positions")
+    assert cache.get("positions", lambda: "after") == "after"
+
+
+def test_load_started_before_invalidate_is_not_kept():
+    """A close lands mid-refresh: the refresh must not pin the old state."""
+    cache = _cache()
+
+    def loader():
+        cache.invalidate("positions")
+        return "stale"
+
+    assert cache.get("positions", loader) == "stale"
+    assert cache.get("positions", lambda: "fresh") == "fresh"
+
+
+def test_stats_report_age_and_hit_rate(monkeypatch):
+    cache = _cache()
+    clock = [100.0]
+    monkeypatch.setattr(cache, "_now", lambda: clock[0])
+
+    cache.get("positions", lambda: "v")
+    clock[0] += 2
+    cache.get("positions", lambda: "v")
+    cache.get("positions", lambda: "v")
+
+    stats = cache.stats()["positions"]
+    assert stats["age"] == 2.0
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["hit_rate"] == round(2 / 3, 4)
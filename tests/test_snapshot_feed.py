@@ -0,0 +1,134 @@
+"""Pushing dashboard changes to every viewer from one refresher."""
+
+import json
+import threading
+import time
+
+from snapshot_feed import SnapshotFeed, format_event
+
+
+def _snapshot(version, pnl=0.0, positions=None):
+    return {
+        "version": version,
+        "positions": positions or {},
+        "pending_orders": {},
+        "summary_stats": {"total_pnl": pnl},
+        "errors": {},
+    }
+
+
+def _feed(fetch=lambda: _snapshot(1), interval=60):
+    return SnapshotFeed(fetch, interval)
+
+
+def test_first_update_is_the_full_snapshot():
+    feed = _feed()
+    subscription = feed.subscribe()
+
+    update = subscription.next(timeout=2)
+    subscription.close()
+
+    assert update["version"] == 1
+    assert {"positions", "pending_orders", "summary_stats", "errors"} <= set(update)
+
+
+def test_only_changed_sections_are_pushed():
+    feed = _feed()
+    feed.publish(_snapshot(1))
+    subscription = feed.subscribe()
+    subscription.next(timeout=1)  # the full state on connect
+
+    feed.publish(_snapshot(2, pnl=5.0))
+    update = subscription.next(timeout=1)
+    subscription.close()
+
+    assert update == {"summary_stats": {"total_pnl": 5.0}, "version": 2}
+
+
+def test_unchanged_snapshot_pushes_nothing():
+    feed = _feed()
+    feed.publish(_snapshot(1))
+    subscription = feed.subscribe()
+    subscription.next(timeout=1)
+
+    feed.publish(_snapshot(1))
+
+    assert subscription.next(timeout=0.1) is None
+    subscription.close()
+
+
+def test_one_refresher_serves_every_viewer():
+    """Exchange load must not grow with the number of people watching."""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return _snapshot(1)
+
+    feed = _feed(fetch)
+    viewers = [feed.subscribe() for _ in range(5)]
+    for viewer in viewers:
+        assert viewer.next(timeout=2)["version"] == 1
+    for viewer in viewers:
+        viewer.close()
+
+    assert len(calls) == 1
+
+
+def test_refresher_stops_when_nobody_is_watching():
+    feed = _feed(interval=0.05)
+    subscription = feed.subscribe()
+    subscription.next(timeout=2)
+    subscription.close()
+
+    deadline = time.monotonic() + 2
+    while feed._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert feed._thread is None
+
+
+def test_lagging_viewer_is_resynced_with_the_full_state():
+    feed = _feed(lambda: feed._latest)  # the refresher sees no change
+    feed.publish(_snapshot(1))
+    subscription = feed.subscribe()
+    for version in range(2, 40):
+        feed.publish(_snapshot(version, pnl=float(version)))
+
+    updates = []
+    while True:
+        update = subscription.next(timeout=0.1)
+        if update is None:
+            break
+        updates.append(update)
+    subscription.close()
+
+    assert len(updates) < 38, "the backlog should have been collapsed"
+    assert "positions" in updates[0], "expected a full snapshot, not a delta"
+    assert updates[-1]["version"] == 39
+
+
+def test_refresh_failure_keeps_the_feed_alive():
+    attempts = []
+    ready = threading.Event()
+
+    def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("exchange down")
+        ready.set()
+        return _snapshot(1)
+
+    feed = _feed(fetch, interval=0.05)
+    subscription = feed.subscribe()
+    update = subscription.next(timeout=2)
+    subscription.close()
+
+    assert ready.is_set()
+    assert update["version"] == 1
+
+
+def test_event_format():
+    message = format_event({"version": 1})
+    assert message.startswith("event: snapshot\ndata: ")
+    assert message.endswith("\n\n")
+    assert json.loads(message.split("data: ", 1)[1]) == {"version": 1}
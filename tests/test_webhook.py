@@ -1,6 +1,8 @@
 """Webhook authentication, parsing and status reporting."""
 
 import json
+import threading
+import time
 
 from conftest import TEST_PIN
 
@@ -119,3 +121,201 @@ def test_pin_is_never_written_to_the_log(app_env, fake_exchange, tmp_path):
     assert written, "expected the webhook log to have been written"
     assert TEST_PIN not in written
     assert "a-wrong-pin-value" not in written
+
+
+def test_health_is_unavailable_while_warming_up(app_env, fake_exchange):
+    """Traffic should only arrive once the first order can be fast."""
+    client, _, modules = _client(app_env, fake_exchange)
+    registry = modules["exchanges"]
+    registry.exchanges.pop("binance", None)
+
+    registry._warmup["state"] = "running"
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "warming_up"
+
+    registry.warm_up()
+    body = client.get("/health").get_json()
+    assert body["status"] == "ok"
+    assert body["warmup"]["state"] == "done"
+    assert body["warmup"]["exchanges"]["bybit"] == "ok"
+
+
+def test_health_without_warm_up(app_env, fake_exchange):
+    client, _, _ = _client(app_env, fake_exchange)
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["warmup"]["state"] == "disabled"
+
+
+def test_metrics_are_served_to_loopback_only(app_env, fake_exchange):
+    client, _, modules = _client(app_env, fake_exchange)
+    modules["exchanges"].exchanges.pop("bybit")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.get_json()["connections"]["binance"]["new"] == 0
+
+    remote = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.9"})
+    assert remote.status_code == 403
+
+
+def test_every_stage_is_timed(app_env, fake_exchange):
+    client, _, modules = _client(app_env, fake_exchange)
+    registry = modules["webhook_receiver"].metrics.registry
+
+    response = client.post("/webhook", json=_payload())
+
+    timing = response.headers["Server-Timing"]
+    stages = [part.split(";")[0] for part in timing.split(", ")]
+    assert stages == [
+        "ip_check", "throttle", "parse", "pin", "dedup", "validate", "exchange", "total",
+    ]
+    report = client.get("/metrics").get_json()["stages"]
+    assert report["exchange"]["count"] >= 1
+    assert "p99_ms" in registry.snapshot()["total"]
+
+
+def test_rejected_request_still_carries_timing(app_env, fake_exchange):
+    client, _, _ = _client(app_env, fake_exchange)
+    response = client.post("/webhook", json=_payload(PIN="wrong"))
+    assert response.status_code == 403
+    assert "pin;dur=" in response.headers["Server-Timing"]
+
+
+def _wait_for_result(client, signal_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        body = client.get(f"/webhook/status/{signal_id}").get_json()
+        if body["status"] != "pending" or time.monotonic() > deadline:
+            return body
+        time.sleep(0.01)
+
+
+def test_async_execution_acknowledges_before_the_exchange_answers(app_env, fake_exchange):
+    client, stub, _ = _client(app_env, fake_exchange, WEBHOOK_ASYNC_EXECUTION="true")
+    release = threading.Event()
+    create_order = stub.create_order
+    stub.create_order = lambda *a, **k: (release.wait(5), create_order(*a, **k))[1]
+
+    response = client.post("/webhook", json=_payload())
+
+    assert response.status_code == 202
+    signal_id = response.get_json()["signal_id"]
+    assert response.get_json()["status_url"] == f"/webhook/status/{signal_id}"
+    assert client.get(f"/webhook/status/{signal_id}").get_json()["status"] == "pending"
+
+    release.set()
+    result = _wait_for_result(client, signal_id)
+    assert result["status"] == "ok"
+    assert result["order"]["id"] == "order-1"
+    assert len(stub.calls) == 1
+
+
+def test_async_execution_still_rejects_invalid_signals_inline(app_env, fake_exchange):
+    client, stub, _ = _client(app_env, fake_exchange, WEBHOOK_ASYNC_EXECUTION="true")
+
+    response = client.post("/webhook", json=_payload(QUANTITY="-1"))
+    assert response.status_code == 400
+    assert "greater than zero" in response.get_json()["error"]
+
+    # Nothing was placed, so the corrected signal is not a duplicate.
+    assert client.post("/webhook", json=_payload()).status_code == 202
+    assert client.post("/webhook", json=_payload()).get_json()["status"] == "duplicate"
+
+
+def test_async_execution_reports_exchange_failures(app_env, fake_exchange):
+    client, _, modules = _client(app_env, fake_exchange, WEBHOOK_ASYNC_EXECUTION="true")
+    modules["exchanges"].exchanges["bybit"] = fake_exchange(raises=RuntimeError("margin"))
+
+    signal_id = client.post("/webhook", json=_payload()).get_json()["signal_id"]
+
+    result = _wait_for_result(client, signal_id)
+    assert result["status"] == "error"
+    assert result["code"] == 502
+    assert "margin" in result["error"]
+
+
+def test_unknown_signal_id_is_not_found(app_env, fake_exchange):
+    client, _, _ = _client(app_env, fake_exchange, WEBHOOK_ASYNC_EXECUTION="true")
+    assert client.get("/webhook/status/nope").status_code == 404
+
+
+class _SlowOrders:
+    """Wraps a fake exchange so each order takes `delay` seconds."""
+
+    def __init__(self, inner, delay):
+        self.inner = inner
+        self.delay = delay
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def create_order(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return self.inner.create_order(*args, **kwargs)
+
+
+def _batch(*legs, pin=TEST_PIN):
+    return {"PIN": pin, "SIGNALS": list(legs)}
+
+
+def _leg(**overrides):
+    leg = _payload(**overrides)
+    del leg["PIN"]
+    return leg
+
+
+def test_batch_legs_run_concurrently_across_exchanges(app_env, fake_exchange):
+    client, bybit, modules = _client(app_env, fake_exchange)
+    binance = fake_exchange()
+    modules["exchanges"].exchanges["bybit"] = _SlowOrders(bybit, 0.3)
+    modules["exchanges"].exchanges["binance"] = _SlowOrders(binance, 0.3)
+
+    started = time.monotonic()
+    response = client.post("/webhook", json=_batch(
+        _leg(SIDE="buy"), _leg(EXCHANGE="binance", SIDE="sell"),
+    ))
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [(r["index"], r["status"]) for r in results] == [(0, "ok"), (1, "ok")]
+    assert len(bybit.calls) == 1 and len(binance.calls) == 1
+    assert elapsed < 0.3 * 2, "legs are not placed one after another"
+
+
+def test_batch_reports_each_leg(app_env, fake_exchange):
+    client, stub, _ = _client(app_env, fake_exchange)
+
+    response = client.post("/webhook", json=_batch(_leg(), _leg(QUANTITY="-1")))
+
+    assert response.status_code == 207
+    ok, bad = response.get_json()["results"]
+    assert ok["status"] == "ok"
+    assert (bad["code"], bad["index"]) == (400, 1)
+    assert "greater than zero" in bad["error"]
+    assert len(stub.calls) == 1
+
+
+def test_batch_is_deduplicated_as_a_whole(app_env, fake_exchange):
+    client, stub, _ = _client(app_env, fake_exchange)
+    batch = _batch(_leg(), _leg(), _leg(SIDE="sell"))
+
+    first = client.post("/webhook", json=batch).get_json()["results"]
+    assert [r["status"] for r in first] == ["ok", "duplicate", "ok"]
+
+    again = client.post("/webhook", json=batch)
+    assert again.status_code == 200
+    assert {r["status"] for r in again.get_json()["results"]} == {"duplicate"}
+    assert len(stub.calls) == 2
+
+
+def test_batch_needs_the_pin_and_a_sane_size(app_env, fake_exchange):
+    client, stub, _ = _client(app_env, fake_exchange, WEBHOOK_MAX_BATCH="2")
+
+    assert client.post("/webhook", json=_batch(_leg(), pin="wrong")).status_code == 403
+    assert client.post("/webhook", json=_batch(_leg(), _leg(SIDE="sell"), _leg(QUANTITY="2"))).status_code == 400
+    assert client.post("/webhook", json={"PIN": TEST_PIN, "SIGNALS": []}).status_code == 400
+    assert client.post("/webhook", json={"PIN": TEST_PIN, "SIGNALS": "x"}).status_code == 400
+    assert stub.calls == []
@@ -0,0 +1,158 @@
+"""Request weight shared between services, with orders first."""
+
+import asyncio
+import time
+
+import ccxt
+import ccxt.async_support as ccxt_async
+import pytest
+
+
+@pytest.fixture
+def wb(app_env):
+    return app_env(modules=["config", "weight_budget"])["weight_budget"]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _budget(wb, tmp_path, clock, **kwargs):
+    store = wb.WeightBudget(str(tmp_path / "weight.sqlite3"), **kwargs)
+    store._now = clock
+    return store
+
+
+def test_reads_stop_at_the_reserve(wb, tmp_path):
+    clock = _Clock()
+    store = _budget(wb, tmp_path, clock, burst_seconds=10, reserve=0.3)
+    # 10 units a second, so 100 in the bucket and 30 held back for trades.
+    assert store.take("k", 70, rate=10) == 0.0
+    wait = store.take("k", 5, rate=10)
+    assert wait == pytest.approx(0.5)
+
+    clock.now += wait
+    assert store.take("k", 5, rate=10) == 0.0
+
+
+def test_trades_never_wait(wb, tmp_path):
+    clock = _Clock()
+    store = _budget(wb, tmp_path, clock, burst_seconds=10, reserve=0.3)
+    for _ in range(15):
+        assert store.take("k", 10, rate=10, kind=wb.TRADE) == 0.0
+    # The overdraft is paid back by the reads that follow.
+    assert store.take("k", 1, rate=10, kind=wb.READ) > 5
+
+
+def test_processes_share_one_bucket(wb, tmp_path):
+    clock = _Clock()
+    dashboard = _budget(wb, tmp_path, clock, reserve=0.0)
+    webhook = _budget(wb, tmp_path, clock, reserve=0.0)
+    assert dashboard.take("k", 100, rate=10) == 0.0
+    assert webhook.take("k", 1, rate=10) > 0
+
+
+def test_buckets_are_per_account(wb, tmp_path):
+    clock = _Clock()
+    store = _budget(wb, tmp_path, clock, reserve=0.0)
+    assert store.take("bybit:a", 100, rate=10) == 0.0
+    assert store.take("bybit:b", 100, rate=10) == 0.0
+
+
+def _modules(app_env, **env):
+    return app_env(modules=["config", "weight_budget", "exchanges"], WEIGHT_BUDGET="true", **env)
+
+
+def test_clients_draw_from_the_shared_budget(app_env):
+    modules = _modules(app_env, EXCHANGE_READ_TIMEOUT="0.2", WEIGHT_BUDGET_BURST_SECONDS="1")
+    client = modules["exchanges"].get("bybit")
+    # 50 units a second on bybit, 35 of them available to reads.
+    client.throttle(35)
+    with pytest.raises(ccxt.RateLimitExceeded):
+        client.throttle(35)
+
+    with modules["weight_budget"].trading():
+        client.throttle(35)
+
+    report = modules["weight_budget"].report()
+    assert report["process"]["trades"] == 1
+    assert report["process"]["reads_delayed"] == 1
+    assert list(report["buckets"]) == [modules["weight_budget"].bucket_key(client)]
+
+
+def test_budget_is_off_by_default(app_env):
+    modules = app_env(modules=["config", "weight_budget", "exchanges"])
+    client = modules["exchanges"].get("bybit")
+    assert client.throttle.__func__ is ccxt.bybit.throttle
+    assert modules["weight_budget"].report() is None
+
+
+def test_trading_follows_calls_into_fan_out(app_env, fake_exchange):
+    modules = _modules(app_env)
+    seen = []
+
+    def record(client):
+        seen.append(modules["weight_budget"].priority())
+
+    modules["exchanges"].fan_out({"read": (fake_exchange(), record)})
+    with modules["weight_budget"].trading():
+        modules["exchanges"].fan_out({"trade": (fake_exchange(), record)})
+
+    assert seen == ["read", "trade"]
+
+
+def test_async_clients_wait_without_blocking_the_loop(app_env):
+    modules = _modules(app_env, WEIGHT_BUDGET_BURST_SECONDS="1")
+    client = ccxt_async.bybit({"apiKey": "k", "secret": "s"})
+    modules["weight_budget"].attach(client)
+
+    async def spend():
+        await client.throttle(35)
+        await client.throttle(5)  # waits about 0.1 s for the refill
+
+    try:
+        asyncio.run(spend())
+    finally:
+        asyncio.run(client.close())
+    assert modules["weight_budget"].report()["process"]["reads_delayed"] == 1
+
+
+def test_async_throttle_does_not_hold_the_loop_while_the_file_is_locked(app_env, monkeypatch):
+    modules = _modules(app_env)
+    wb = modules["weight_budget"]
+    client = ccxt_async.bybit({"apiKey": "k", "secret": "s"})
+    wb.attach(client)
+    take = wb.WeightBudget.take
+
+    def contended(self, *args):
+        time.sleep(0.3)  # as if another process held the write lock
+        return take(self, *args)
+
+    monkeypatch.setattr(wb.WeightBudget, "take", contended)
+    gaps = []
+
+    async def ticker(done):
+        last = time.monotonic()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+
+    async def run():
+        done = asyncio.Event()
+        ticking = asyncio.create_task(ticker(done))
+        with wb.trading():
+            await client.throttle(1)
+        done.set()
+        await ticking
+
+    try:
+        asyncio.run(run())
+    finally:
+        asyncio.run(client.close())
+    assert max(gaps) < 0.15, "the loop kept serving other requests"
+    assert wb.report()["process"]["trades"] == 1
@@ -1,17 +1,23 @@
 import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import log_setup
 
 # Configure logging before importing modules that create loggers.
 log_setup.configure("webhook")
 
-from flask import Flask, jsonify, request  # noqa: E402
+from flask import Flask, jsonify, make_response, request  # noqa: E402
 
 import config  # noqa: E402
+import exchanges as exchange_registry  # noqa: E402
+import metrics  # noqa: E402
 from dedup import DuplicateFilter, signal_key  # noqa: E402
 from log_setup import redact  # noqa: E402
 from ratelimit import FailureThrottle, ip_allowed, parse_networks  # noqa: E402
-from signal_handler import process_signal  # noqa: E402
+from outbox import OK, PENDING, RUNNING, Outbox  # noqa: E402
+from signal_handler import place_order, process_signal, queue_signal, validate_signal  # noqa: E402
+from signal_results import ResultStore, new_signal_id  # noqa: E402
 
 logger = log_setup.get_logger("webhook")
 logger.info("🎉 Webhook initialized!")
@@ -26,8 +32,15 @@ else:
     # has stable addresses, and a stale entry silently rejects real signals.
     logger.info("/webhook accepts any source address (WEBHOOK_ALLOWED_IPS not set).")
 
+METRICS_NETWORKS = parse_networks(config.METRICS_ALLOWED_IPS)
+
 _throttle = FailureThrottle(config.WEBHOOK_MAX_FAILURES, config.WEBHOOK_LOCKOUT_SECONDS)
-_duplicates = DuplicateFilter(config.WEBHOOK_DEDUP_SECONDS)
+_duplicates = DuplicateFilter(
+    config.WEBHOOK_DEDUP_SECONDS,
+    backend=config.DEDUP_BACKEND,
+    socket_path=config.DEDUP_SOCKET or None,
+    sqlite_profile=config.DEDUP_SQLITE_PROFILE,
+)
 
 if config.WEBHOOK_DEDUP_SECONDS > 0:
     logger.info(
@@ -38,6 +51,33 @@ if config.WEBHOOK_DEDUP_SECONDS > 0:
 else:
     logger.warning("⚠ Duplicate signal suppression is disabled.")
 
+DUPLICATE = {
+    "status": "duplicate",
+    "message": "Identical signal already accepted; no order placed.",
+}
+
+# Legs of a batch run side by side, so a basket costs about one round trip.
+_legs = ThreadPoolExecutor(max_workers=config.WEBHOOK_MAX_BATCH, thread_name_prefix="leg")
+
+# Outcomes of signals acknowledged before their order was placed.
+_results = ResultStore()
+_executor = None
+_outbox = None
+if config.SIGNAL_EXECUTION == "outbox":
+    # The executor service places the orders; this process only queues them.
+    _outbox = Outbox()
+    logger.info("📥 Signals are queued for the executor service.")
+elif config.WEBHOOK_ASYNC_EXECUTION:
+    # Worker threads are not daemons, so a graceful shutdown still finishes
+    # the orders already accepted.
+    _executor = ThreadPoolExecutor(
+        max_workers=config.WEBHOOK_EXECUTION_WORKERS, thread_name_prefix="order"
+    )
+    logger.info("📥 Signals are acknowledged with 202 and executed in the background.")
+
+if config.EXCHANGE_WARMUP and config.WEBHOOK_ENABLED:
+    exchange_registry.start_warm_up()
+
 
 def _client_ip():
     """Caller's address, trusting proxy headers only when told to."""
@@ -55,20 +95,34 @@ def _pin_is_valid(incoming):
 
 @app.route("/webhook", methods=["POST"])
 def trade_signal():
+    timer = metrics.registry.timer()
+    started = time.perf_counter()
+    response = make_response(_trade_signal(timer))
+    timer.record("total", time.perf_counter() - started)
+    # Per-stage durations, readable in the sender's or a proxy's logs and
+    # in browser dev tools.
+    response.headers["Server-Timing"] = timer.server_timing()
+    logger.info(f"⏱ /webhook {response.status_code} {timer.log_field()}")
+    return response
+
+
+def _trade_signal(timer):
     try:
         if not config.WEBHOOK_ENABLED:
             logger.warning(f"Webhook hit while MODE={config.MODE}, refusing.")
             return jsonify({"error": "Webhook ingestion is disabled"}), 503
 
-        client = _client_ip()
-
-        if not ip_allowed(client, ALLOWED_NETWORKS):
+        with timer.stage("ip_check"):
+            client = _client_ip()
+            allowed = ip_allowed(client, ALLOWED_NETWORKS)
+        if not allowed:
             logger.warning(f"Rejected /webhook from disallowed address {client}")
             return jsonify({"error": "Forbidden"}), 403
 
         # Checked before the payload is parsed, so a locked-out client costs
         # us nothing per guess.
-        locked = _throttle.blocked_for(client)
+        with timer.stage("throttle"):
+            locked = _throttle.blocked_for(client)
         if locked:
             logger.warning(
                 f"Rejected /webhook from locked-out {client}, {locked:.0f}s remaining"
@@ -79,12 +133,15 @@ def trade_signal():
 
         # force=True: senders such as TradingView post JSON as text/plain,
         # which request.json rejects with a 415 before we ever see the body.
-        data = request.get_json(force=True, silent=True)
+        with timer.stage("parse"):
+            data = request.get_json(force=True, silent=True)
         if not isinstance(data, dict):
             logger.warning(f"Received a request with no valid JSON object body from {client}")
             return jsonify({"error": "Malformed or missing JSON body"}), 400
 
-        if not _pin_is_valid(data.get("PIN", "")):
+        with timer.stage("pin"):
+            pin_ok = _pin_is_valid(data.get("PIN", ""))
+        if not pin_ok:
             locked = _throttle.record_failure(client)
             logger.warning(
                 f"Invalid webhook PIN from {client}"
@@ -96,37 +153,194 @@ def trade_signal():
         # legitimate sender that shares their address.
         _throttle.reset(client)
 
+        if "SIGNALS" in data:
+            return _trade_batch(data, client, timer)
+
         logger.info(f"Received webhook data: {redact(data)}")
 
-        key = signal_key(data)
-        if _duplicates.check(key):
+        with timer.stage("dedup"):
+            key = signal_key(data)
+            duplicate = _duplicates.check(key)
+        if duplicate:
             # 200, not an error: this is the answer to "did my signal land?",
             # and a failure status would invite yet another retry.
             logger.warning(f"Ignoring duplicate signal from {client} ({key})")
-            return jsonify({
-                "status": "duplicate",
-                "message": "Identical signal already accepted; no order placed.",
-            }), 200
+            return jsonify(DUPLICATE), 200
+
+        body, code = _run_signal(data, key, timer)
+        return jsonify(body), code
+    except Exception as e:
+        logger.exception(f"Webhook processing error: {e}")
+        return jsonify({"error": "Internal error"}), 500
+
+
+def _run_signal(data, key, timer):
+    """Place, queue or accept one signal that passed dedup. Returns (body, status)."""
+    if _outbox is not None:
+        return _queue(data, key, timer)
+    if _executor is not None:
+        return _accept(data, key, timer)
+
+    result = process_signal(data, timer)
+
+    if result["status"] == "success":
+        return {"status": "ok", "order": result["order"]}, 200
+
+    # Validation failed locally, so nothing reached the exchange and a
+    # corrected retry must not be suppressed. An exchange-side failure
+    # (502) keeps the key, because we cannot prove the order did not land.
+    if result.get("code") == 400:
+        _duplicates.forget(key)
+
+    # Report the failure instead of answering 200 for an order that
+    # never reached the exchange.
+    body = {"error": result["message"]}
+    if "accounts" in result:
+        body["accounts"] = result["accounts"]
+    return body, result.get("code", 400)
+
 
-        result = process_signal(data)
+def _trade_batch(data, client, timer):
+    """Several legs under one PIN: one dedup transaction, legs in parallel.
 
-        if result["status"] == "success":
-            return jsonify({"status": "ok", "order": result["order"]}), 200
+    Each leg gets its own result, in request order. The status is 207 when
+    any leg failed, so a sender that only looks at the code still notices.
+    """
+    legs = data["SIGNALS"]
+    if not isinstance(legs, list) or not legs or not all(isinstance(leg, dict) for leg in legs):
+        return jsonify({"error": "SIGNALS must be a non-empty list of JSON objects"}), 400
+    if len(legs) > config.WEBHOOK_MAX_BATCH:
+        return jsonify({"error": f"At most {config.WEBHOOK_MAX_BATCH} SIGNALS per request"}), 400
 
-        # Validation failed locally, so nothing reached the exchange and a
-        # corrected retry must not be suppressed. An exchange-side failure
-        # (502) keeps the key, because we cannot prove the order did not land.
-        if result.get("code") == 400:
-            _duplicates.forget(key)
+    logger.info(f"Received {len(legs)} webhook signals: {[redact(leg) for leg in legs]}")
 
-        # Report the failure instead of answering 200 for an order that
-        # never reached the exchange.
-        return jsonify({"error": result["message"]}), result.get("code", 400)
+    with timer.stage("dedup"):
+        keys = [signal_key(leg) for leg in legs]
+        duplicates = _duplicates.check_many(keys)
+
+    def run(index):
+        if duplicates[index]:
+            logger.warning(f"Ignoring duplicate signal from {client} ({keys[index]})")
+            return dict(DUPLICATE), 200
+        # Each leg records its own stages; the request's timer gets the total.
+        return _run_signal(legs[index], keys[index], metrics.registry.timer())
+
+    with timer.stage("legs"):
+        outcomes = list(_legs.map(run, range(len(legs))))
+
+    results = []
+    for index, (body, code) in enumerate(outcomes):
+        results.append(dict(body, index=index, code=code))
+    if any(code >= 400 or code == 207 for _, code in outcomes):
+        status = 207
+    elif any(code == 202 for _, code in outcomes):
+        status = 202
+    else:
+        status = 200
+    return jsonify({"results": results}), status
+
+
+def _queue(data, key, timer):
+    result = queue_signal(_outbox, data, key, "webhook", timer)
+    if result["status"] != "queued":
+        _duplicates.forget(key)
+        return {"error": result["message"]}, result.get("code", 400)
+    signal_id = result["signal_id"]
+    return {
+        "status": "queued",
+        "signal_id": signal_id,
+        "status_url": f"/webhook/status/{signal_id}",
+    }, 202
+
+
+def _outbox_status(row):
+    entry = {
+        key: row[key]
+        for key in ("id", "status", "exchange", "enqueued_at", "started_at", "finished_at")
+    }
+    entry["signal_id"] = entry.pop("id")
+    if row["status"] == OK:
+        entry["order"] = row["result"]
+    elif row["status"] not in (PENDING, RUNNING):
+        entry["error"] = row["result"]
+        entry["code"] = row["code"]
+    return entry
+
+
+def _accept(data, key, timer):
+    """Validate while the sender waits; place the order after answering."""
+    with timer.stage("validate"):
+        order, problem = validate_signal(data)
+    if problem:
+        _duplicates.forget(key)
+        return {"error": problem["message"]}, problem.get("code", 400)
+
+    signal_id = new_signal_id()
+    _results.accept(signal_id)
+    _executor.submit(_execute, signal_id, key, order, data)
+    logger.info(f"📥 Accepted signal {signal_id}, placing the order in the background.")
+    return {
+        "status": "accepted",
+        "signal_id": signal_id,
+        "status_url": f"/webhook/status/{signal_id}",
+    }, 202
+
+
+def _execute(signal_id, key, order, data):
+    try:
+        result = place_order(order, data)
     except Exception as e:
-        logger.exception(f"Webhook processing error: {e}")
-        return jsonify({"error": "Internal error"}), 500
+        result = {"status": "error", "message": str(e), "code": 500}
+
+    if result["status"] == "success":
+        _results.finish(signal_id, status="ok", order=result["order"])
+        return
+    # Same rule as the synchronous path: only a local rejection may be retried.
+    if result.get("code") == 400:
+        _duplicates.forget(key)
+    _results.finish(
+        signal_id,
+        status="error",
+        error=result["message"],
+        code=result.get("code", 502),
+        **({"accounts": result["accounts"]} if "accounts" in result else {}),
+    )
+
+
+@app.route("/webhook/status/<signal_id>", methods=["GET"])
+def signal_status(signal_id):
+    # The id itself is the credential: it is unguessable and only ever given
+    # to whoever sent the signal.
+    if not ip_allowed(_client_ip(), ALLOWED_NETWORKS):
+        return jsonify({"error": "Forbidden"}), 403
+    if _outbox is not None:
+        row = _outbox.get(signal_id)
+        entry = None if row is None else _outbox_status(row)
+    else:
+        entry = _results.get(signal_id)
+    if entry is None:
+        return jsonify({"error": "Unknown signal id"}), 404
+    return jsonify(entry), 200
 
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "mode": config.MODE}), 200
+    # Unhealthy while warming up, so an orchestrator holds traffic until the
+    # first signal can be as fast as any other.
+    warmup = exchange_registry.warmup_status()
+    if warmup["state"] == "running":
+        return jsonify({"status": "warming_up", "mode": config.MODE, "warmup": warmup}), 503
+    return jsonify({"status": "ok", "mode": config.MODE, "warmup": warmup}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def service_metrics():
+    # Counters for this process only; each gunicorn worker keeps its own.
+    if not ip_allowed(_client_ip(), METRICS_NETWORKS):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({
+        "stages": metrics.registry.snapshot(),
+        "connections": exchange_registry.pool_stats(),
+        "pending_signals": _results.pending(),
+        "outbox": None if _outbox is None else _outbox.stats(),
+    }), 200
@@ -0,0 +1,274 @@
+"""Exchange request weight shared by every service, with trades first.
+
+ccxt's enableRateLimit paces each client on its own. The webhook, the
+email reader, the executor and the dashboard each build their own clients,
+so together they can send several times the rate any one of them keeps to.
+Binance answers that with 429 and then an IP ban (418), which stops the
+orders as well as the dashboard.
+
+With WEIGHT_BUDGET on, every client draws the ccxt cost of each request
+from one token bucket per exchange account, kept in SQLite beside the dedup
+store so that all the services see the same level. The bucket refills at
+the rate ccxt itself would pace a single client at.
+
+Orders and cancels are never held back: they take what they need even if
+that runs the bucket into debt. Everything else (the dashboard's reads,
+market loads) may only use the bucket down to a reserve, and waits for it
+to refill otherwise. However much the dashboard reads, the reserve is left
+for trading.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import ccxt
+
+import config
+import log_setup
+
+logger = log_setup.get_logger("weight_budget")
+
+DB_FILENAME = "weight_budget.sqlite3"
+
+READ = "read"
+TRADE = "trade"
+
+# Longest single sleep while a read waits, so that weight returned by other
+# processes' clocks is noticed.
+_MAX_NAP = 1.0
+
+_priority = contextvars.ContextVar("exchange_priority", default=READ)
+
+
+def default_db_path():
+    return os.path.join(log_setup.log_directory(), DB_FILENAME)
+
+
+@contextmanager
+def trading():
+    """Mark the exchange calls made inside as trades, which never wait.
+
+    A context variable, so it follows the call into exchanges.fan_out()
+    and onto the async clients' event loop.
+    """
+    token = _priority.set(TRADE)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def priority():
+    return _priority.get()
+
+
+class WeightBudget:
+    """Token buckets by key, shared by every process that opens the same path."""
+
+    def __init__(self, path=None, burst_seconds=10.0, reserve=0.3):
+        self.path = path or default_db_path()
+        self.burst_seconds = burst_seconds
+        self.reserve = reserve
+        self._local = threading.local()
+        self._counters = {"trades": 0, "reads": 0, "reads_delayed": 0, "waited_ms": 0.0}
+        self._counters_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few debits to a power cut costs nothing.
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _init_db(self):
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "  key     TEXT PRIMARY KEY,"
+            "  tokens  REAL NOT NULL,"
+            "  updated REAL NOT NULL"
+            ")"
+        )
+
+    def _now(self):
+        # Wall clock: the level is carried between processes.
+        return time.time()
+
+    def take(self, key, cost, rate, kind=READ):
+        """Draw `cost` from the bucket, or say how long to wait first.
+
+        `rate` is the refill in cost units per second. Returns 0.0 when the
+        weight was taken, else the seconds until it could be; nothing is
+        taken in that case. A trade is always taken.
+        """
+        capacity = rate * self.burst_seconds
+        floor = self.reserve * capacity
+        # A read larger than everything above the reserve could never fit.
+        needed = min(cost, capacity - floor)
+        now = self._now()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            if kind == TRADE or tokens - needed >= floor:
+                wait = 0.0
+                tokens -= cost
+            else:
+                wait = (floor + needed - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                self._reset_connection()
+            raise
+        return wait
+
+    def levels(self):
+        """Current tokens per bucket, as of now."""
+        rows = self._connect().execute("SELECT key, tokens, updated FROM buckets").fetchall()
+        return {key: {"tokens": round(tokens, 3), "updated": updated} for key, tokens, updated in rows}
+
+    def count(self, field, amount=1):
+        with self._counters_lock:
+            self._counters[field] += amount
+
+    def snapshot(self):
+        with self._counters_lock:
+            report = dict(self._counters)
+        report["waited_ms"] = round(report["waited_ms"], 3)
+        return report
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def budget():
+    """The process's WeightBudget, opened on first use."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = WeightBudget(
+                burst_seconds=config.WEIGHT_BUDGET_BURST_SECONDS,
+                reserve=config.WEIGHT_BUDGET_RESERVE,
+            )
+        return _budget
+
+
+def bucket_key(client):
+    """One bucket per exchange account. The key itself is not stored."""
+    fingerprint = hashlib.sha256((client.apiKey or "").encode()).hexdigest()[:16]
+    return f"{client.id}:{fingerprint}"
+
+
+def _plan(store, key, cost, rate, waited):
+    """Seconds to sleep before asking again; 0.0 once the weight is taken."""
+    kind = priority()
+    wait = store.take(key, cost, rate, kind)
+    if not wait:
+        if not waited:
+            store.count("trades" if kind == TRADE else "reads")
+        return 0.0
+    if not waited:
+        store.count("reads")
+        store.count("reads_delayed")
+    if waited + wait > config.EXCHANGE_READ_TIMEOUT:
+        raise ccxt.RateLimitExceeded(
+            f"{key.split(':')[0]} request weight budget is spent; "
+            f"the rest is reserved for trading"
+        )
+    return min(wait, _MAX_NAP)
+
+
+def attach(client):
+    """Route the client's rate limiting through the shared budget.
+
+    Replaces ccxt's per-client throttle, which is kept as the fallback if
+    the shared store cannot be used. A no-op unless WEIGHT_BUDGET is set.
+    """
+    if not config.WEIGHT_BUDGET:
+        return
+    raw = getattr(client, "unwrapped", client)
+    store = budget()
+    key = bucket_key(raw)
+    # ccxt paces a client at one cost unit per rateLimit milliseconds.
+    rate = 1000.0 / raw.rateLimit
+    original = raw.throttle
+
+    if asyncio.iscoroutinefunction(original):
+        async def throttle(cost=None):
+            cost = 1 if cost is None else cost
+            waited = 0.0
+            try:
+                while True:
+                    # take() can wait on the file lock for up to busy_timeout;
+                    # on the shared loop that would stall every other request,
+                    # orders included. to_thread carries the trade/read mark.
+                    pause = await asyncio.to_thread(_plan, store, key, cost, rate, waited)
+                    if not pause:
+                        break
+                    await asyncio.sleep(pause)
+                    waited += pause
+            except sqlite3.Error as e:
+                logger.warning(f"⚠ Weight budget unavailable, pacing {key} alone: {e}")
+                return await original(cost)
+            if waited:
+                store.count("waited_ms", waited * 1000)
+    else:
+        def throttle(cost=None):
+            cost = 1 if cost is None else cost
+            waited = 0.0
+            try:
+                while True:
+                    pause = _plan(store, key, cost, rate, waited)
+                    if not pause:
+                        break
+                    time.sleep(pause)
+                    waited += pause
+            except sqlite3.Error as e:
+                logger.warning(f"⚠ Weight budget unavailable, pacing {key} alone: {e}")
+                return original(cost)
+            if waited:
+                store.count("waited_ms", waited * 1000)
+
+    raw.throttle = throttle
+
+
+def report():
+    """Shared bucket levels and this process's counters, or None when off."""
+    if not config.WEIGHT_BUDGET:
+        return None
+    store = budget()
+    return {"buckets": store.levels(), "process": store.snapshot()}